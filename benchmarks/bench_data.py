@@ -0,0 +1,75 @@
+"""compares construction cost of the fixed-point Price/Size
+against the previous float/str implementation.
+
+    python benchmarks/bench_data.py [N]
+"""
+import sys
+sys.path.append(".")
+
+import timeit
+from scripts.data import Price, Size, get_spec
+
+
+class LegacyPrice(object):
+    step_values = {}
+    def __init__(self, symbol, x):
+        actual_value = float(x)
+        step = LegacyPrice.step_values[symbol]
+        if "." not in step:
+            step = int(step)
+            v = int((actual_value // step) * step)
+            self.actual_value = actual_value
+            self.value = str(v)
+        else:
+            precision = len(step.split(".")[1])
+            step = float(step)
+            v = str((actual_value // step) * step)
+            a, b = v.split(".")
+            self.actual_value = actual_value
+            self.value = f"{a}.{b[:precision]}"
+
+
+class LegacySize(object):
+    min_sizes = {}
+    max_sizes = {}
+    def __init__(self, symbol, val=None, lot=None):
+        mins = LegacySize.min_sizes[symbol]
+        maxs = LegacySize.max_sizes[symbol]
+        if lot is None:
+            self.lot = int(val // mins)
+        else:
+            self.lot = lot
+        self.actual_value = round(min(self.lot * mins, maxs), 8)
+        self.value = str(self.actual_value)
+
+
+def main(n=200000):
+    Price.step_values = LegacyPrice.step_values = {"BTC": "1",
+                                                   "XRP": "0.001"}
+    Size.min_sizes = LegacySize.min_sizes = {"BTC": 0.0001, "XRP": 1}
+    Size.max_sizes = LegacySize.max_sizes = {"BTC": 5, "XRP": 10000}
+
+    spec = get_spec("BTC")
+    cases = [
+        ("Price(BTC)", lambda: LegacyPrice("BTC", 5012345.6),
+                       lambda: Price("BTC", 5012345.6)),
+        ("Price(XRP)", lambda: LegacyPrice("XRP", 25.25252525),
+                       lambda: Price("XRP", 25.25252525)),
+        ("Size(val=)", lambda: LegacySize("BTC", val=0.01234),
+                       lambda: Size("BTC", val=0.01234)),
+        ("Size(lot=)", lambda: LegacySize("BTC", lot=123),
+                       lambda: Size("BTC", lot=123)),
+        ("Size(spec=)", lambda: LegacySize("BTC", lot=123),
+                        lambda: Size("BTC", lot=123, spec=spec)),
+        ("Price(spec=)", lambda: LegacyPrice("BTC", 5012345.6),
+                         lambda: Price("BTC", 5012345.6, spec=spec)),
+    ]
+    print(f"{'':12s} {'legacy':>10s} {'fixed':>10s} {'speedup':>8s}")
+    for name, legacy, fixed in cases:
+        t0 = min(timeit.repeat(legacy, number=n, repeat=3)) / n
+        t1 = min(timeit.repeat(fixed, number=n, repeat=3)) / n
+        print(f"{name:12s} {t0*1e9:8.0f}ns {t1*1e9:8.0f}ns {t0/t1:7.2f}x")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
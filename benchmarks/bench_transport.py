@@ -0,0 +1,62 @@
+"""compares per-request latency of top-level requests calls
+against the pooled HttpTransport on a local HTTP stand-in.
+
+    python benchmarks/bench_transport.py [N]
+"""
+import sys
+sys.path.append(".")
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scripts.utils import http_get, HttpTransport
+
+
+class TickerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    body = json.dumps({
+        "status": 0,
+        "data": [{"symbol": "BTC", "ask": "5000000", "bid": "4999000",
+                  "last": "4999500", "volume": "100",
+                  "timestamp": "2021-01-01T00:00:00.000Z"}]
+    }).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(url, n, transport=None):
+    start = time.perf_counter()
+    for _ in range(n):
+        http_get(url, transport=transport)
+    return (time.perf_counter() - start) / n
+
+
+def main(n=500):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TickerHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d/public/v1/ticker" % server.server_port
+    try:
+        oneshot = measure(url, n)
+        with HttpTransport() as transport:
+            pooled = measure(url, n, transport)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"requests.get : {oneshot*1e6:8.1f} us/request")
+    print(f"HttpTransport: {pooled*1e6:8.1f} us/request")
+    print(f"speedup      : {oneshot/pooled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,315 @@
+"""benchmarks of the trading hot paths.
+writes the time per operation of every case to a JSON file and
+compares it against a stored baseline.
+
+    python benchmarks/suite.py [--out FILE] [--baseline FILE]
+                               [--threshold 0.2] [-k NAME] [--quick]
+
+exits with status 1 if a case is slower than the baseline by more than
+the threshold (the ratio of the time per operation).
+"""
+import sys
+sys.path.append(".")
+
+import io
+import json
+import copy
+import timeit
+import argparse
+import platform
+import statistics
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from scripts import *
+from scripts.data import *
+from scripts.api import GmoApi
+from tests.mock import MockGmoServer
+from scripts.orders import OrderStore
+from scripts.ratelimit import RequestScheduler
+
+
+CASES = []
+
+def case(name):
+    """registers a function returning the callable to benchmark.
+    the callable may have a prepare(number) attribute called before
+    each timed run of number calls, outside of the measured time
+    """
+    def register(setup):
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+def set_specs(n):
+    """registers n symbols and returns their names
+    """
+    symbols = ["BTC", "ETH"] + [f"S{i:03d}" for i in range(n - 2)]
+    Price.step_values = {s: "1" for s in symbols}
+    Size.min_sizes = {s: 0.0001 for s in symbols}
+    Size.max_sizes = {s: 5 for s in symbols}
+    return symbols[:n]
+
+
+def ticker_body(symbols):
+    return {"status": 0, "data": [
+        {"symbol": s, "ask": str(5000100 + i), "bid": str(4999900 + i),
+         "last": str(5000000 + i), "volume": "100",
+         "timestamp": "2021-01-01T00:00:00.000Z"}
+        for i, s in enumerate(symbols)
+    ]}
+
+
+def assets_body(symbols):
+    return {"status": 0, "data": [
+        {"symbol": s, "amount": "0.5", "available": "0.5",
+         "conversionRate": "5000000"} for s in symbols
+    ] + [{"symbol": "JPY", "amount": "300000", "available": "300000",
+          "conversionRate": "1"}]}
+
+
+def orderbooks_body(levels=200):
+    return {"status": 0, "data": {
+        "asks": [{"price": str(5000100 + 10 * i), "size": "0.01"}
+                 for i in range(levels)][::-1],
+        "bids": [{"price": str(4999900 - 10 * i), "size": "0.01"}
+                 for i in range(levels)],
+        "symbol": "BTC", "timestamp": "2021-01-01T00:00:00.000Z"
+    }}
+
+
+@case("price")
+def bench_price():
+    set_specs(2)
+    return lambda: Price("BTC", 5012345.6)
+
+
+@case("size_val")
+def bench_size_val():
+    set_specs(2)
+    return lambda: Size("BTC", val=0.01234)
+
+
+@case("size_lot")
+def bench_size_lot():
+    set_specs(2)
+    return lambda: Size("BTC", lot=123)
+
+
+@case("order")
+def bench_order():
+    set_specs(2)
+    size, price = Size("BTC", lot=123), Price("BTC", 5012345.6)
+    return lambda: Order("BTC", Side.BUY, size, ExecutionType.LIMIT,
+                         price, time_in_force="SOK")
+
+
+@case("sign_get")
+def bench_sign_get():
+    api = GmoApi("KEY", "SECRET")
+    return lambda: api.get_api_header("GET", "/v1/account/assets")
+
+
+@case("sign_post")
+def bench_sign_post():
+    api = GmoApi("KEY", "SECRET")
+    payload = {"symbol": "BTC", "side": "BUY", "size": "0.0123",
+               "executionType": "LIMIT", "price": "5012345",
+               "timeInForce": "SOK"}
+    return lambda: api.get_api_header("POST", "/v1/order", payload)
+
+
+@case("decode_ticker")
+def bench_decode_ticker():
+    body = json.dumps(ticker_body(set_specs(20)))
+    return lambda: json.loads(body)
+
+
+@case("parse_ticker")
+def bench_parse_ticker():
+    api = GmoApi("KEY", "SECRET")
+    resp = ticker_body(set_specs(20))
+    api.public_get = lambda *args, **kwargs: resp
+    return api.fetch_ticker
+
+
+@case("parse_assets")
+def bench_parse_assets():
+    api = GmoApi("KEY", "SECRET")
+    symbols = set_specs(20)
+    resp = assets_body(symbols)
+    api.private_get = lambda *args, **kwargs: resp
+    return lambda: api.get_assets(symbols + ["JPY"])
+
+
+@case("parse_orderbook")
+def bench_parse_orderbook():
+    api = GmoApi("KEY", "SECRET")
+    resp = orderbooks_body()
+    # fetch_orderbooks sorts the levels in place: every call gets its
+    # own unsorted copy, made before the timed run
+    bodies = []
+    api.public_get = lambda *args, **kwargs: bodies.pop()
+    func = lambda: api.get_orderbook("BTC")
+    func.prepare = lambda number: bodies.extend(
+        copy.deepcopy(resp) for _ in range(number))
+    return func
+
+
+def bench_rebalance(n):
+    symbols = set_specs(n)
+    daemon = ShannonsDaemon(None, list(symbols),
+                            Size.min_sizes, Size.max_sizes,
+                            Price.step_values)
+    resp = ticker_body(symbols)
+    ticker = {d["symbol"]: Ticker(d["ask"], d["bid"], d["last"],
+                                  d["volume"], d["timestamp"])
+              for d in resp["data"]}
+    assets = {d["symbol"]: Asset(d["amount"], d["available"])
+              for d in assets_body(symbols)["data"]}
+    return lambda: daemon.rebalance(assets, ticker)
+
+
+for n in (2, 20, 200):
+    case(f"rebalance_{n}")(lambda n=n: bench_rebalance(n))
+
+
+class Cycle(object):
+    """ShannonsDaemon.run() against MockGmoServer.
+    the caches and rate limits of the client are disabled so that
+    every cycle sends its requests
+    """
+    def __init__(self, balanced):
+        self.server = MockGmoServer().start()
+        symbols = set_specs(2)
+        for i, s in enumerate(symbols):
+            self.server.set_ticker(s, 5000100 + i, 4999900 + i)
+            self.server.set_asset(s, 0.02 if balanced else 0)
+        self.server.set_asset("JPY", 100000)
+        api = self.server.connect(GmoApi("KEY", "SECRET"))
+        api.cache_ttls = {name: 0 for name in api.cache_ttls}
+        api.public_scheduler = RequestScheduler(1e9)
+        api.private_scheduler = RequestScheduler(1e9)
+        self.daemon = ShannonsDaemon(api, list(symbols), Size.min_sizes,
+                                     Size.max_sizes, Price.step_values)
+
+
+    def __call__(self):
+        with redirect_stdout(io.StringIO()):
+            self.daemon.run()
+        # forget the posted orders so every cycle does the same work
+        self.daemon.orders = OrderStore()
+
+
+@case("run_cycle_idle")
+def bench_run_cycle_idle():
+    return Cycle(balanced=True)
+
+
+@case("run_cycle_orders")
+def bench_run_cycle_orders():
+    return Cycle(balanced=False)
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """returns seconds per call: (min, median) of repeat runs
+    of about min_time seconds each
+    """
+    timer = timeit.Timer(func)
+    prepare = getattr(func, "prepare", None)
+
+    def timed(number):
+        if prepare is not None:
+            prepare(number)
+        return timer.timeit(number)
+
+    # as timeit.Timer.autorange: 1, 2, 5, 10, 20, 50, ... calls
+    # until a run takes 0.2 seconds
+    i, number = 1, None
+    while number is None:
+        for j in (1, 2, 5):
+            if timed(i * j) >= 0.2:
+                number = i * j
+                break
+        i *= 10
+    number = max(1, int(number * min_time / 0.2))
+    times = [timed(number) / number for _ in range(repeat)]
+    return min(times), statistics.median(times), number
+
+
+def run(pattern=None, min_time=0.2, repeat=5):
+    results = {}
+    for name, setup in CASES:
+        if pattern and pattern not in name:
+            continue
+        func = setup()
+        best, median, number = measure(func, min_time, repeat)
+        server = getattr(func, "server", None)
+        if server is not None:
+            server.stop()
+        results[name] = {"seconds": best, "median": median,
+                         "number": number}
+        print(f"{name:20s} {best*1e6:12.2f} us "
+              f"(median {median*1e6:.2f} us, {number} loops)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """prints the ratio against the baseline and returns the names
+    of the cases slower by more than threshold
+    """
+    regressions = []
+    print(f"\n{'':20s} {'baseline':>12s} {'current':>12s} {'ratio':>7s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["seconds"], result["seconds"]
+        ratio = new / old
+        mark = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = "  REGRESSION"
+        print(f"{name:20s} {old*1e6:10.2f}us {new*1e6:10.2f}us "
+              f"{ratio:6.2f}x{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="bench.json",
+                        help="JSON file the results are written to")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON file of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="tolerated slowdown against the baseline")
+    parser.add_argument("-k", dest="pattern", default=None,
+                        help="runs only the cases whose name contains it")
+    parser.add_argument("--quick", action="store_true",
+                        help="shorter runs for a smoke test")
+    args = parser.parse_args()
+
+    if args.quick:
+        results = run(args.pattern, min_time=0.02, repeat=2)
+    else:
+        results = run(args.pattern)
+    with open(args.out, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "results": results
+        }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): "
+                  + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
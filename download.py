@@ -0,0 +1,39 @@
+from scripts import *
+from scripts.history import HistoryDownloader, format_stats
+from scripts.store import TradeStore
+
+import os
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="download trade archives of symbols x dates")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", default=None,
+                        help="YYYY-MM-DD (exclusive, default: today)")
+    parser.add_argument("--path", default="data/history")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--exchange", default="GMO")
+    parser.add_argument("--store", default=None,
+                        help="ingest the archives into the columnar store")
+    args = parser.parse_args()
+
+    api = get_crypto_api_client(args.exchange, "NONE", "NONE",
+                                transport=HttpTransport(pool_size=args.workers))
+    with api:
+        downloader = HistoryDownloader(api, args.path, args.workers)
+        stats = downloader.download(args.symbols, args.start, args.end)
+    print(format_stats(stats))
+    for symbol, date in stats["failed"]:
+        print(f"failed: {symbol} {date}: {stats['errors'][(symbol, date)]}")
+
+    if args.store:
+        store = TradeStore(args.store)
+        for symbol in args.symbols:
+            n = store.ingest_directory(symbol,
+                                       os.path.join(args.path, symbol))
+            print(f"ingested {n} archives of {symbol}")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
-from .api import get_crypto_api_client
-from .daemon import ShannonsDaemon
-from .utils import load_yaml
+from .api import get_crypto_api_client, get_async_crypto_api_client
+from .daemon import ShannonsDaemon, AsyncShannonsDaemon
+from .utils import load_yaml, HttpTransport
 
+from .metrics import Metrics
+from .runner import Runner
@@ -1,13 +1,19 @@
 import os
-import json
 import hmac
 import hashlib
-import time
-from datetime import datetime
+import asyncio
+from copy import copy
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 from abc import ABCMeta, abstractmethod
 from .utils import *
 from .data import *
+from .stream import TickerStream, TradeStream, OrderBookStream, OrderEventStream
+from .orderbook import OrderBook
+from .ratelimit import Priority, RequestScheduler
+from .cache import NULL_CACHE
+from .metrics import NULL_METRICS
 
 
 class Api(metaclass=ABCMeta):
@@ -64,6 +70,7 @@ class Api(metaclass=ABCMeta):
     @abstractmethod
     def get_orders(self, order_ids):
         """gets order information of order_ids
+        and returns the orders the exchange knows
         """
         raise NotImplementedError()
 
@@ -87,9 +94,53 @@ class Api(metaclass=ABCMeta):
 class GmoApi(Api):
     exchange = Exchange.GMO.name
 
-    def __init__(self, api_key, secret_key):
+    # requests per second allowed by the exchange
+    public_rate_limit = 6
+    private_rate_limit = 6
+    # maximum number of IDs of /v1/orders
+    max_order_ids = 10
+    # seconds the responses of the public endpoints are cached
+    cache_ttls = {
+        "status": 5,
+        "ticker": 1,
+        "orderbooks": 0.5,
+    }
+
+    def __init__(self, api_key, secret_key, transport=None,
+                 public_scheduler=None, private_scheduler=None, cache=None,
+                 metrics=None):
+        """
+        Args:
+            api_key: API-KEY
+            secret_key: SECRET-KEY
+            transport: HttpTransport shared by all requests of this client
+                       (a new one is created if not given)
+            public_scheduler, private_scheduler: RequestScheduler of
+                       the public/private budget, share them between
+                       clients of the same account
+            cache: TtlCache of the public endpoints, share it between
+                   clients that read the same market data
+                   (not cached if not given)
+            metrics: Metrics recording request, signing and decoding
+                     times (not recorded if not given)
+        """
         self.api_key = api_key
         self.secret_key = secret_key
+        # keyed once, copied for every request
+        self.hmac = hmac.new(secret_key.encode('ascii'),
+                             digestmod=hashlib.sha256)
+        self.clock = MillisClock()
+        if transport is None:
+            transport = HttpTransport()
+        self.transport = transport
+        if public_scheduler is None:
+            public_scheduler = RequestScheduler(self.public_rate_limit)
+        if private_scheduler is None:
+            private_scheduler = RequestScheduler(self.private_rate_limit)
+        self.public_scheduler = public_scheduler
+        self.private_scheduler = private_scheduler
+        self.cache = cache if cache is not None else NULL_CACHE
+        self.metrics = metrics if metrics is not None else NULL_METRICS
         self.public_endpoint = "https://api.coin.z.com/public"
         self.ws_public_endpoint = "wss://api.coin.z.com/ws/public"
         self.private_endpoint = "https://api.coin.z.com/private"
@@ -97,26 +148,97 @@ class GmoApi(Api):
         self.download_endpoint = "https://api.coin.z.com/data/trades"
 
 
-    def get_api_header(self, method, path, payload={}):
+    def close(self):
+        """releases the pooled connections
+        """
+        self.transport.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def get_api_header(self, method, path, payload=None):
         """return the api header for GMO private api
         Args:
             method: http method 'GET', 'POST'
             path: path to endpoint
-            payload: responce body, dict
+            payload: request body, bytes sent as it is (see encode_payload)
+                     or dict
         """
-        timestamp = '{0}000'.format(int(time.mktime(datetime.now().timetuple())))
-        text = timestamp + method + path
-        if payload:
-            text += json.dumps(payload)
-
-        sign = hmac.new(bytes(self.secret_key.encode('ascii')),
-                        bytes(text.encode('ascii')),
-                        hashlib.sha256)\
-                   .hexdigest()
+        timestamp = str(self.clock())
+        sign = self.hmac.copy()
+        sign.update((timestamp + method + path).encode('ascii'))
+        if payload is not None:
+            sign.update(encode_payload(payload))
         return {
             "API-KEY": self.api_key,
             "API-TIMESTAMP": timestamp,
-            "API-SIGN": sign
+            "API-SIGN": sign.hexdigest()
+        }
+
+
+    def public_get(self, path, params={}, priority=Priority.QUERY):
+        """sends GET to the public api within the public budget
+        """
+        self.public_scheduler.acquire(priority)
+        with self.metrics.timer("request_seconds", path=path):
+            resp = http_get(self.public_endpoint + path,
+                            params=params,
+                            jsonify=False,
+                            transport=self.transport)
+        return self.decode(resp)
+
+
+    def private_get(self, path, params={}, priority=Priority.QUERY):
+        """sends signed GET to the private api within the private budget
+        """
+        self.private_scheduler.acquire(priority)
+        with self.metrics.timer("sign_seconds"):
+            headers = self.get_api_header("GET", path)
+        with self.metrics.timer("request_seconds", path=path):
+            resp = http_get(self.private_endpoint + path,
+                            params=params,
+                            headers=headers,
+                            jsonify=False,
+                            transport=self.transport)
+        return self.decode(resp)
+
+
+    def private_send(self, method, path, payload, priority=Priority.QUERY):
+        """sends signed POST, PUT or DELETE to the private api
+        within the private budget
+        """
+        send = {"POST": http_post, "PUT": http_put, "DELETE": http_delete}
+        # the body is serialized once and the same bytes are signed and sent
+        body = encode_payload(payload)
+        self.private_scheduler.acquire(priority)
+        with self.metrics.timer("sign_seconds"):
+            headers = self.get_api_header(method, path, body)
+        with self.metrics.timer("request_seconds", path=path):
+            resp = send[method](self.private_endpoint + path,
+                                headers=headers,
+                                payload=body,
+                                jsonify=False,
+                                transport=self.transport)
+        return self.decode(resp)
+
+
+    def decode(self, resp):
+        with self.metrics.timer("decode_seconds"):
+            return resp.json()
+
+
+    def get_scheduler_stats(self):
+        """returns queue depth and wait times of the budgets
+        """
+        return {
+            "public": self.public_scheduler.stats(),
+            "private": self.private_scheduler.stats()
         }
 
 
@@ -125,14 +247,16 @@ class GmoApi(Api):
         """
         if resp["status"] == 0:
             # success
-            return resp["data"]
+            return resp.get("data")
         else:
             raise RuntimeError(resp["messages"])
 
 
     def is_available(self):
         path = "/v1/status"
-        resp = http_get(self.public_endpoint + path)
+        resp = self.cache.get(("status", self.public_endpoint),
+                              self.cache_ttls["status"],
+                              lambda: self.public_get(path))
         if resp["data"]["status"] == "OPEN":
             return True
         else:
@@ -140,16 +264,22 @@ class GmoApi(Api):
 
 
     def get_ticker(self, symbols):
+        """returns dict of Ticker of symbols
+        """
+        table = self.cache.get(("ticker", self.public_endpoint),
+                               self.cache_ttls["ticker"],
+                               self.fetch_ticker)
+        # copies: the cached table is shared by the callers within the ttl
+        return {s: copy(table[s]) for s in symbols if s in table}
+
+
+    def fetch_ticker(self):
         path = "/v1/ticker"
-        resp = http_get(self.public_endpoint + path)
+        resp = self.public_get(path)
 
         ticker = {}
         for data in resp["data"]:
-            s = data["symbol"]
-            if s not in symbols:
-                continue
-
-            ticker[s] = Ticker(
+            ticker[data["symbol"]] = Ticker(
                 ask = float(data["ask"]),
                 bid = float(data["bid"]),
                 last = float(data["last"]),
@@ -159,15 +289,37 @@ class GmoApi(Api):
         return ticker
 
 
+    def get_ticker_stream(self, symbols, on_ticker=None, **kwargs):
+        """returns TickerStream of the public websocket api (not started)
+        """
+        return TickerStream(self.ws_public_endpoint, symbols,
+                            on_ticker=on_ticker, **kwargs)
+
+
+    def get_history_filename(self, symbol, date):
+        return date.strftime("%Y%m%d") + "_" + symbol + ".csv.gz"
+
+
+    def get_trade_stream(self, symbols, on_trade, **kwargs):
+        """returns TradeStream of the public websocket api (not started)
+        """
+        return TradeStream(self.ws_public_endpoint, symbols, on_trade,
+                           **kwargs)
+
+
     def download_execution_history(self, symbol, date, path):
-        fname = date.strftime("%Y%m%d") + "_" + symbol + ".csv.gz"
+        """downloads the trade history of the date into path
+        and returns the number of bytes
+        """
+        fname = self.get_history_filename(symbol, date)
 
         url = "/".join([self.download_endpoint,
                         symbol,
                         str(date.year),
                         str(date.month).zfill(2),
                         fname])
-        download(url, os.path.join(path,fname))
+        return download(url, os.path.join(path,fname),
+                        transport=self.transport)
 
 
     def get_execution_history(self, symbol, page=1, count=100):
@@ -177,17 +329,24 @@ class GmoApi(Api):
             "page": page,
             "count": min(count, 100)
         }
-        resp = http_get(self.public_endpoint + path,
-                        params = params)
+        resp = self.public_get(path, params, Priority.HISTORY)
         data = self.validate_response(resp)
         return data["list"]
 
 
 
     def get_orderbooks(self, symbol):
+        data = self.cache.get(("orderbooks", self.public_endpoint, symbol),
+                              self.cache_ttls["orderbooks"],
+                              lambda: self.fetch_orderbooks(symbol))
+        # copies: the cached book is shared by the callers within the ttl
+        return dict(data, asks=[dict(level) for level in data["asks"]],
+                    bids=[dict(level) for level in data["bids"]])
+
+
+    def fetch_orderbooks(self, symbol):
         path = "/v1/orderbooks"
-        resp = http_get(self.public_endpoint + path,
-                        params={"symbol": symbol})
+        resp = self.public_get(path, {"symbol": symbol})
         data = self.validate_response(resp)
         sort_with_price = lambda x: float(x["price"])
         data["asks"].sort(key=sort_with_price)
@@ -195,12 +354,29 @@ class GmoApi(Api):
         return data
 
 
+    def get_orderbook(self, symbol):
+        """returns OrderBook built from the snapshot of /v1/orderbooks
+        """
+        data = self.get_orderbooks(symbol)
+        book = OrderBook(symbol)
+        book.apply_snapshot(data["asks"], data["bids"],
+                            data.get("timestamp", ""))
+        return book
+
+
+    def get_orderbook_stream(self, symbols, on_update=None, **kwargs):
+        """returns OrderBookStream of the public websocket api (not started)
+        """
+        return OrderBookStream(self.ws_public_endpoint, symbols,
+                               on_update=on_update, **kwargs)
+
+
     def get_assets(self, symbols):
         path = "/v1/account/assets"
-        resp = http_get(self.private_endpoint + path,
-                        headers=self.get_api_header("GET", path))
+        resp = self.private_get(path)
         data = self.validate_response(resp)
 
+        symbols = set(symbols)
         assets = {}
         for d in data:
             if d["symbol"] not in symbols:
@@ -226,32 +402,79 @@ class GmoApi(Api):
 
         else:
             raise TypeError(f"{type(orders)}: use Order or list of Order")
+        if len(order_ids) > self.max_order_ids:
+            raise ValueError(f"up to {self.max_order_ids} orders at once")
         order_ids.sort(key=lambda x: int(x))
 
         path = "/v1/orders"
         params = {"orderId": ",".join(order_ids)}
-        resp = http_get(self.private_endpoint + path,
-                        params=params,
-                        headers=self.get_api_header("GET", path))
+        resp = self.private_get(path, params)
         data = self.validate_response(resp)
-        data["list"].sort(key=lambda x: x["orderId"])
 
-        for order, d in zip(orders, data["list"]):
+        # match by ID, orders missing from the response are left as they
+        # are and not returned
+        tracked = {str(order.ID): order for order in orders}
+        found = []
+        for d in data["list"]:
+            order = tracked.get(str(d["orderId"]))
+            if order is None:
+                continue
             order.timestamp = d["timestamp"]
-            if d["status"] in ["WAITING", "ORDERED"]:
-                order.status = OrderStatus.ACTIVE
-            elif d["status"] == "EXECUTED":
-                order.status = OrderStatus.COMPLETED
-            elif d["status"] == "CANCELED":
-                order.status = OrderStatus.CANCELED
-            elif d["status"] in ["CANCELING", "MODIFYING"]:
-                order.status = OrderStatus.MODIFYING
-            elif d["status"] == "EXPIRED":
-                order.status = OrderStatus.EXPIRED
-            else:
-                raise RuntimeError(f"undefined status {d['status']}")
-        return orders
+            order.status = self.to_order_status(d["status"])
+            if "executedSize" in d:
+                order.executed_size = float(d["executedSize"])
+            found.append(order)
+        return found
+
 
+    @staticmethod
+    def to_order_status(status):
+        """converts GMO's order status into OrderStatus
+        """
+        if status in ["WAITING", "ORDERED"]:
+            return OrderStatus.ACTIVE
+        elif status == "EXECUTED":
+            return OrderStatus.COMPLETED
+        elif status == "CANCELED":
+            return OrderStatus.CANCELED
+        elif status in ["CANCELING", "MODIFYING"]:
+            return OrderStatus.MODIFYING
+        elif status == "EXPIRED":
+            return OrderStatus.EXPIRED
+        else:
+            raise RuntimeError(f"undefined status {status}")
+
+
+
+    def get_ws_token(self):
+        """returns a new access token of the private websocket api
+        """
+        path = "/v1/ws-auth"
+        payload = {}
+        resp = self.private_send("POST", path, payload)
+        return self.validate_response(resp)
+
+
+    def extend_ws_token(self, token):
+        """extends the lifetime of the access token to 60 minutes
+        """
+        path = "/v1/ws-auth"
+        payload = {"token": token}
+        resp = self.private_send("PUT", path, payload)
+        self.validate_response(resp)
+
+
+    def delete_ws_token(self, token):
+        path = "/v1/ws-auth"
+        payload = {"token": token}
+        resp = self.private_send("DELETE", path, payload)
+        self.validate_response(resp)
+
+
+    def get_order_stream(self, on_event=None, **kwargs):
+        """returns OrderEventStream of the private websocket api (not started)
+        """
+        return OrderEventStream(self, on_event=on_event, **kwargs)
 
 
     def post_order(self, order):
@@ -278,9 +501,7 @@ class GmoApi(Api):
 
         # post order
         path = "/v1/order"
-        resp = http_post(self.private_endpoint + path,
-                         headers=self.get_api_header("POST", path, payload),
-                         payload=payload)
+        resp = self.private_send("POST", path, payload, Priority.ORDER)
         order_id = self.validate_response(resp)
         return order_id
 
@@ -304,13 +525,127 @@ class GmoApi(Api):
         payload = {
             "orderIds": order_ids
         }
-        resp = http_post(self.private_endpoint + path,
-                         headers=self.get_api_header("POST", path, payload),
-                         payload=payload)
+        resp = self.private_send("POST", path, payload, Priority.CANCEL)
         data = self.validate_response(resp)
         return data
 
 
+class AsyncApi(metaclass=ABCMeta):
+    """asyncio variant of Api
+    """
+    # exchange name
+    exchange = None
+
+    @abstractmethod
+    async def is_available(self):
+        raise NotImplementedError()
+
+
+    @abstractmethod
+    async def get_ticker(self, symbols):
+        raise NotImplementedError()
+
+
+    @abstractmethod
+    async def get_assets(self, symbols):
+        raise NotImplementedError()
+
+
+    @abstractmethod
+    async def get_orders(self, orders):
+        raise NotImplementedError()
+
+
+    @abstractmethod
+    async def post_order(self, order):
+        raise NotImplementedError()
+
+
+    @abstractmethod
+    async def post_cancel_orders(self, orders):
+        raise NotImplementedError()
+
+
+class AsyncGmoApi(AsyncApi):
+    """awaitable GmoApi.
+    every call runs the GmoApi method on a thread pool, so requests
+    share the signing/validation code of GmoApi and its pooled
+    connections, while several of them can be in flight at once.
+    """
+    exchange = Exchange.GMO.name
+
+    def __init__(self, api_key, secret_key, transport=None, max_workers=8,
+                 metrics=None):
+        """
+        Args:
+            api_key: API-KEY
+            secret_key: SECRET-KEY
+            transport: HttpTransport (pool size defaults to max_workers)
+            max_workers: maximum number of requests in flight
+            metrics: Metrics (see GmoApi)
+        """
+        if transport is None:
+            transport = HttpTransport(pool_size=max_workers)
+        self.api = GmoApi(api_key, secret_key, transport, metrics=metrics)
+        self.metrics = self.api.metrics
+        self.max_order_ids = self.api.max_order_ids
+        self.executor = ThreadPoolExecutor(max_workers)
+
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          partial(func, *args, **kwargs))
+
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.api.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        # waits for the calls in flight off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close)
+
+
+    async def is_available(self):
+        return await self._call(self.api.is_available)
+
+
+    async def get_ticker(self, symbols):
+        return await self._call(self.api.get_ticker, symbols)
+
+
+    async def get_execution_history(self, symbol, page=1, count=100):
+        return await self._call(self.api.get_execution_history,
+                                symbol, page, count)
+
+
+    async def get_orderbooks(self, symbol):
+        return await self._call(self.api.get_orderbooks, symbol)
+
+
+    async def get_assets(self, symbols):
+        return await self._call(self.api.get_assets, symbols)
+
+
+    async def get_orders(self, orders):
+        return await self._call(self.api.get_orders, orders)
+
+
+    async def post_order(self, order):
+        return await self._call(self.api.post_order, order)
+
+
+    async def post_cancel_orders(self, orders):
+        return await self._call(self.api.post_cancel_orders, orders)
+
+
 class BitFlyerApi(Api):
     exchange = Exchange.bitFlyer.name
 
@@ -334,10 +669,20 @@ class BitFlyerApi(Api):
 
 
 
-def get_crypto_api_client(name, api_key, secret_key):
+def get_crypto_api_client(name, api_key, secret_key, **kwargs):
     if name == Exchange.GMO.name:
-        return GmoApi(api_key, secret_key)
+        return GmoApi(api_key, secret_key, **kwargs)
     elif name == Exchange.bitFlyer.name:
         return BitFlyerApi(api_key, secret_key)
+    elif name == Exchange.Simu.name:
+        from .simu import SimuApi
+        return SimuApi(api_key, secret_key, **kwargs)
+    else:
+        raise ValueError(f"invalid name: {name}")
+
+
+def get_async_crypto_api_client(name, api_key, secret_key, **kwargs):
+    if name == Exchange.GMO.name:
+        return AsyncGmoApi(api_key, secret_key, **kwargs)
     else:
         raise ValueError(f"invalid name: {name}")
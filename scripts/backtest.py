@@ -0,0 +1,207 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .data import Side, SymbolSpec
+from .kernel import RebalanceKernel
+from .store import to_millis
+
+
+def resample(timestamp, price, grid, interval):
+    """returns (last, low, high) on the grid.
+    last[k] is the last trade price before grid[k], low[k] and high[k]
+    are the extremes of the trades in [grid[k], grid[k] + interval).
+    nan where there is no trade.
+    """
+    timestamp = np.asarray(timestamp)
+    price = np.asarray(price, dtype=np.float64)
+    begin = np.searchsorted(timestamp, grid, side="left")
+    end = np.searchsorted(timestamp, grid + interval, side="left")
+
+    last = np.full(len(grid), np.nan)
+    has_last = begin > 0
+    last[has_last] = price[begin[has_last] - 1]
+
+    low = np.full(len(grid), np.nan)
+    high = np.full(len(grid), np.nan)
+    nonempty = end > begin
+    if nonempty.any():
+        # reduceat over [begin[i], begin[i+1]) of the non-empty intervals
+        idx = begin[nonempty]
+        bounds = np.append(idx, end[nonempty][-1])
+        low[nonempty] = np.minimum.reduceat(price[:bounds[-1]], idx)
+        high[nonempty] = np.maximum.reduceat(price[:bounds[-1]], idx)
+    return last, low, high
+
+
+@dataclass
+class BacktestResult:
+    symbols: list
+    timestamp: np.ndarray    # grid in millisecond
+    equity: np.ndarray       # portfolio value in JPY on the grid
+    holdings: np.ndarray     # amount of each symbol on the grid
+    jpy: np.ndarray          # JPY on the grid
+    trades: np.ndarray       # number of fills of each symbol
+    volume: np.ndarray       # traded value in JPY of each symbol
+    fees: float
+
+    @property
+    def turnover(self):
+        """traded value over the mean equity
+        """
+        return float(self.volume.sum() / np.mean(self.equity))
+
+
+    @property
+    def ret(self):
+        return float(self.equity[-1] / self.equity[0] - 1)
+
+
+    def summary(self):
+        return {
+            "return": self.ret,
+            "final_equity": float(self.equity[-1]),
+            "trades": int(self.trades.sum()),
+            "volume": float(self.volume.sum()),
+            "turnover": self.turnover,
+            "fees": self.fees,
+        }
+
+
+class Backtester(object):
+    """replays trade history through the rebalance rule of
+    ShannonsDaemon at a fixed interval.
+
+    orders are LIMIT/SOK at the bid (BUY) or ask (SELL), sized and
+    priced with the Size/Price rounding rules, and filled entirely when
+    a trade of the next interval reaches their price. orders that the
+    balance cannot cover are rejected, as the exchange would do.
+
+    holdings only change on fills, so the rule is evaluated for a whole
+    window of future steps at once under the current holdings and the
+    replay jumps to the first fill.
+    """
+    def __init__(self, symbols, min_sizes, max_sizes, step_values,
+                 interval=15, fee_rate=0.0, spread=0.0, jpy_symbol="JPY"):
+        """
+        Args:
+            symbols: list of coins' symbol (without JPY)
+            min_sizes: dict of minimum lot
+            max_sizes: dict of maximum lot
+            step_values: dict of step values (str)
+            interval: rebalance interval in second
+            fee_rate: fee per traded value (negative for a rebate)
+            spread: relative bid/ask spread around the last price
+        """
+        self.symbols = [s for s in symbols if s != jpy_symbol]
+        self.JPY = jpy_symbol
+        self.kernel = RebalanceKernel(
+            [SymbolSpec(s, step_values[s], min_sizes[s], max_sizes[s])
+             for s in self.symbols])
+        self.interval = interval
+        self.fee_rate = fee_rate
+        self.spread = spread
+
+
+    def load(self, store, start, end):
+        """returns dict of (timestamp, price) of the symbols from TradeStore
+        """
+        prices = {}
+        for symbol in self.symbols:
+            trades = store.query(symbol, start, end)
+            prices[symbol] = (trades["timestamp"], trades["price"])
+        return prices
+
+
+    def decide(self, jpy, amount, last, bid, ask):
+        """rebalance rule of ShannonsDaemon for arrays of steps x symbols.
+        returns (side, nlot, size, price), nlot == 0 means no order
+        """
+        return self.kernel(jpy, amount, last, bid, ask)
+
+
+    def run(self, prices, assets, start=None, end=None, window=256):
+        """
+        Args:
+            prices: dict of (timestamp, price) arrays of each symbol
+            assets: dict of initial amount of each symbol and JPY
+            start, end: range of the replay (default: range of prices)
+        """
+        if start is None:
+            start = max(int(prices[s][0][0]) for s in self.symbols)
+        if end is None:
+            end = max(int(prices[s][0][-1]) for s in self.symbols) + 1
+        start, end = to_millis(start), to_millis(end)
+        grid = np.arange(start, end, self.interval * 1000, dtype=np.int64)
+
+        columns = [resample(*prices[s], grid, self.interval * 1000)
+                   for s in self.symbols]
+        last = np.stack([c[0] for c in columns], axis=1)
+        low = np.stack([c[1] for c in columns], axis=1)
+        high = np.stack([c[2] for c in columns], axis=1)
+        bid = last * (1 - self.spread / 2)
+        ask = last * (1 + self.spread / 2)
+
+        # start when every symbol has a price
+        k = int(np.argmax(np.all(np.isfinite(last), axis=1)))
+        n = len(grid)
+        jpy = float(assets.get(self.JPY, 0))
+        amount = np.array([float(assets.get(s, 0)) for s in self.symbols])
+
+        event_steps = [k]
+        event_jpy = [jpy]
+        event_amount = [amount.copy()]
+        trades = np.zeros(len(self.symbols), dtype=np.int64)
+        volume = np.zeros(len(self.symbols))
+        fees = 0.0
+
+        while k < n - 1:
+            w = slice(k, min(k + window, n - 1))
+            side, nlot, size, price = self.decide(
+                jpy, amount, last[w], bid[w], ask[w])
+            value = size * price
+            buy = side == Side.BUY.value
+            filled = (nlot > 0) & np.where(buy, low[w] <= price,
+                                           high[w] >= price)
+            # the exchange rejects orders the balance cannot cover
+            filled &= np.where(buy, value * (1 + max(self.fee_rate, 0)) <= jpy,
+                               size <= amount)
+            hit = np.flatnonzero(filled.any(axis=1))
+            if len(hit) == 0:
+                k = w.stop
+                window = min(window * 2, 65536)
+                continue
+
+            j = hit[0]
+            f = filled[j]
+            amount = amount + np.where(f, side[j] * size[j], 0)
+            cost = np.sum(np.where(f, side[j] * value[j], 0))
+            fee = np.sum(np.where(f, value[j], 0)) * self.fee_rate
+            jpy = jpy - cost - fee
+            trades += f
+            volume += np.where(f, value[j], 0)
+            fees += fee
+
+            k = k + j + 1
+            window = max(32, 2 * (j + 1))
+            event_steps.append(k)
+            event_jpy.append(jpy)
+            event_amount.append(amount.copy())
+
+        # holdings are constant between fills
+        first = event_steps[0]
+        pos = np.searchsorted(event_steps, np.arange(first, n),
+                              side="right") - 1
+        holdings = np.array(event_amount)[pos]
+        cash = np.array(event_jpy)[pos]
+        equity = cash + np.sum(holdings * last[first:], axis=1)
+        return BacktestResult(
+            symbols = self.symbols,
+            timestamp = grid[first:],
+            equity = equity,
+            holdings = holdings,
+            jpy = cash,
+            trades = trades,
+            volume = volume,
+            fees = fees
+        )
@@ -0,0 +1,160 @@
+import numpy as np
+
+from .history import overlap
+from .store import to_millis
+
+
+# resolution name: length in millisecond
+RESOLUTIONS = {
+    "1s": 1000,
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+}
+
+
+class BarSeries(object):
+    """OHLCV bars of one resolution.
+    the bar being built is updated in O(1) per trade and closed bars are
+    kept in a ring buffer of fixed capacity.
+    """
+    fields = ("start", "open", "high", "low", "close", "volume")
+
+    def __init__(self, length, capacity=1000):
+        """
+        Args:
+            length: bar length in millisecond
+            capacity: number of closed bars kept
+        """
+        self.length = length
+        self.capacity = capacity
+        self.buffer = np.zeros((capacity, len(self.fields)))
+        self.count = 0      # number of closed bars ever
+        self.current = None # [start, open, high, low, close, volume]
+        self.late = 0       # trades older than the current bar
+
+
+    def update(self, timestamp, price, size):
+        start = timestamp - timestamp % self.length
+        bar = self.current
+        if bar is None or start > bar[0]:
+            if bar is not None:
+                self.buffer[self.count % self.capacity] = bar
+                self.count += 1
+            self.current = [start, price, price, price, price, size]
+        elif start == bar[0]:
+            if price > bar[2]:
+                bar[2] = price
+            elif price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += size
+        else:
+            self.late += 1
+
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+
+    def bars(self, n=None, partial=False):
+        """returns dict of arrays of the last n closed bars
+        (and the bar being built if partial) in chronological order
+        """
+        size = len(self)
+        if n is not None:
+            size = min(n, size)
+        end = self.count % self.capacity
+        idx = np.arange(end - size, end) % self.capacity
+        rows = self.buffer[idx]
+        if partial and self.current is not None:
+            rows = np.vstack([rows, self.current])
+        return {name: rows[:, i] for i, name in enumerate(self.fields)}
+
+
+class BarAggregator(object):
+    """builds OHLCV bars of several resolutions at once from trades
+    of the REST api, the trades channel of the websocket api
+    (see stream.TradeStream) or the TradeStore.
+    """
+    def __init__(self, resolutions=("1s", "1m", "5m", "1h"), capacity=1000):
+        """
+        Args:
+            resolutions: names of RESOLUTIONS
+            capacity: number of closed bars kept per symbol and resolution
+        """
+        self.resolutions = list(resolutions)
+        self.capacity = capacity
+        self.series = {}
+        self.last_timestamp = {}
+        # (price, size, side) of the trades in the last millisecond
+        # of each symbol, newest first
+        self.last_trades = {}
+
+
+    def get_series(self, symbol):
+        if symbol not in self.series:
+            self.series[symbol] = [
+                BarSeries(RESOLUTIONS[r], self.capacity)
+                for r in self.resolutions
+            ]
+        return self.series[symbol]
+
+
+    def add_trade(self, symbol, timestamp, price, size, side=None):
+        """
+        Args:
+            timestamp: unix time in millisecond
+            side: side of the trade (str) if known, it tells apart
+                  the trades of a millisecond in add_trades
+        """
+        for series in self.get_series(symbol):
+            series.update(timestamp, price, size)
+        last = self.last_timestamp.get(symbol, -1)
+        if timestamp > last:
+            self.last_timestamp[symbol] = timestamp
+            self.last_trades[symbol] = [(price, size, side)]
+        elif timestamp == last:
+            self.last_trades[symbol].insert(0, (price, size, side))
+
+
+    def add_trades(self, symbol, trades):
+        """adds trades of GmoApi.get_execution_history (newest first)
+        that were not added yet.
+        several trades can share a millisecond and a page can end in
+        the middle of them, so the trades of the last added millisecond
+        are told apart by price, size, side and position: the ones
+        the page repeats are skipped and the newer ones are added
+        """
+        last = self.last_timestamp.get(symbol, -1)
+        seen = self.last_trades.get(symbol, [])
+        trades = [(to_millis(t["timestamp"]), float(t["price"]),
+                   float(t["size"]), t.get("side")) for t in trades]
+        repeated = [(p, s, side) for t, p, s, side in trades if t == last]
+        if any(side is None for _, _, side in seen):
+            # added without side (e.g. from the websocket)
+            repeated = [(p, s, None) for p, s, _ in repeated]
+        skip = overlap(repeated, seen)
+        for timestamp, price, size, side in reversed(trades):
+            if timestamp < last:
+                continue
+            if timestamp == last and skip:
+                skip -= 1
+                continue
+            self.add_trade(symbol, timestamp, price, size, side)
+
+
+    def add_arrays(self, symbol, timestamp, price, size):
+        """adds columns of TradeStore.query
+        """
+        for t, p, s in zip(np.asarray(timestamp).tolist(),
+                           np.asarray(price).tolist(),
+                           np.asarray(size).tolist()):
+            self.add_trade(symbol, t, p, s)
+
+
+    def bars(self, symbol, resolution, n=None, partial=False):
+        """returns dict of arrays (start, open, high, low, close, volume)
+        """
+        i = self.resolutions.index(resolution)
+        return self.get_series(symbol)[i].bars(n, partial)
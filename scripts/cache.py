@@ -0,0 +1,107 @@
+import threading
+from time import monotonic
+
+
+class _Fetch(object):
+    """a fetch in flight that other callers of the same key wait for
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TtlCache(object):
+    """thread-safe cache of fetched values with a ttl per call.
+    concurrent callers of a missing key share one in-flight fetch.
+    keys are tuples whose first item names the endpoint, and hits,
+    misses and coalesced calls are counted per endpoint.
+    """
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}     # key: (time, value)
+        self.inflight = {}    # key: _Fetch
+        self.counters = {}    # endpoint: {"hit": n, "miss": n, "coalesced": n}
+
+
+    def count(self, key, name):
+        counter = self.counters.get(key[0])
+        if counter is None:
+            counter = self.counters[key[0]] = {"hit": 0, "miss": 0,
+                                               "coalesced": 0}
+        counter[name] += 1
+
+
+    def get(self, key, ttl, fetch):
+        """returns the value of key fetched less than ttl seconds ago,
+        or calls fetch() (once for all concurrent callers)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.clock() - entry[0] < ttl:
+                self.count(key, "hit")
+                return entry[1]
+
+            pending = self.inflight.get(key)
+            if pending is None:
+                pending = self.inflight[key] = _Fetch()
+                owner = True
+                self.count(key, "miss")
+            else:
+                owner = False
+                self.count(key, "coalesced")
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = fetch()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                if pending.error is None:
+                    self.entries[key] = (self.clock(), pending.value)
+                del self.inflight[key]
+            pending.done.set()
+        return pending.value
+
+
+    def invalidate(self, endpoint=None):
+        """drops the entries of endpoint (all entries if None)
+        """
+        with self.lock:
+            if endpoint is None:
+                self.entries.clear()
+            else:
+                for key in [k for k in self.entries if k[0] == endpoint]:
+                    del self.entries[key]
+
+
+    def stats(self):
+        with self.lock:
+            return {endpoint: dict(counter)
+                    for endpoint, counter in self.counters.items()}
+
+
+class NullCache(object):
+    """cache that stores nothing, every get calls fetch()
+    """
+    def get(self, key, ttl, fetch):
+        return fetch()
+
+
+    def invalidate(self, endpoint=None):
+        pass
+
+
+    def stats(self):
+        return {}
+
+
+NULL_CACHE = NullCache()
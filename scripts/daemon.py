@@ -1,15 +1,25 @@
-from math import log2, ceil, floor
-from time import sleep
+import asyncio
+import threading
+from time import monotonic
 from pprint import pprint
 
+import numpy as np
+
 from .data import *
+from .kernel import RebalanceKernel
+from .orders import OrderStore
+from .portfolio import Portfolio
+from .schedule import CycleScheduler
+from .metrics import NULL_METRICS
 
 class ShannonsDaemon(object):
     """auto-trading bot based on Shannon's Demon.
     """
     def __init__(self, api, symbols,
                  min_sizes, max_sizes, step_values,
-                 delay=15, jpy_symbol="JPY"):
+                 delay=15, jpy_symbol="JPY", order_stream=None,
+                 archive_path=None, retention=3600, metrics=None,
+                 threshold=0.0, assets_refresh=10):
         """
         Args:
             api: api client (see api.py)
@@ -17,97 +27,366 @@ class ShannonsDaemon(object):
             min_lot: dict of minimum lot
             max_lot: dict of maximum lot
             step_value: step values of each coin
+            order_stream: started OrderEventStream that keeps
+                          the posted orders up to date (see stream.py),
+                          the orders are polled with get_orders without it
+            archive_path: file the finished orders are archived to
+            retention: seconds finished orders are kept in memory
+            metrics: Metrics recording cycle, rebalance and post-to-ack
+                     times (defaults to the metrics of api)
+            threshold: orders are made only when a weight deviates from
+                       the balanced weight by this ratio or more
+                       (see Portfolio.deviation), 0 rebalances every cycle
+            assets_refresh: maximum number of consecutive cycles that
+                            reuse the last fetched assets while no order
+                            of this daemon is active (deposits, manual
+                            trades or other daemons of the account move
+                            them too), 0 fetches them every cycle
         """
         self.api = api
+        if metrics is None:
+            metrics = getattr(api, "metrics", NULL_METRICS)
+        self.metrics = metrics
+        self.order_stream = order_stream
         self.delay = delay
-        self.symbols = symbols
+        self.symbols = list(symbols)
         self.JPY = jpy_symbol
-        if self.JPY not in symbols:
+        if self.JPY not in self.symbols:
             self.symbols.append(self.JPY)
-        self.posting_orders = []
-        Size.min_sizes = min_sizes
-        Size.max_sizes = max_sizes
-        Price.step_values = step_values
+        self.orders = OrderStore(archive_path, retention)
+        if order_stream is not None:
+            order_stream.add_listener(
+                lambda channel, order: self.orders.update(order))
+        self.cryptos = [s for s in self.symbols if s != self.JPY]
+        # specs of this daemon, Price and Size are built with them
+        # so that daemons with different configs can coexist
+        for s in self.cryptos:
+            if s not in step_values:
+                raise KeyError(f"specify step value of {s}")
+            if s not in min_sizes:
+                raise KeyError(f"specify the minimum size of {s}")
+            if s not in max_sizes:
+                raise KeyError(f"specify the maximum size of {s}")
+        self.specs = {s: SymbolSpec(s, step_values[s],
+                                    min_sizes[s], max_sizes[s])
+                      for s in self.cryptos}
+        self.kernel = RebalanceKernel([self.specs[s] for s in self.cryptos])
+        self.threshold = threshold
+        self.portfolio = Portfolio(self.cryptos, self.JPY)
+        # True while the amounts may have moved since get_assets
+        self.assets_stale = True
+        self.assets = None   # the last fetched assets
+        self.assets_refresh = assets_refresh
+        self.assets_reused = 0   # cycles since the last get_assets
+        self.stopped = threading.Event()
 
 
 
     def rebalance(self, assets, ticker):
         """returns list of orders
         """
-        # solve balanced price
-        total = 0
-        for symbol in self.symbols:
-            if symbol == self.JPY:
-                total += assets[symbol].amount
-            else: # crypto
-                total += assets[symbol].amount * ticker[symbol].last
-        balanced_val = total / len(self.symbols)
+        cryptos = self.cryptos
+        side, nlot, _, _ = self.kernel(
+            assets[self.JPY].amount,
+            np.array([assets[s].amount for s in cryptos]),
+            np.array([ticker[s].last for s in cryptos]),
+            np.array([ticker[s].bid for s in cryptos]),
+            np.array([ticker[s].ask for s in cryptos])
+        )
 
         # make orders
         orders = []
-        for symbol in self.symbols:
-            if symbol == self.JPY:
-                continue
-
-            amount = assets[symbol].amount
-            rate = ticker[symbol].last
-            if amount*rate / balanced_val < 1:
-                side = Side.BUY
+        for i in np.flatnonzero(nlot).tolist():
+            symbol = cryptos[i]
+            spec = self.kernel.specs[i]
+            side_i = Side(int(side[i]))
+            # decide price
+            if side_i is Side.BUY:
+                p = ticker[symbol].bid
             else:
-                side = Side.SELL
-            nlot = Size(symbol, val=abs(amount - balanced_val/rate)).lot
-
-            # decide number of lot using entropy
-            ratio = lambda n: (amount + side.value*Size(symbol, lot=n).actual_value) / balanced_val
-            r0, r1 = ratio(nlot), ratio(nlot-1)
-            if -r0*log2(r0) < -r1*log2(r1):
-                nlot = nlot - 1
-
-            if nlot > 0:
-                # decide price
-                if side is Side.BUY:
-                    p = ticker[symbol].bid
-                else:
-                    p = ticker[symbol].ask
-
-                orders.append(
-                    Order(
-                        symbol = symbol,
-                        side = side,
-                        size = Size(symbol, lot=nlot),
-                        execution_type = ExecutionType.LIMIT,
-                        price = Price(symbol, p),
-                        time_in_force = "SOK"
-                    )
+                p = ticker[symbol].ask
+
+            orders.append(
+                Order(
+                    symbol = symbol,
+                    side = side_i,
+                    size = Size(symbol, lot=int(nlot[i]), spec=spec),
+                    execution_type = ExecutionType.LIMIT,
+                    price = Price(symbol, p, spec=spec),
+                    time_in_force = "SOK"
                 )
+            )
         return orders
 
 
-    def run(self):
-        if not self.api.is_available():
-            raise RuntimeError("Exchange is not available now")
+    def run(self, ticker=None, assets=None, check_status=True):
+        """rebalances once.
+        Args:
+            ticker: dict of Ticker, fetched from the api if not given
+            assets: dict of Asset, fetched from the api if not given
+            check_status: checks the exchange status first
+        """
+        with self.metrics.timer("cycle_seconds"):
+            if check_status and not self.api.is_available():
+                raise RuntimeError("Exchange is not available now")
+
+            self.reconcile()
+            if ticker is None:
+                ticker = self.api.get_ticker(self.symbols)
+            self.portfolio.update(ticker=ticker)
+            if self.assets_reusable() and self.balanced():
+                # no order can have filled since the last get_assets
+                self.assets_reused += 1
+                return
+            if assets is None:
+                assets = self.api.get_assets(self.symbols)
+                self.assets_reused = 0
+            else:
+                self.assets_reused += 1
+            self.assets = assets
+            self.portfolio.update(assets=assets)
+            self.assets_stale = bool(self.orders.active())
+            if self.balanced():
+                return
+            with self.metrics.timer("rebalance_seconds"):
+                orders = self.rebalance(assets, ticker)
+
+            # post orders
+            for order in orders:
+                pprint(order)
+                with self.metrics.timer("order_ack_seconds",
+                                        symbol=order.symbol):
+                    order.ID = self.api.post_order(order)
+                self.track(order)
+            if orders:
+                self.assets_stale = True
+
+
+    def assets_reusable(self):
+        """returns True if the last fetched assets can be used
+        instead of calling get_assets
+        """
+        return not self.assets_stale and \
+               self.assets_reused < self.assets_refresh
+
+
+    def balanced(self):
+        """returns True if the portfolio is within the threshold
+        """
+        if self.threshold > 0 and self.portfolio.deviation() < self.threshold:
+            self.metrics.inc("rebalance_skipped")
+            return True
+        return False
+
+
+    def track(self, order):
+        """starts following a posted order
+        """
+        if order.status is OrderStatus.UNORDERED:
+            order.status = OrderStatus.ACTIVE
+        self.orders.add(order)
+        if self.order_stream is not None:
+            self.order_stream.track(order)
 
-        assets = self.api.get_assets(self.symbols)
-        ticker = self.api.get_ticker(self.symbols)
-        orders = self.rebalance(assets, ticker)
 
-        # post orders
-        for order in orders:
-            pprint(order)
-            order.ID = self.api.post_order(order)
-            self.posting_orders.append(order)
-            # print(order_id)
-            # sleep(0.4)
+    @property
+    def posting_orders(self):
+        """orders which are not completed, canceled or expired
+        """
+        return self.orders.active()
+
+
+    def reconcile(self):
+        """updates the status of the posting orders (pushed by order_stream
+        or polled in batches) and evicts the old finished ones
+        """
+        if self.order_stream is None:
+            self.orders.reconcile(self.api)
+        self.orders.evict()
 
-        # check orders
 
+    def run_forever(self, scheduler=None):
+        """runs every delay seconds on a fixed-rate clock, backing off
+        after failures (see CycleScheduler)
+        """
+        if scheduler is None:
+            scheduler = CycleScheduler(self.delay, metrics=self.metrics)
+        self.scheduler = scheduler
+        scheduler.run(self.run)
+
+
+    def run_streaming(self, stream, min_interval=1, status_interval=60):
+        """rebalances on every price update of the ticker stream
+        instead of polling the ticker every delay seconds, until stop()
+        is called. the streamed ticker is used as is, the exchange
+        status is checked every status_interval seconds, and the assets
+        are fetched only while they may have moved (orders posted or
+        active), so an update without fills makes no REST call when the
+        posted orders are followed by an order stream.
+        Args:
+            stream: TickerStream of the symbols (see stream.py)
+            min_interval: minimum interval in second between rebalances
+            status_interval: interval in second between status checks
+        """
+        checked = None   # time the exchange was last seen open
+        with stream:
+            while not self.stopped.is_set():
+                ticker = stream.wait(1)
+                if ticker is None or \
+                   any(s not in ticker for s in self.cryptos):
+                    continue
+                try:
+                    now = monotonic()
+                    if checked is None or now - checked >= status_interval:
+                        if not self.api.is_available():
+                            raise RuntimeError(
+                                "Exchange is not available now")
+                        checked = now
+                    assets = self.assets if self.assets_reusable() else None
+                    self.run(ticker, assets, check_status=False)
+                except Exception as e:
+                    checked = None
+                    self.metrics.inc("cycle_errors", error=type(e).__name__)
+                    print(f"Error: {e}")
+                finally:
+                    self.stopped.wait(min_interval)
+
+
+    def stop(self):
+        """stops run_forever or run_streaming
+        """
+        self.stopped.set()
+        scheduler = getattr(self, "scheduler", None)
+        if scheduler is not None:
+            scheduler.stop()
+
+
+
+class AsyncShannonsDaemon(ShannonsDaemon):
+    """ShannonsDaemon driven by an AsyncApi client (see api.py).
+    status, assets and ticker are fetched concurrently and
+    the orders of a rebalance are posted concurrently.
+    """
+    def __init__(self, api, symbols,
+                 min_sizes, max_sizes, step_values,
+                 delay=15, jpy_symbol="JPY", order_stream=None,
+                 archive_path=None, retention=3600, max_concurrency=4,
+                 metrics=None, threshold=0.0, assets_refresh=10):
+        """
+        Args:
+            max_concurrency: maximum number of orders posted at once
+            (see ShannonsDaemon for the others)
+        """
+        super().__init__(api, symbols, min_sizes, max_sizes, step_values,
+                         delay, jpy_symbol, order_stream,
+                         archive_path, retention, metrics, threshold,
+                         assets_refresh)
+        self.max_concurrency = max_concurrency
+
+
+    async def reconcile(self):
+        if self.order_stream is None:
+            batches = self.orders.batches(self.api.max_order_ids)
+            results = await asyncio.gather(
+                *[self.api.get_orders(batch) for batch in batches])
+            for batch, found in zip(batches, results):
+                self.orders.reconciled(batch, found)
+        self.orders.evict()
+
+
+    async def post_order(self, order, semaphore):
+        async with semaphore:
+            with self.metrics.timer("order_ack_seconds",
+                                    symbol=order.symbol):
+                order.ID = await self.api.post_order(order)
+        self.track(order)
+        return order
+
+
+    async def run(self, ticker=None, assets=None, check_status=True):
+        """rebalances once (see ShannonsDaemon.run), the calls
+        of a cycle are made concurrently
+        """
+        async def given(value):
+            return value
+
+        with self.metrics.timer("cycle_seconds"):
+            fetch_assets = assets is None and not self.assets_reusable()
+            available, ticker, assets, _ = await asyncio.gather(
+                self.api.is_available() if check_status else given(True),
+                self.api.get_ticker(self.symbols) if ticker is None
+                else given(ticker),
+                self.api.get_assets(self.symbols) if fetch_assets
+                else given(assets),
+                self.reconcile()
+            )
+            if not available:
+                raise RuntimeError("Exchange is not available now")
+
+            self.portfolio.update(ticker=ticker)
+            if assets is None:
+                # reusable: fetched only if the portfolio must move
+                if self.balanced():
+                    self.assets_reused += 1
+                    return []
+                assets = await self.api.get_assets(self.symbols)
+                fetch_assets = True
+            if fetch_assets:
+                self.assets_reused = 0
+            else:
+                self.assets_reused += 1
+            self.assets = assets
+            self.portfolio.update(assets=assets)
+            self.assets_stale = bool(self.orders.active())
+            if self.balanced():
+                return []
+            with self.metrics.timer("rebalance_seconds"):
+                orders = self.rebalance(assets, ticker)
+            for order in orders:
+                pprint(order)
+
+            # post orders
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            orders = await asyncio.gather(
+                *[self.post_order(order, semaphore) for order in orders]
+            )
+            if orders:
+                self.assets_stale = True
+            return orders
+
+
+    async def run_streaming(self, stream, min_interval=1,
+                            status_interval=60):
+        """ShannonsDaemon.run_streaming on the event loop, the stream
+        is waited for on the default executor
+        """
+        loop = asyncio.get_running_loop()
+        checked = None   # time the exchange was last seen open
+        with stream:
+            while not self.stopped.is_set():
+                ticker = await loop.run_in_executor(None, stream.wait, 1)
+                if ticker is None or \
+                   any(s not in ticker for s in self.cryptos):
+                    continue
+                try:
+                    now = monotonic()
+                    if checked is None or now - checked >= status_interval:
+                        if not await self.api.is_available():
+                            raise RuntimeError(
+                                "Exchange is not available now")
+                        checked = now
+                    assets = self.assets if self.assets_reusable() else None
+                    await self.run(ticker, assets, check_status=False)
+                except Exception as e:
+                    checked = None
+                    self.metrics.inc("cycle_errors", error=type(e).__name__)
+                    print(f"Error: {e}")
+                finally:
+                    await asyncio.sleep(min_interval)
 
 
-    def run_forever(self):
-        while True:
-            try:
-                self.run()
-            except Exception as e:
-                print(f"Error: {e}")
-            finally:
-                sleep(self.delay)
+    async def run_forever(self, scheduler=None):
+        if scheduler is None:
+            scheduler = CycleScheduler(self.delay, metrics=self.metrics)
+        self.scheduler = scheduler
+        await scheduler.run_async(self.run)
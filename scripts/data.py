@@ -1,5 +1,7 @@
 from dataclasses import dataclass
+from decimal import Decimal
 from enum import Enum, auto
+from math import floor
 from numbers import Real
 
 
@@ -19,6 +21,7 @@ class Exchange(Enum):
     """
     GMO      = auto()
     bitFlyer = auto()
+    Simu     = auto()
 
 
 class OrderStatus(Enum):
@@ -50,27 +53,151 @@ class OrderStatus(Enum):
     ## GMOのEXPIREDに対応
     ## bitFlyerのEXPIRED, REJECTEDに対応
 
+    @property
+    def terminal(self):
+        """True if the order can no longer change
+        """
+        return self in (OrderStatus.COMPLETED,
+                        OrderStatus.CANCELED,
+                        OrderStatus.EXPIRED)
+
+
+# relative tolerance on the quotient x / step: the division of binary
+# floats is off by a few ulps (0.3 / 0.1 == 2.9999999999999996), so a
+# quotient this close to an integer is decided exactly with Decimal
+SNAP = 1e-12
+
+
+def floor_steps(x, step, scale, step_units):
+    """returns floor(x / step) for step = step_units / scale, exact on
+    the decimal value of float x (the shortest repr of it)
+    """
+    q = x / step
+    n = floor(q)
+    tolerance = SNAP * abs(q)
+    if tolerance < q - n < 1 - tolerance:
+        return n
+    # on a multiple of the step or a few ulps from one
+    units = round(x * scale)
+    if units / scale == x and -2**53 < units < 2**53:
+        # x has no more decimals than the scale: it is units exactly
+        return units // step_units
+    return floor(Decimal(repr(x)) * scale) // step_units
+
+
+def count_decimals(x):
+    """returns the number of decimal places of x (str or number)
+    """
+    exponent = Decimal(x if type(x) is str else repr(x)).normalize()\
+                   .as_tuple().exponent
+    return max(0, -exponent)
+
+
+def format_units(units, decimals, strip=False):
+    """formats the fixed-point number units * 10**-decimals exactly
+    """
+    if decimals == 0:
+        return str(units)
+    sign = "-" if units < 0 else ""
+    q, r = divmod(abs(units), 10**decimals)
+    frac = str(r).zfill(decimals)
+    if strip:
+        frac = frac.rstrip("0")
+        if not frac:
+            return f"{sign}{q}"
+    return f"{sign}{q}.{frac}"
+
+
+class SymbolSpec(object):
+    """step value and minimum/maximum size of a symbol,
+    compiled once into integer scales.
+    prices are counted in units of 10**-price_decimals and
+    sizes in units of 10**-size_decimals.
+    """
+    __slots__ = ("symbol", "source",
+                 "price_decimals", "price_scale", "step", "step_units",
+                 "size_decimals", "size_scale", "min_size",
+                 "min_units", "max_units")
+
+    def __init__(self, symbol, step_value=None, min_size=None, max_size=None):
+        self.symbol = symbol
+        self.source = (step_value, min_size, max_size)
+
+        self.step = None
+        if step_value is not None:
+            step_value = str(step_value)
+            self.price_decimals = count_decimals(step_value)
+            self.price_scale = 10**self.price_decimals
+            self.step = float(step_value)
+            self.step_units = int(Decimal(step_value) * self.price_scale)
+
+        self.min_size = None
+        if min_size is not None and max_size is not None:
+            self.size_decimals = max(count_decimals(min_size),
+                                     count_decimals(max_size))
+            self.size_scale = 10**self.size_decimals
+            self.min_size = float(min_size)
+            self.min_units = int(Decimal(repr(min_size)) * self.size_scale)
+            self.max_units = int(Decimal(repr(max_size)) * self.size_scale)
+
+
+    def __repr__(self):
+        return f"SymbolSpec(symbol={self.symbol}, source={self.source})"
+
+
+def get_spec(symbol):
+    """returns SymbolSpec of symbol compiled from Price.step_values,
+    Size.min_sizes and Size.max_sizes
+    """
+    return SymbolSpec(symbol,
+                      Price.step_values.get(symbol),
+                      Size.min_sizes.get(symbol),
+                      Size.max_sizes.get(symbol))
+
 
 class Price(object):
+    """price rounded down to the step value of the symbol,
+    held as an integer number of units
+    """
+    __slots__ = ("spec", "actual_value", "units")
     step_values = {}
-    def __init__(self, symbol, x):
-        if symbol not in Price.step_values:
+    # specs compiled from step_values, recompiled when they change
+    _specs = {}
+
+    def __init__(self, symbol, x, spec=None):
+        if spec is None:
+            step_value = Price.step_values.get(symbol)
+            spec = Price._specs.get(symbol)
+            if spec is None or spec.source[0] != step_value:
+                if step_value is None:
+                    raise KeyError(f"specify step value of {symbol}")
+                spec = SymbolSpec(symbol, step_value)
+                Price._specs[symbol] = spec
+
+        step = spec.step
+        if step is None:
             raise KeyError(f"specify step value of {symbol}")
+        self.spec = spec
+        self.actual_value = x = float(x)
+        self.units = floor_steps(x, step, spec.price_scale,
+                                 spec.step_units) \
+                     * spec.step_units
+
+
+    @property
+    def symbol(self):
+        return self.spec.symbol
 
-        actual_value = float(x)
-        step = Price.step_values[symbol]
-        if "." not in step:
-            step = int(step)
-            v = int((actual_value // step) * step)
-            self.actual_value = actual_value
-            self.value = str(v)
-        else:
-            precision = len(step.split(".")[1])
-            step = float(step)
-            v = str((actual_value // step) * step)
-            a, b = v.split(".")
-            self.actual_value = actual_value
-            self.value = f"{a}.{b[:self.precision]}"
+
+    @property
+    def value(self):
+        """price string sent to the exchange
+        """
+        return format_units(self.units, self.spec.price_decimals)
+
+
+    def __float__(self):
+        return self.units / self.spec.price_scale
 
 
     def __repr__(self):
@@ -78,31 +205,64 @@ class Price(object):
 
 
 class Size(object):
+    """size of lot times the minimum size (capped at the maximum size)
+    of the symbol, held as an integer number of units
+    """
+    __slots__ = ("spec", "lot", "units")
     min_sizes = {}
     max_sizes = {}
+    # deprecated: sizes are exact integer units now, so nothing is
+    # rounded to round_level digits; kept for configs that set it
     round_level = 8
-    def __init__(self, symbol, val=None, lot=None):
+    # specs compiled from min_sizes and max_sizes,
+    # recompiled when they change
+    _specs = {}
+
+    def __init__(self, symbol, val=None, lot=None, spec=None):
         if (val is None and lot is None) or\
            (val is not None and lot is not None):
             raise ValueError("specify either of x or lot")
 
-        if symbol not in Size.min_sizes:
-            raise KeyError(f"specify the minimum size of {symbol}")
-
-        if symbol not in Size.max_sizes:
-            raise KeyError(f"specify the maximum size of {symbol}")
+        if spec is None:
+            mins = Size.min_sizes.get(symbol)
+            maxs = Size.max_sizes.get(symbol)
+            spec = Size._specs.get(symbol)
+            if spec is None or spec.source[1] != mins \
+                            or spec.source[2] != maxs:
+                if mins is None:
+                    raise KeyError(f"specify the minimum size of {symbol}")
+                if maxs is None:
+                    raise KeyError(f"specify the maximum size of {symbol}")
+                spec = SymbolSpec(symbol, None, mins, maxs)
+                Size._specs[symbol] = spec
+        elif spec.min_size is None:
+            raise KeyError(f"specify the minimum and maximum size of {symbol}")
 
-        mins = Size.min_sizes[symbol]
-        maxs = Size.max_sizes[symbol]
         if lot is None:
             # val is given
-            self.lot = int(val // mins)
-        if val is None:
-            # lot is given
-            self.lot = lot
-        self.actual_value = round(min(self.lot * mins, maxs),
-                                  Size.round_level)
-        self.value = str(self.actual_value)
+            lot = floor_steps(float(val), spec.min_size,
+                              spec.size_scale, spec.min_units)
+        self.spec = spec
+        self.lot = lot
+        units = lot * spec.min_units
+        self.units = units if units < spec.max_units else spec.max_units
+
+
+    @property
+    def symbol(self):
+        return self.spec.symbol
+
+
+    @property
+    def actual_value(self):
+        return self.units / self.spec.size_scale
+
+
+    @property
+    def value(self):
+        """size string sent to the exchange
+        """
+        return format_units(self.units, self.spec.size_decimals, strip=True)
 
 
     def __repr__(self):
@@ -133,6 +293,7 @@ class Order:
     status: OrderStatus = OrderStatus.UNORDERED
     ID: str = -1
     timestamp: str = ""
+    executed_size: float = 0.0
 
     def __post_init__(self):
         # Type Check
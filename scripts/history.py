@@ -0,0 +1,300 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from requests import HTTPError
+
+from .data import Side
+from .store import to_millis
+from .utils import daterange
+
+
+class HistoryDownloader(object):
+    """downloads the trade archives of symbols x dates with a worker pool.
+    archives are stored as PATH/SYMBOL/YYYYMMDD_SYMBOL.csv.gz and
+    the ones already on disk are skipped, so an interrupted run resumes.
+    the partial downloads (.part) an interrupted run leaves are removed
+    when the next one starts, so do not run two downloads into the
+    same path at once.
+    """
+    def __init__(self, api, path, workers=8):
+        """
+        Args:
+            api: api client (see api.py)
+            path: root directory of the archives
+            workers: number of concurrent downloads
+        """
+        self.api = api
+        self.path = path
+        self.workers = workers
+
+
+    def get_jobs(self, symbols, start, end=None):
+        """returns list of (symbol, date, directory) to be downloaded
+        """
+        jobs = []
+        for symbol in symbols:
+            directory = os.path.join(self.path, symbol)
+            os.makedirs(directory, exist_ok=True)
+            self.clean(directory)
+            for date in daterange(start, end):
+                fname = self.api.get_history_filename(symbol, date)
+                if not os.path.exists(os.path.join(directory, fname)):
+                    jobs.append((symbol, date, directory))
+        return jobs
+
+
+    def clean(self, directory):
+        """removes the partial downloads left in directory
+        and returns their number
+        """
+        n = 0
+        for fname in os.listdir(directory):
+            if fname.endswith(".part"):
+                try:
+                    os.remove(os.path.join(directory, fname))
+                    n += 1
+                except FileNotFoundError:
+                    pass
+        return n
+
+
+    def download(self, symbols, start, end=None):
+        """downloads the archives from start to end (exclusive)
+        and returns the statistics
+        """
+        jobs = self.get_jobs(symbols, start, end)
+        stats = {
+            "downloaded": 0,
+            "missing": [],
+            "failed": [],
+            "errors": {},    # failed (symbol, date): reason
+            "bytes": 0,
+            "seconds": 0.0,
+        }
+        begin = time.perf_counter()
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = {
+                executor.submit(self.api.download_execution_history,
+                                symbol, date, directory): (symbol, date)
+                for symbol, date, directory in jobs
+            }
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    stats["bytes"] += future.result()
+                    stats["downloaded"] += 1
+                except HTTPError as e:
+                    if e.response is not None and \
+                       e.response.status_code == 404:
+                        # not published (e.g. future dates)
+                        stats["missing"].append(job)
+                    else:
+                        stats["failed"].append(job)
+                        stats["errors"][job] = \
+                            f"HTTP {e.response.status_code}" \
+                            if e.response is not None else str(e)
+                except Exception as e:
+                    stats["failed"].append(job)
+                    stats["errors"][job] = f"{type(e).__name__}: {e}"
+
+        stats["seconds"] = time.perf_counter() - begin
+        stats["missing"].sort()
+        stats["failed"].sort()
+        return stats
+
+
+def overlap(newer, older):
+    """returns the number of trades at the end of page newer
+    repeated at the start of page older
+    """
+    for k in range(min(len(newer), len(older)), 0, -1):
+        if newer[-k:] == older[:k]:
+            return k
+    return 0
+
+
+def shift(newer, older):
+    """returns the number of trades listed before the first trade of
+    page older in page newer, the same page fetched later,
+    None if a page or more of trades came in between
+    """
+    for k in range(len(newer)):
+        if newer[k:] == older[:len(newer) - k]:
+            return k
+    return 0 if not newer and not older else None
+
+
+class HistorySync(object):
+    """keeps a TradeStore up to date with the latest trades
+    of /v1/trades.
+    the trades are listed newest first by pages, so a sync reads pages
+    from the first one until it reaches the last stored trade of the
+    symbol. the pages after the first one are fetched by batches of
+    workers concurrently (queued on the HISTORY lane of the public
+    budget), and the first page is fetched again after each batch to
+    see whether new trades shifted the listing. in that case the pages
+    fetched at different times overlap or leave a gap: overlaps are
+    dropped and a page following a boundary without overlap is fetched
+    again, which closes the gap. when a page or more of new trades came
+    since the sync started, the pages can not be aligned anymore and
+    the sync starts again from the first page.
+    """
+    def __init__(self, api, store, workers=4, count=100, max_pages=100,
+                 restarts=3):
+        """
+        Args:
+            api: api client (see api.py)
+            store: TradeStore the trades are appended to
+            workers: number of pages fetched at once
+            count: trades per page (at most 100)
+            max_pages: maximum number of pages read by a sync
+            restarts: maximum number of restarts of a sync
+        """
+        self.api = api
+        self.store = store
+        self.workers = workers
+        self.count = min(count, 100)
+        self.max_pages = max_pages
+        self.restarts = restarts
+
+
+    def fetch(self, symbol, page):
+        """returns the page as list of (timestamp, price, size, side)
+        """
+        return [(to_millis(t["timestamp"]), float(t["price"]),
+                 float(t["size"]), Side[t["side"]].value)
+                for t in self.api.get_execution_history(symbol, page,
+                                                        self.count)]
+
+
+    def read_pages(self, symbol, reached, stats):
+        """reads the pages until reached(page) or max_pages and
+        returns the trades newest first without overlaps and whether
+        the last page was reached, None if the listing shifted by
+        a page or more
+        """
+        def fetch(page):
+            stats["pages"] += 1
+            return self.fetch(symbol, page)
+
+        first = head = fetch(1)
+        pages = [first]
+        shifted = set()   # pages fetched after new trades came
+        with ThreadPoolExecutor(self.workers) as executor:
+            while not reached(pages[-1]) and len(pages) < self.max_pages:
+                start = len(pages)
+                numbers = range(start + 1,
+                                min(start + self.workers, self.max_pages) + 1)
+                pages.extend(executor.map(
+                    lambda page: self.fetch(symbol, page), numbers))
+                stats["pages"] += len(numbers)
+                probe = fetch(1)
+                if probe != head:
+                    # the listing shifted while the batch was fetched
+                    if shift(probe, first) is None:
+                        return None
+                    head = probe
+                    for i in range(start, len(pages)):
+                        shifted.add(i)
+                        if not overlap(pages[i - 1], pages[i]):
+                            pages[i] = fetch(i + 1)
+                            stats["refetched"] += 1
+                for i in range(start, len(pages)):
+                    if reached(pages[i]):
+                        del pages[i + 1:]
+                        break
+        if shifted and shift(fetch(1), first) is None:
+            # the refetched pages may be a page or more apart
+            return None
+
+        # without a shift the pages are contiguous, and identical trades
+        # at a boundary are not an overlap
+        trades = list(pages[0])
+        for i in range(1, len(pages)):
+            k = overlap(pages[i - 1], pages[i]) if i in shifted else 0
+            trades.extend(pages[i][k:])
+        return trades, reached(pages[-1])
+
+
+    def sync(self, symbol, since=None):
+        """appends the trades newer than the stored ones (or than since
+        if nothing is stored) and returns the statistics.
+        the trades are not appended when max_pages are read without
+        reaching the stored ones (or since), which would leave a gap in
+        the store: "complete" is False and "gap" holds the oldest trade
+        read, then a sync with a larger max_pages is needed
+        """
+        last = self.store.last(symbol)
+        if last is not None:
+            # trades of the last stored millisecond: the newest one marks
+            # where the stored history starts in the listing
+            rows = list(zip(last["timestamp"].tolist(),
+                            last["price"].tolist(),
+                            last["size"].tolist(),
+                            last["side"].tolist()))
+            known = Counter(rows)
+            newest = rows[-1]   # the trades listed after it are stored
+            oldest = newest[0]
+        else:
+            known = Counter()
+            newest = None
+            oldest = None if since is None else to_millis(since)
+        stats = {"trades": 0, "pages": 0, "refetched": 0, "restarts": 0,
+                 "complete": True, "gap": None}
+
+        def reached(page):
+            return len(page) < self.count or \
+                   (oldest is not None and page[-1][0] < oldest) or \
+                   (newest is not None and newest in page)
+
+        result = self.read_pages(symbol, reached, stats)
+        while result is None and stats["restarts"] < self.restarts:
+            stats["restarts"] += 1
+            result = self.read_pages(symbol, reached, stats)
+        if result is None:
+            stats["complete"] = False
+            return stats
+        trades, stats["complete"] = result
+        if not stats["complete"] and oldest is not None:
+            stats["gap"] = trades[-1]
+            return stats
+
+        new = []
+        for trade in trades:
+            if trade == newest or \
+               (oldest is not None and trade[0] < oldest):
+                break
+            if known[trade] > 0:
+                known[trade] -= 1
+            else:
+                new.append(trade)
+        if new:
+            timestamp, price, size, side = zip(*reversed(new))
+            self.store.append(symbol, {
+                "timestamp": np.array(timestamp, dtype=np.int64),
+                "price": np.array(price, dtype=np.float64),
+                "size": np.array(size, dtype=np.float64),
+                "side": np.array(side, dtype=np.int8),
+            })
+        stats["trades"] = len(new)
+        return stats
+
+
+    def sync_all(self, symbols, since=None):
+        """syncs the symbols one after another and
+        returns dict of the statistics by symbol
+        """
+        return {symbol: self.sync(symbol, since) for symbol in symbols}
+
+
+def format_stats(stats):
+    seconds = max(stats["seconds"], 1e-9)
+    return (f"downloaded {stats['downloaded']} files "
+            f"({stats['bytes'] / 1e6:.1f} MB) in {seconds:.1f} s: "
+            f"{stats['downloaded'] / seconds:.1f} files/s, "
+            f"{stats['bytes'] / 1e6 / seconds:.2f} MB/s, "
+            f"{len(stats['missing'])} missing, "
+            f"{len(stats['failed'])} failed")
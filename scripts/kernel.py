@@ -0,0 +1,97 @@
+import numpy as np
+
+from .data import Side, SNAP, floor_steps
+
+
+def floor_steps_array(x, steps, scale, step_units):
+    """floor_steps of arrays (broadcast together)
+    """
+    # the multiples of 10**-decimals (most prices) are exact in units
+    units = np.round(x * scale)
+    exact = units / scale == x
+    n = np.where(exact, np.floor_divide(units, step_units), np.floor(x / steps))
+    if exact.all():
+        return n
+    # the others are not on a step, only ulps can put them on the wrong
+    # side of one
+    q = x / steps
+    fraction = q - n
+    tolerance = SNAP * np.abs(q)
+    rest = ~exact & ((fraction <= tolerance) | (fraction >= 1 - tolerance)) \
+           & np.isfinite(q)
+    if rest.any():
+        x, steps, scale, step_units = np.broadcast_arrays(
+            x, steps, scale, step_units)
+        for i in zip(*np.nonzero(rest)):
+            n[i] = floor_steps(float(x[i]), float(steps[i]),
+                               int(scale[i]), int(step_units[i]))
+    return n
+
+
+class RebalanceKernel(object):
+    """rebalance rule of ShannonsDaemon for arrays of symbols.
+    the sizes and prices follow the rounding of Size and Price, so
+    the result equals building them one by one.
+    """
+    def __init__(self, specs):
+        """
+        Args:
+            specs: list of SymbolSpec of the coins (without JPY)
+        """
+        self.specs = list(specs)
+        array = lambda name: np.array([getattr(spec, name)
+                                       for spec in self.specs],
+                                      dtype=np.float64)
+        self.min_sizes = array("min_size")
+        self.min_units = array("min_units")
+        self.max_units = array("max_units")
+        self.size_scale = array("size_scale")
+        self.steps = array("step")
+        self.step_units = array("step_units")
+        self.price_scale = array("price_scale")
+
+
+    def size_value(self, lot):
+        """Size(lot=lot).actual_value
+        """
+        return np.minimum(lot * self.min_units, self.max_units) \
+               / self.size_scale
+
+
+    def price_value(self, p):
+        """float(Price(p))
+        """
+        return floor_steps_array(p, self.steps, self.price_scale,
+                                 self.step_units) \
+               * self.step_units / self.price_scale
+
+
+    def __call__(self, jpy, amount, last, bid, ask):
+        """
+        Args:
+            jpy: amount of JPY, scalar or array of shape (...)
+            amount, last, bid, ask: arrays of shape (..., symbols)
+        Returns:
+            (side, nlot, size, price) of shape (..., symbols),
+            side is Side.value and nlot == 0 means no order
+        """
+        total = np.sum(amount * last, axis=-1, keepdims=True) \
+                + np.expand_dims(jpy, -1)
+        balanced_val = total / (len(self.specs) + 1)
+        side = np.where(amount * last / balanced_val < 1,
+                        Side.BUY.value, Side.SELL.value)
+        nlot = floor_steps_array(np.abs(amount - balanced_val / last),
+                                 self.min_sizes, self.size_scale,
+                                 self.min_units)
+
+        # decide number of lot using entropy
+        # (x log x of a non-positive ratio is nan and keeps nlot)
+        r0 = (amount + side * self.size_value(nlot)) / balanced_val
+        r1 = (amount + side * self.size_value(nlot - 1)) / balanced_val
+        with np.errstate(divide="ignore", invalid="ignore"):
+            decrease = -r0 * np.log2(r0) < -r1 * np.log2(r1)
+        nlot = np.where(decrease, nlot - 1, nlot)
+        nlot = np.where(np.isfinite(nlot) & (nlot > 0), nlot, 0)
+
+        price = self.price_value(np.where(side == Side.BUY.value, bid, ask))
+        return side, nlot, self.size_value(nlot), price
@@ -0,0 +1,364 @@
+import os
+import re
+import tempfile
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+
+# upper bounds in second of the latency histograms
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """counts of observed values per bucket
+    """
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        # the last count is for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+    def copy(self):
+        h = Histogram(self.bounds)
+        h.counts = list(self.counts)
+        h.count, h.sum, h.max = self.count, self.sum, self.max
+        return h
+
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+    def quantile(self, q):
+        """returns the upper bound of the bucket holding the q-quantile
+        (at most the maximum observed value)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class _Timer(object):
+    __slots__ = ("metrics", "key", "start")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+
+    def __enter__(self):
+        self.start = self.metrics.clock()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key,
+                              self.metrics.clock() - self.start)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        pass
+
+
+class Metrics(object):
+    """thread-safe registry of latency histograms and counters.
+    series are identified by a name and keyword labels, e.g.
+    metrics.observe("request_seconds", 0.02, path="/v1/ticker")
+    """
+    enabled = True
+
+    def __init__(self, buckets=BUCKETS, clock=perf_counter):
+        self.buckets = tuple(buckets)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.histograms = {}   # (name, labels): Histogram
+        self.counters = {}     # (name, labels): int
+
+
+    @staticmethod
+    def key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+
+    def _observe(self, key, value):
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+
+    def observe(self, name, value, **labels):
+        """adds value in second to the histogram of name
+        """
+        self._observe(self.key(name, labels), value)
+
+
+    def timer(self, name, **labels):
+        """returns a context manager observing the time spent in it
+        """
+        return _Timer(self, self.key(name, labels))
+
+
+    def inc(self, name, value=1, **labels):
+        """adds value to the counter of name
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def snapshot(self):
+        """returns copies of (histograms, counters)
+        """
+        with self.lock:
+            return ({key: h.copy() for key, h in self.histograms.items()},
+                    dict(self.counters))
+
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+class NullMetrics(Metrics):
+    """Metrics that records nothing, used when metrics are disabled
+    """
+    enabled = False
+    null_timer = _NullTimer()
+
+    def __init__(self):
+        super().__init__()
+
+
+    def observe(self, name, value, **labels):
+        pass
+
+
+    def timer(self, name, **labels):
+        return self.null_timer
+
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace('"', '\\"'))
+                          for k, v in labels) + "}"
+
+
+def render_prometheus(metrics, prefix="cryptobot_"):
+    """returns the metrics in the Prometheus text format
+    """
+    histograms, counters = metrics.snapshot()
+    clean = lambda name: prefix + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    lines = []
+    typed = set()
+
+    for (name, labels), h in sorted(histograms.items()):
+        name = clean(name)
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, n in zip(h.bounds, h.counts):
+            cumulative += n
+            le = labels + (("le", repr(bound)),)
+            lines.append(f"{name}_bucket{format_labels(le)} {cumulative}")
+        le = labels + (("le", "+Inf"),)
+        lines.append(f"{name}_bucket{format_labels(le)} {h.count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {h.sum!r}")
+        lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        name = clean(name) + "_total"
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def format_summary(metrics):
+    """returns one line per series: count, mean, p50, p99 and max in ms
+    """
+    histograms, counters = metrics.snapshot()
+    lines = []
+    for (name, labels), h in sorted(histograms.items()):
+        lines.append(
+            f"{name}{format_labels(labels)} n={h.count} "
+            f"mean={h.mean * 1e3:.2f}ms p50={h.quantile(0.5) * 1e3:.2f}ms "
+            f"p99={h.quantile(0.99) * 1e3:.2f}ms max={h.max * 1e3:.2f}ms")
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    return "\n".join(lines)
+
+
+class PrometheusFileSink(object):
+    """writes the metrics to a text file read by the node exporter's
+    textfile collector (the file is replaced atomically)
+    """
+    def __init__(self, metrics, path):
+        self.metrics = metrics
+        self.path = path
+
+
+    def write(self):
+        fd, tmp = tempfile.mkstemp(suffix=".part",
+                                   dir=os.path.dirname(self.path) or ".")
+        with os.fdopen(fd, "w") as f:
+            f.write(render_prometheus(self.metrics))
+        os.replace(tmp, self.path)
+
+
+    def close(self):
+        pass
+
+
+class PrometheusHttpSink(object):
+    """serves the metrics at http://host:port/metrics
+    """
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        """
+        Args:
+            metrics: Metrics to serve
+            port: port to listen on, 0 for any free port. there is no
+                  default: the usual exporter ports are taken on most
+                  hosts (9100 by the node exporter, which also reads
+                  the file of PrometheusFileSink)
+        """
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus(sink.metrics).encode()
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.metrics = metrics
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+
+    def write(self):
+        # scraped on demand
+        pass
+
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LogSink(object):
+    """prints a summary of the metrics
+    """
+    def __init__(self, metrics, log=print):
+        self.metrics = metrics
+        self.log = log
+
+
+    def write(self):
+        summary = format_summary(self.metrics)
+        if summary:
+            self.log(summary)
+
+
+    def close(self):
+        pass
+
+
+class MetricsReporter(object):
+    """calls write() of the sinks every interval seconds on a thread
+    """
+    def __init__(self, sinks, interval=60):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+
+    def write(self):
+        for sink in self.sinks:
+            try:
+                sink.write()
+            except Exception as e:
+                print(f"Error: {e}")
+
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
+        for sink in self.sinks:
+            sink.close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
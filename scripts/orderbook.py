@@ -0,0 +1,165 @@
+import heapq
+import threading
+
+import numpy as np
+
+from .data import Side
+
+
+class BookSide(object):
+    """price levels of one side of the book.
+    sizes are kept in a dict by price and the prices in a heap with
+    the best level on top, so setting or removing a level is O(log n)
+    and the best level is O(1) amortized. a removed level is left in
+    the heap and dropped when it comes to the top (or when the heap is
+    compacted), and the n best levels are read with a partial sort.
+    heap and sizes change together under a lock, since the stream
+    updates them on the websocket thread while others read the best
+    levels.
+    """
+    def __init__(self, side):
+        self.side = side
+        # heap key: -price for bids (best is highest),
+        # price for asks (best is lowest)
+        self.sign = -1 if side is Side.BUY else 1
+        self.lock = threading.Lock()
+        self.heap = []
+        self.sizes = {}
+
+
+    def clear(self):
+        with self.lock:
+            self.heap = []
+            self.sizes = {}
+
+
+    def update(self, price, size):
+        """sets the size of a level, size 0 removes it
+        """
+        with self.lock:
+            if size > 0:
+                if price not in self.sizes:
+                    heapq.heappush(self.heap, self.sign * price)
+                self.sizes[price] = size
+            elif price in self.sizes:
+                del self.sizes[price]
+                if len(self.heap) > 2 * len(self.sizes) + 64:
+                    # too many removed levels left in the heap
+                    self.heap = [self.sign * p for p in self.sizes]
+                    heapq.heapify(self.heap)
+
+
+    def replace(self, levels):
+        """replaces all levels by list of (price, size)
+        """
+        sizes = {p: s for p, s in levels if s > 0}
+        heap = [self.sign * p for p in sizes]
+        heapq.heapify(heap)
+        with self.lock:
+            self.sizes, self.heap = sizes, heap
+
+
+    def best(self):
+        """returns (price, size) of the best level or None
+        """
+        with self.lock:
+            heap, sizes = self.heap, self.sizes
+            # removed levels on top are dropped
+            while heap and self.sign * heap[0] not in sizes:
+                heapq.heappop(heap)
+            if not heap:
+                return None
+            price = self.sign * heap[0]
+            return price, sizes[price]
+
+
+    def levels(self, n=None):
+        """returns (prices, sizes) arrays of the n best levels, best first
+        """
+        with self.lock:
+            keys = [self.sign * p for p in self.sizes]
+            keys = sorted(keys) if n is None else heapq.nsmallest(n, keys)
+            prices = np.array(keys, dtype=np.float64) * self.sign
+            sizes = np.array([self.sizes[p] for p in prices.tolist()],
+                             dtype=np.float64)
+        return prices, sizes
+
+
+    def __len__(self):
+        return len(self.sizes)
+
+
+class OrderBook(object):
+    """local order book of a symbol, built from a snapshot and updated
+    in place from messages of the orderbooks websocket channel
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.asks = BookSide(Side.SELL)
+        self.bids = BookSide(Side.BUY)
+        self.timestamp = ""
+
+
+    @staticmethod
+    def parse_levels(levels):
+        return [(float(level["price"]), float(level["size"]))
+                for level in levels]
+
+
+    def apply_snapshot(self, asks, bids, timestamp=""):
+        """
+        Args:
+            asks, bids: list of {"price": str, "size": str}
+        """
+        self.asks.replace(self.parse_levels(asks))
+        self.bids.replace(self.parse_levels(bids))
+        self.timestamp = timestamp
+
+
+    def apply_diff(self, side, price, size):
+        """updates a level of side (Side.BUY for bids), size 0 removes it
+        """
+        book = self.bids if side is Side.BUY else self.asks
+        book.update(float(price), float(size))
+
+
+    def on_message(self, message):
+        """applies a message of the orderbooks channel.
+        GMO sends the whole book each time, diff messages carry
+        "side", "price" and "size"
+        """
+        if "asks" in message or "bids" in message:
+            self.apply_snapshot(message.get("asks", []),
+                                message.get("bids", []),
+                                message.get("timestamp", ""))
+        else:
+            self.apply_diff(Side[message["side"]],
+                            message["price"], message["size"])
+            self.timestamp = message.get("timestamp", self.timestamp)
+
+
+    def best_ask(self):
+        return self.asks.best()
+
+
+    def best_bid(self):
+        return self.bids.best()
+
+
+    def mid(self):
+        ask, bid = self.asks.best(), self.bids.best()
+        if ask is None or bid is None:
+            return None
+        return (ask[0] + bid[0]) / 2
+
+
+    def spread(self):
+        ask, bid = self.asks.best(), self.bids.best()
+        if ask is None or bid is None:
+            return None
+        return ask[0] - bid[0]
+
+
+    def __repr__(self):
+        return (f"OrderBook(symbol={self.symbol}, "
+                f"ask={self.best_ask()}, bid={self.best_bid()})")
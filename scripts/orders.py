@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+
+from .data import *
+
+
+class OrderStore(object):
+    """posted orders keyed by ID, indexed by symbol and OrderStatus.
+    only non-terminal orders are reconciled with the exchange; terminal
+    orders are evicted (and appended to an archive file if given) after
+    the retention time, so memory stays flat over long uptimes.
+    an order the exchange does not return max_misses times in a row
+    (rejected, or already pruned by the exchange) is marked EXPIRED.
+    the store is thread-safe: an OrderEventStream listener updates it
+    from the websocket thread while the daemon reads it.
+    """
+    def __init__(self, archive_path=None, retention=3600, clock=time.time,
+                 max_misses=3):
+        """
+        Args:
+            archive_path: json lines file the evicted orders are appended to
+            retention: seconds a terminal order is kept before eviction
+            max_misses: reconciles an order can be missing from the
+                        response of get_orders before it is expired
+        """
+        self.archive_path = archive_path
+        self.retention = retention
+        self.max_misses = max_misses
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.orders = {}
+        self.symbols = {}
+        self.statuses = {status: {} for status in OrderStatus}
+        self.indexed = {}      # ID: status the order is indexed under
+        self.closed_at = {}    # ID: time the order became terminal
+        self.misses = {}       # ID: consecutive reconciles it was missing
+
+
+    def __len__(self):
+        return len(self.orders)
+
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.orders.values()))
+
+
+    def __contains__(self, order_id):
+        return str(order_id) in self.orders
+
+
+    def get(self, order_id):
+        return self.orders.get(str(order_id))
+
+
+    def add(self, order):
+        """adds a posted order (its ID must be set)
+        """
+        order_id = str(order.ID)
+        with self.lock:
+            self.orders[order_id] = order
+            self.symbols.setdefault(order.symbol, {})[order_id] = order
+            self.indexed[order_id] = None
+            self.update(order)
+
+
+    def update(self, order):
+        """re-indexes order after its status has changed
+        """
+        order_id = str(order.ID)
+        with self.lock:
+            previous = self.indexed.get(order_id, False)
+            status = order.status
+            if previous is False or previous is status:
+                # not stored or unchanged
+                return
+            if previous is not None:
+                self.statuses[previous].pop(order_id, None)
+            self.statuses[status][order_id] = order
+            self.indexed[order_id] = status
+            if status.terminal:
+                self.closed_at.setdefault(order_id, self.clock())
+
+
+    def by_symbol(self, symbol):
+        with self.lock:
+            return list(self.symbols.get(symbol, {}).values())
+
+
+    def by_status(self, status):
+        with self.lock:
+            return list(self.statuses[status].values())
+
+
+    def active(self):
+        """returns the orders that are not terminal
+        """
+        with self.lock:
+            return [order for status, orders in self.statuses.items()
+                    if not status.terminal for order in orders.values()]
+
+
+    def batches(self, size):
+        """returns the non-terminal orders in chunks of size
+        """
+        orders = self.active()
+        return [orders[i:i + size] for i in range(0, len(orders), size)]
+
+
+    def reconcile(self, api):
+        """refreshes the status of the non-terminal orders with
+        batched api.get_orders calls and returns them
+        """
+        size = getattr(api, "max_order_ids", 10)
+        orders = []
+        for batch in self.batches(size):
+            orders += self.reconciled(batch, api.get_orders(batch))
+        return orders
+
+
+    def reconciled(self, batch, found):
+        """re-indexes the orders of batch after get_orders returned
+        found, expiring the ones missing too many times, and returns
+        the orders of batch
+        """
+        found = {str(order.ID) for order in found}
+        with self.lock:
+            for order in batch:
+                order_id = str(order.ID)
+                if order_id in found:
+                    self.misses.pop(order_id, None)
+                else:
+                    misses = self.misses.get(order_id, 0) + 1
+                    self.misses[order_id] = misses
+                    if misses >= self.max_misses:
+                        order.status = OrderStatus.EXPIRED
+                if order.status.terminal:
+                    self.misses.pop(order_id, None)
+                self.update(order)
+        return batch
+
+
+    def evict(self, now=None):
+        """removes the terminal orders older than the retention time
+        and returns them
+        """
+        if now is None:
+            now = self.clock()
+        evicted = []
+        with self.lock:
+            expired = [order_id for order_id, t in self.closed_at.items()
+                       if now - t >= self.retention]
+            for order_id in expired:
+                order = self.orders.pop(order_id)
+                del self.closed_at[order_id]
+                self.misses.pop(order_id, None)
+                self.statuses[self.indexed.pop(order_id)].pop(order_id, None)
+                symbol = self.symbols[order.symbol]
+                del symbol[order_id]
+                if not symbol:
+                    del self.symbols[order.symbol]
+                evicted.append(order)
+
+        if evicted and self.archive_path:
+            self.archive(evicted)
+        return evicted
+
+
+    def archive(self, orders):
+        directory = os.path.dirname(self.archive_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.archive_path, "a") as f:
+            for order in orders:
+                f.write(json.dumps({
+                    "ID": str(order.ID),
+                    "symbol": order.symbol,
+                    "side": order.side.name,
+                    "size": order.size.value,
+                    "price": order.price.value,
+                    "execution_type": order.execution_type.name,
+                    "status": order.status.name,
+                    "executed_size": order.executed_size,
+                    "timestamp": order.timestamp,
+                }) + "\n")
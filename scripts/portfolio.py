@@ -0,0 +1,86 @@
+class Portfolio(object):
+    """value of the holdings kept up to date incrementally.
+    a price or amount change updates the symbol's value and the total
+    in O(1), so the weights are available at any time without
+    recomputing the whole portfolio. the total is re-summed every
+    resync updates to drop the accumulated rounding error.
+    """
+    def __init__(self, symbols, jpy_symbol="JPY", resync=1000):
+        """
+        Args:
+            symbols: list of coins' symbol (JPY is added)
+        """
+        self.symbols = [s for s in symbols if s != jpy_symbol] + [jpy_symbol]
+        self.JPY = jpy_symbol
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        n = len(self.symbols)
+        self.amounts = [0.0] * n
+        self.prices = [0.0] * (n - 1) + [1.0]
+        self.values = [0.0] * n
+        self.total = 0.0
+        self.resync = resync
+        self.updates = 0
+
+
+    def set(self, i, amount, price):
+        value = amount * price
+        self.total += value - self.values[i]
+        self.values[i] = value
+        self.amounts[i] = amount
+        self.prices[i] = price
+        self.updates += 1
+        if self.updates >= self.resync:
+            self.total = sum(self.values)
+            self.updates = 0
+
+
+    def set_price(self, symbol, price):
+        i = self.index[symbol]
+        if price != self.prices[i]:
+            self.set(i, self.amounts[i], price)
+
+
+    def set_amount(self, symbol, amount):
+        i = self.index[symbol]
+        if amount != self.amounts[i]:
+            self.set(i, amount, self.prices[i])
+
+
+    def update(self, assets=None, ticker=None):
+        """applies dict of Asset and/or dict of Ticker (last price),
+        only the changed symbols are updated
+        """
+        if assets is not None:
+            for symbol in self.symbols:
+                asset = assets.get(symbol)
+                if asset is not None:
+                    self.set_amount(symbol, asset.amount)
+        if ticker is not None:
+            for symbol in self.symbols[:-1]:
+                t = ticker.get(symbol)
+                if t is not None:
+                    self.set_price(symbol, t.last)
+
+
+    def weight(self, symbol):
+        if self.total <= 0:
+            return 0.0
+        return self.values[self.index[symbol]] / self.total
+
+
+    def weights(self):
+        if self.total <= 0:
+            return {s: 0.0 for s in self.symbols}
+        return {s: v / self.total for s, v in zip(self.symbols, self.values)}
+
+
+    def deviation(self):
+        """returns the largest relative deviation of a weight from
+        the balanced weight 1 / (number of symbols),
+        e.g. 0.1 when a symbol holds 10% more or less than its share
+        (inf while the portfolio has no value)
+        """
+        if self.total <= 0:
+            return float("inf")
+        share = self.total / len(self.values)
+        return max(abs(v - share) for v in self.values) / share
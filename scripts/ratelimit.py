@@ -0,0 +1,114 @@
+import heapq
+import itertools
+import threading
+from enum import Enum
+from time import monotonic
+
+
+class Priority(Enum):
+    """priority lanes of RequestScheduler (smaller is served first)
+    """
+    CANCEL  = 0
+    ORDER   = 1
+    QUERY   = 2
+    HISTORY = 3
+
+
+class RequestScheduler(object):
+    """token bucket shared by every thread that sends requests
+    of one budget (e.g. GMO's private api).
+    a request waits for a token instead of failing; waiting requests
+    are served by priority, then in arrival order.
+    """
+    def __init__(self, rate, burst=None, clock=monotonic):
+        """
+        Args:
+            rate: tokens (requests) added per second
+            burst: capacity of the bucket (default: rate)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.queue = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+
+        # statistics
+        self.depth = {p: 0 for p in Priority}
+        self.served = {p: 0 for p in Priority}
+        self.wait_total = {p: 0.0 for p in Priority}
+        self.wait_max = {p: 0.0 for p in Priority}
+
+
+    def refill(self, now):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def acquire(self, priority=Priority.QUERY, timeout=None):
+        """blocks until the request may be sent and returns
+        the time waited in second
+        Args:
+            timeout: maximum wait in second, TimeoutError is raised
+                     after it (waits without limit if None)
+        """
+        with self.cond:
+            start = self.clock()
+            ticket = (priority.value, next(self.counter))
+            heapq.heappush(self.queue, ticket)
+            self.depth[priority] += 1
+            served = False
+            try:
+                while True:
+                    now = self.clock()
+                    self.refill(now)
+                    if self.queue[0] == ticket:
+                        if self.tokens >= 1:
+                            break
+                        wait = (1 - self.tokens) / self.rate
+                    else:
+                        wait = None
+                    if timeout is not None:
+                        left = start + timeout - now
+                        if left <= 0:
+                            raise TimeoutError(
+                                f"no token within {timeout} seconds")
+                        wait = left if wait is None else min(wait, left)
+                    self.cond.wait(wait)
+
+                heapq.heappop(self.queue)
+                served = True
+            finally:
+                if not served:
+                    # interrupted: the requests behind it must not wait
+                    # for a ticket that will never be served
+                    self.queue.remove(ticket)
+                    heapq.heapify(self.queue)
+                self.depth[priority] -= 1
+                # let the next request check whether it is at the head
+                self.cond.notify_all()
+            self.tokens -= 1
+            waited = now - start
+            self.served[priority] += 1
+            self.wait_total[priority] += waited
+            self.wait_max[priority] = max(self.wait_max[priority], waited)
+        return waited
+
+
+    def stats(self):
+        """returns queue depth and wait times of each priority lane
+        """
+        with self.cond:
+            return {
+                p.name: {
+                    "depth": self.depth[p],
+                    "served": self.served[p],
+                    "wait_mean": self.wait_total[p] / self.served[p]
+                                 if self.served[p] else 0.0,
+                    "wait_max": self.wait_max[p],
+                }
+                for p in Priority
+            }
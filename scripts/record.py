@@ -0,0 +1,350 @@
+import io
+import os
+import re
+import glob
+import gzip
+import json
+import base64
+import queue
+import threading
+from time import time, perf_counter, monotonic, sleep
+from urllib.parse import urlsplit
+
+import requests
+
+
+SEGMENT = re.compile(r"traffic-(\d+)\.jsonl\.gz$")
+
+
+class RecordingTransport(object):
+    """HttpTransport wrapper that records every request and response
+    (method, url, params, body, status, latency and response body)
+    into a log of gzip segments under path.
+    the requesting thread only enqueues the record; a writer thread
+    encodes and compresses it and starts a new segment every
+    segment_size bytes. the segment is flushed every flush_interval
+    seconds or flush_size bytes, not after every record, so that
+    light traffic is still compressed in large blocks.
+    headers are not recorded (they hold the keys), and bodies that are
+    not UTF-8 are recorded in base64. the body of a streamed download
+    (e.g. a trade archive) is left to the caller and not recorded: its
+    record is marked "streamed" and can not be replayed.
+    """
+    def __init__(self, transport, path, segment_size=64 * 2**20,
+                 max_queue=10000, flush_interval=1.0, flush_size=2**20):
+        """
+        Args:
+            transport: HttpTransport the requests are sent through
+            path: directory of the segments (traffic-NNNNNN.jsonl.gz)
+            segment_size: uncompressed bytes per segment
+            max_queue: records kept waiting for the writer, records
+                       beyond it are dropped instead of blocking
+            flush_interval: maximum seconds a written record waits
+                            before it is flushed to the segment
+            flush_size: uncompressed bytes that are flushed at once
+        """
+        self.transport = transport
+        self.path = path
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.failed = 0   # records that could not be written
+        os.makedirs(path, exist_ok=True)
+        # continue after the segments of previous sessions
+        # (the highest index, a deleted segment leaves a hole)
+        self.segment = max([int(m.group(1)) for m in
+                            map(SEGMENT.match, os.listdir(path)) if m],
+                           default=0)
+        self.file = None
+        self.written = 0
+        self.unflushed = 0
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        send = getattr(self.transport, method.lower())
+        start = perf_counter()
+        if params is None:
+            resp = send(url, data=data, **kwargs)
+        else:
+            resp = send(url, params=params, **kwargs)
+        latency = perf_counter() - start
+        # the body of a streamed download is left to the caller
+        streamed = bool(kwargs.get("stream"))
+        content = None if streamed else resp.content
+        try:
+            self.queue.put_nowait((time(), method, url, params, data,
+                                   resp.status_code, latency, content,
+                                   streamed))
+        except queue.Full:
+            self.dropped += 1
+        return resp
+
+
+    def get(self, url, params={}, headers={}, stream=False):
+        return self.request("GET", url, params=params, headers=headers,
+                            stream=stream)
+
+
+    def post(self, url, data=None, headers={}):
+        return self.request("POST", url, data=data, headers=headers)
+
+
+    def put(self, url, data=None, headers={}):
+        return self.request("PUT", url, data=data, headers=headers)
+
+
+    def delete(self, url, data=None, headers={}):
+        return self.request("DELETE", url, data=data, headers=headers)
+
+
+    # ---------- writer ----------
+
+    def open_segment(self):
+        self.segment += 1
+        name = "traffic-%06d.jsonl.gz" % self.segment
+        self.file = gzip.open(os.path.join(self.path, name), "wb",
+                              compresslevel=6)
+        self.written = 0
+        self.unflushed = 0
+
+
+    def write(self, record):
+        (t, method, url, params, data, status, latency, content,
+         streamed) = record
+        entry = {"time": t, "method": method, "url": url,
+                 "params": None if params is None else dict(params),
+                 "status": status, "latency": latency}
+        encode_body(entry, "body", data)
+        encode_body(entry, "response", content)
+        if streamed:
+            entry["streamed"] = True
+        line = json.dumps(entry, separators=(",", ":"),
+                          default=str).encode() + b"\n"
+        if self.file is None or self.written >= self.segment_size:
+            if self.file is not None:
+                self.file.close()
+            self.open_segment()
+        self.file.write(line)
+        self.written += len(line)
+        self.unflushed += len(line)
+
+
+    def write_loop(self):
+        flushed = monotonic()
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = False
+            if record is None:
+                break
+            if record is not False:
+                try:
+                    self.write(record)
+                except Exception as e:
+                    # a broken record must not stop the writer
+                    self.failed += 1
+                    print(f"Error: {e}")
+            now = monotonic()
+            if self.unflushed and \
+               (self.unflushed >= self.flush_size or
+                now - flushed >= self.flush_interval):
+                self.file.flush()
+                self.unflushed = 0
+                flushed = now
+        if self.file is not None:
+            self.file.close()
+
+
+    def close(self):
+        """writes the queued records and closes the log and transport
+        """
+        self.queue.put(None)
+        self.writer.join()
+        self.transport.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def encode_body(entry, name, body):
+    """stores body (str, bytes or None) in entry[name], bytes that are
+    not UTF-8 in entry[name + "_base64"]
+    """
+    if type(body) is bytes:
+        try:
+            body = body.decode()
+        except UnicodeDecodeError:
+            entry[name] = None
+            entry[name + "_base64"] = base64.b64encode(body).decode()
+            return
+    entry[name] = body
+
+
+def decode_body(record, name):
+    """returns the body of a recorded entry as bytes (b"" if None)
+    """
+    if name + "_base64" in record:
+        return base64.b64decode(record[name + "_base64"])
+    return (record[name] or "").encode()
+
+
+def read_log(path):
+    """yields the records of the segments under path in order.
+    a segment cut short (e.g. by a crash) is read up to the cut
+    """
+    for name in sorted(glob.glob(os.path.join(path, "traffic-*.jsonl.gz"))):
+        with gzip.open(name, "rb") as f:
+            try:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        yield json.loads(line)
+            except EOFError:
+                pass
+
+
+class ReplayError(LookupError):
+    pass
+
+
+class ReplayResponse(object):
+    """recorded response with the parts of requests.Response
+    the api clients use
+    """
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.raw = io.BytesIO(content)
+        self.headers = {}
+
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+
+    def json(self):
+        return json.loads(self.content)
+
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for url: "
+                                     f"{self.url}", response=self)
+
+
+    def close(self):
+        pass
+
+
+class ReplayTransport(object):
+    """transport that answers the requests with the responses of
+    a recorded log instead of sending them.
+    responses are matched by method and url path in recorded order,
+    so a session replays as long as the client asks for the same
+    endpoints in the same order.
+    at a given speed, each response is held until the time it was
+    received in the recording (relative to the first request, scaled
+    by speed), which replays both the latencies and the gaps between
+    the requests.
+    """
+    def __init__(self, path, speed=None, strict=False, clock=monotonic):
+        """
+        Args:
+            path: directory of a RecordingTransport log
+            speed: None to answer at once, or a factor of the recorded
+                   time (1 is the recorded speed, 10 is 10x faster)
+            strict: raises ReplayError when params or body differ
+                    from the recorded ones
+        """
+        self.speed = speed
+        self.strict = strict
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.responses = {}   # (method, path): list of records
+        self.served = 0
+        self.start = None     # recorded time of the first request
+        self.started = None   # clock() when the replay started
+        for record in read_log(path):
+            key = (record["method"], urlsplit(record["url"]).path)
+            self.responses.setdefault(key, []).append(record)
+            sent = record["time"] - record["latency"]
+            if self.start is None or sent < self.start:
+                self.start = sent
+        for records in self.responses.values():
+            records.reverse()
+
+
+    def request(self, method, url, params=None, data=None):
+        key = (method, urlsplit(url).path)
+        with self.lock:
+            records = self.responses.get(key)
+            if not records:
+                raise ReplayError(f"no recorded response for {method} {url}")
+            record = records.pop()
+            self.served += 1
+            if self.started is None:
+                self.started = self.clock()
+
+        if record.get("streamed"):
+            raise ReplayError(f"the body of {method} {url} was streamed "
+                              "and not recorded")
+        if self.strict:
+            if type(data) is str:
+                data = data.encode()
+            if params is not None and record["params"] != dict(params):
+                raise ReplayError(f"params differ: {params}")
+            if data is not None and decode_body(record, "body") != data:
+                raise ReplayError(f"body differs: {data}")
+        if self.speed:
+            due = self.started + (record["time"] - self.start) / self.speed
+            wait = due - self.clock()
+            if wait > 0:
+                sleep(wait)
+        content = decode_body(record, "response")
+        return ReplayResponse(url, record["status"], content)
+
+
+    def remaining(self):
+        """returns the number of recorded responses not served yet
+        """
+        with self.lock:
+            return sum(len(records) for records in self.responses.values())
+
+
+    def get(self, url, params={}, headers={}, stream=False):
+        return self.request("GET", url, params=params)
+
+
+    def post(self, url, data=None, headers={}):
+        return self.request("POST", url, data=data)
+
+
+    def put(self, url, data=None, headers={}):
+        return self.request("PUT", url, data=data)
+
+
+    def delete(self, url, data=None, headers={}):
+        return self.request("DELETE", url, data=data)
+
+
+    def close(self):
+        pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
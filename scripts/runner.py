@@ -0,0 +1,180 @@
+import heapq
+import asyncio
+import itertools
+import threading
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor
+
+from .api import get_crypto_api_client
+from .cache import TtlCache
+from .daemon import ShannonsDaemon
+from .metrics import NULL_METRICS
+from .utils import HttpTransport
+
+
+class Runner(object):
+    """hosts many daemons (accounts, symbol baskets, exchanges)
+    in one process.
+    the api clients of an exchange share one connection pool, one
+    market-data cache and the public budget, while each account has
+    its own private budget. the daemons are run by a single scheduler
+    on their own delay; daemons due at the same time run together on
+    a small pool, so their market data is fetched once.
+    an AsyncShannonsDaemon is run on an event loop of its worker thread.
+    """
+    def __init__(self, max_workers=4, transport=None, metrics=None,
+                 clock=monotonic):
+        """
+        Args:
+            max_workers: maximum number of daemons run at once
+            transport: HttpTransport shared by all clients
+            metrics: Metrics shared by all clients and daemons
+        """
+        if transport is None:
+            transport = HttpTransport(pool_size=max_workers * 2)
+        self.transport = transport
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.caches = {}              # exchange: TtlCache
+        self.public_schedulers = {}   # exchange: RequestScheduler
+        self.clients = {}             # (exchange, api_key): api client
+        self.daemons = {}             # name: daemon
+        self.queue = []               # (next run, order, name)
+        self.counter = itertools.count()
+        self.stats = {}               # name: {"runs", "errors", "seconds"}
+        self.stopped = threading.Event()
+
+
+    def get_api(self, exchange, api_key, secret_key):
+        """returns the api client of the account,
+        created with the shared resources of the exchange
+        """
+        key = (exchange, api_key)
+        api = self.clients.get(key)
+        if api is None:
+            if exchange not in self.caches:
+                self.caches[exchange] = TtlCache()
+                self.public_schedulers[exchange] = None
+            api = get_crypto_api_client(
+                exchange, api_key, secret_key,
+                transport=self.transport,
+                public_scheduler=self.public_schedulers[exchange],
+                cache=self.caches[exchange],
+                metrics=self.metrics)
+            if self.public_schedulers[exchange] is None:
+                self.public_schedulers[exchange] = api.public_scheduler
+            self.clients[key] = api
+        return api
+
+
+    def add(self, name, daemon):
+        """schedules daemon to run every daemon.delay seconds from now
+        """
+        if name in self.daemons:
+            raise ValueError(f"{name} is already added")
+        self.daemons[name] = daemon
+        self.stats[name] = {"runs": 0, "errors": 0, "seconds": 0.0}
+        heapq.heappush(self.queue, (self.clock(), next(self.counter), name))
+        return daemon
+
+
+    def add_config(self, name, config, **kwargs):
+        """creates and adds a ShannonsDaemon from a config
+        in the format of data/templates/config.yaml
+        """
+        api = self.get_api(config["exchange"],
+                           config["api-key"],
+                           config["secret-key"])
+        daemon = ShannonsDaemon(api,
+                                config["symbols"],
+                                config["min-sizes"],
+                                config["max-sizes"],
+                                config["step-values"],
+                                config.get("delay", 15),
+                                **kwargs)
+        return self.add(name, daemon)
+
+
+    def remove(self, name):
+        del self.daemons[name]
+        self.queue = [item for item in self.queue if item[2] != name]
+        heapq.heapify(self.queue)
+
+
+    def run_daemon(self, name):
+        daemon = self.daemons[name]
+        stats = self.stats[name]
+        start = self.clock()
+        try:
+            if asyncio.iscoroutinefunction(daemon.run):
+                asyncio.run(daemon.run())
+            else:
+                daemon.run()
+        except Exception as e:
+            stats["errors"] += 1
+            self.metrics.inc("cycle_errors", daemon=name,
+                             error=type(e).__name__)
+            print(f"Error: [{name}] {e}")
+        finally:
+            stats["runs"] += 1
+            stats["seconds"] += self.clock() - start
+
+
+    def run_due(self):
+        """runs the daemons that are due and reschedules them.
+        returns the names of the daemons run
+        """
+        now = self.clock()
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            due.append(heapq.heappop(self.queue))
+        if not due:
+            return []
+
+        futures = [self.executor.submit(self.run_daemon, name)
+                   for _, _, name in due]
+        for future in futures:
+            future.result()
+
+        now = self.clock()
+        for t, _, name in due:
+            if name not in self.daemons:
+                continue
+            delay = self.daemons[name].delay
+            # keep the phase, skipping the runs that are already missed
+            t += delay
+            if t <= now:
+                t += ((now - t) // delay + 1) * delay
+            heapq.heappush(self.queue, (t, next(self.counter), name))
+        return [name for _, _, name in due]
+
+
+    def run_forever(self):
+        """runs the daemons until stop() is called
+        """
+        while not self.stopped.is_set():
+            self.run_due()
+            if self.queue:
+                timeout = max(0.0, self.queue[0][0] - self.clock())
+            else:
+                timeout = 1.0
+            self.stopped.wait(timeout)
+
+
+    def stop(self):
+        self.stopped.set()
+
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.transport.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.close()
@@ -0,0 +1,198 @@
+import random
+import asyncio
+import threading
+from time import monotonic
+
+import requests
+
+from .metrics import Histogram, NULL_METRICS
+
+
+def classify(error):
+    """returns the kind of failure of a cycle:
+    "rate_limit", "server", "network", "maintenance", "api",
+    "client" or "other"
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 429:
+            return "rate_limit"
+        if status >= 500:
+            return "server"
+        return "client"
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return "network"
+    if isinstance(error, RuntimeError):
+        # raised by validate_response with GMO's messages
+        text = str(error)
+        if "ERR-5003" in text:
+            return "rate_limit"
+        if "ERR-5201" in text or "ERR-5202" in text:
+            return "maintenance"
+        return "api"
+    return "other"
+
+
+class CycleScheduler(object):
+    """runs cycles on a fixed-rate clock.
+    cycle k is due at start + k * period whatever the previous cycles
+    took, and the ticks that passed while a cycle overran are skipped
+    instead of being run back to back. after a failed cycle the next
+    one waits an exponential backoff with jitter chosen by the kind
+    of failure (see classify) and by the number of consecutive
+    failures of that kind, then the cycles return to the ticks of the
+    clock.
+    """
+    # kind: (first delay, maximum delay) in second,
+    # None as the first delay means the period
+    backoff = {
+        "rate_limit":  (1, 60),
+        "server":      (None, 300),
+        "network":     (None, 300),
+        "maintenance": (60, 900),
+        "api":         (None, 120),
+        "client":      (None, 120),
+        "other":       (None, 60),
+    }
+
+    def __init__(self, period, jitter=0.5, metrics=None, clock=monotonic,
+                 seed=None):
+        """
+        Args:
+            period: seconds between cycles
+            jitter: fraction of a backoff delay that is randomized
+        """
+        self.period = period
+        self.jitter = jitter
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.stopped = threading.Event()
+        self.loop = None            # event loop of run_async
+        self.async_stopped = None   # asyncio.Event of run_async
+        self.tick = None       # the last tick of the clock
+        self.deadline = None   # the time the next cycle is due
+        # consecutive failures by kind
+        self.failures = {kind: 0 for kind in self.backoff}
+
+        # statistics
+        self.cycles = 0
+        self.skipped = 0
+        self.errors = {kind: 0 for kind in self.backoff}
+        self.lateness = Histogram()
+
+
+    def start(self, now=None):
+        """sets the first deadline (now by default)
+        """
+        self.deadline = self.clock() if now is None else now
+        self.tick = self.deadline
+
+
+    def begin(self):
+        """records the lateness of the cycle starting now
+        """
+        late = max(0.0, self.clock() - self.deadline)
+        self.lateness.observe(late)
+        self.metrics.observe("cycle_lateness_seconds", late)
+
+
+    def done(self, error=None):
+        """sets the next deadline after a cycle and returns it
+        """
+        self.cycles += 1
+        now = self.clock()
+        if error is None:
+            for kind in self.failures:
+                self.failures[kind] = 0
+            tick = self.tick + self.period
+            if tick < now:
+                # overrun or backoff: skip to the next tick of the clock
+                missed = int((now - tick) // self.period) + 1
+                self.skipped += missed
+                self.metrics.inc("cycles_skipped", missed)
+                tick += missed * self.period
+            self.tick = self.deadline = tick
+        else:
+            kind = classify(error)
+            self.errors[kind] += 1
+            self.failures[kind] += 1
+            self.metrics.inc("cycle_errors", kind=kind,
+                             error=type(error).__name__)
+            self.deadline = now + self.backoff_delay(kind)
+        return self.deadline
+
+
+    def backoff_delay(self, kind):
+        first, cap = self.backoff[kind]
+        if first is None:
+            first = self.period
+        delay = min(cap, first * 2**(self.failures[kind] - 1))
+        return delay * (1 - self.jitter * self.random.random())
+
+
+    def wait(self):
+        """sleeps until the deadline, returns False if stopped
+        """
+        return not self.stopped.wait(max(0.0, self.deadline - self.clock()))
+
+
+    def run(self, cycle):
+        """calls cycle() on the clock until stop() is called
+        """
+        self.start()
+        while True:
+            self.begin()
+            try:
+                cycle()
+                self.done()
+            except Exception as e:
+                print(f"Error: {e}")
+                self.done(e)
+            if not self.wait():
+                break
+
+
+    async def run_async(self, cycle):
+        """awaits cycle() on the clock until stop() is called
+        """
+        self.loop = asyncio.get_running_loop()
+        self.async_stopped = asyncio.Event()
+        self.start()
+        while not self.stopped.is_set():
+            self.begin()
+            try:
+                await cycle()
+                self.done()
+            except Exception as e:
+                print(f"Error: {e}")
+                self.done(e)
+            # stop() ends the wait, even a long backoff
+            try:
+                await asyncio.wait_for(
+                    self.async_stopped.wait(),
+                    max(0.0, self.deadline - self.clock()))
+            except asyncio.TimeoutError:
+                pass
+
+
+    def stop(self):
+        """stops run or run_async (from any thread)
+        """
+        self.stopped.set()
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.async_stopped.set)
+
+
+    def stats(self):
+        """returns the number of cycles, skipped ticks, failures by kind
+        and the lateness of the cycles against their deadlines
+        """
+        return {
+            "cycles": self.cycles,
+            "skipped": self.skipped,
+            "errors": dict(self.errors),
+            "lateness_mean": self.lateness.mean,
+            "lateness_p99": self.lateness.quantile(0.99),
+            "lateness_max": self.lateness.max,
+        }
@@ -0,0 +1,593 @@
+import os
+import csv
+import gzip
+import heapq
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+
+import numpy as np
+
+from .api import Api
+from .data import *
+from .metrics import NULL_METRICS
+
+
+def to_iso(ms, archive=False):
+    """formats unix time in millisecond as the api does
+    (or as the trade archives do if archive)
+    """
+    t = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    if archive:
+        return t.strftime("%Y-%m-%d %H:%M:%S.") + "%03d" % (ms % 1000)
+    return t.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (ms % 1000)
+
+
+class SimuOrder(object):
+    """an order inside the matching engine, in the fields of
+    GMO's /v1/orders
+    """
+    __slots__ = ("ID", "symbol", "side", "execution_type", "price",
+                 "size", "executed_size", "status", "time_in_force",
+                 "timestamp", "reserved")
+
+    def __init__(self, ID, symbol, side, execution_type, price, size,
+                 time_in_force, timestamp):
+        self.ID = ID
+        self.symbol = symbol
+        self.side = side                       # Side
+        self.execution_type = execution_type   # ExecutionType
+        self.price = price                     # float or None (MARKET)
+        self.size = size
+        self.executed_size = 0.0
+        self.status = OrderStatus.ACTIVE
+        self.time_in_force = time_in_force
+        self.timestamp = timestamp
+        self.reserved = 0.0                    # JPY or coin held by it
+
+
+    @property
+    def remaining(self):
+        return self.size - self.executed_size
+
+
+class MatchingEngine(object):
+    """resting orders of a symbol in price-time priority.
+    orders are not matched with each other; the market is given by
+    the trades, and a trade at price p fills the resting buy orders
+    at p or above and the sell orders at p or below.
+    orders at a better price than p were traded through and fill
+    completely, the orders at p share the size of the trade
+    in arrival order.
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        # sort keys of the levels, best last: price for bids, -price for asks
+        self.keys = {Side.BUY: [], Side.SELL: []}
+        self.levels = {Side.BUY: {}, Side.SELL: {}}   # price: deque
+        # stop orders: heap of (trigger key, order number, order)
+        self.stops = {Side.BUY: [], Side.SELL: []}
+        self.count = 0
+
+
+    def __len__(self):
+        return sum(len(level) for levels in self.levels.values()
+                   for level in levels.values()) \
+               + len(self.stops[Side.BUY]) + len(self.stops[Side.SELL])
+
+
+    def add(self, order):
+        """rests a LIMIT or STOP order
+        """
+        self.count += 1
+        if order.execution_type is ExecutionType.STOP:
+            # a buy stop triggers at or above its price,
+            # a sell stop at or below
+            key = order.price if order.side is Side.BUY else -order.price
+            heapq.heappush(self.stops[order.side], (key, self.count, order))
+            return
+
+        levels = self.levels[order.side]
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = deque()
+            keys = self.keys[order.side]
+            key = order.side.value * order.price
+            keys.insert(bisect_left(keys, key), key)
+        level.append(order)
+
+
+    def remove(self, order):
+        if order.execution_type is ExecutionType.STOP:
+            stops = self.stops[order.side]
+            stops[:] = [item for item in stops if item[2] is not order]
+            heapq.heapify(stops)
+            return
+
+        levels = self.levels[order.side]
+        level = levels.get(order.price)
+        if level is None or order not in level:
+            return
+        level.remove(order)
+        if not level:
+            self.drop_level(order.side, order.price)
+
+
+    def drop_level(self, side, price):
+        del self.levels[side][price]
+        keys = self.keys[side]
+        del keys[bisect_left(keys, side.value * price)]
+
+
+    def best(self, side):
+        keys = self.keys[side]
+        return side.value * keys[-1] if keys else None
+
+
+    def match(self, price, size):
+        """applies a trade and returns list of (order, size, price)
+        of the fills, triggered stop orders fill at the trade price
+        """
+        fills = []
+        for side in (Side.BUY, Side.SELL):
+            # buy stops trigger when price >= stop, sell stops when <=
+            stops = self.stops[side]
+            while stops and stops[0][0] <= side.value * price:
+                order = heapq.heappop(stops)[2]
+                fills.append((order, order.remaining, price))
+
+            keys = self.keys[side]
+            levels = self.levels[side]
+            budget = size
+            # a buy level matches if level >= price (key >= side * price)
+            while keys and keys[-1] >= side.value * price:
+                level_price = side.value * keys[-1]
+                level = levels[level_price]
+                through = level_price != price
+                while level and (through or budget > 0):
+                    order = level[0]
+                    if through:
+                        filled = order.remaining
+                    else:
+                        filled = min(order.remaining, budget)
+                        budget -= filled
+                    fills.append((order, filled, level_price))
+                    if filled < order.remaining:
+                        break
+                    level.popleft()
+                if level:
+                    break
+                self.drop_level(side, level_price)
+        return fills
+
+
+    def depth(self, side):
+        """returns list of (price, size) of the levels, best first
+        """
+        return [(side.value * key,
+                 sum(o.remaining for o in self.levels[side][side.value * key]))
+                for key in reversed(self.keys[side])]
+
+
+class SimuApi(Api):
+    """simulated exchange for paper trading and stress tests.
+    the market is driven by trades (loaded from a TradeStore, any
+    iterable or pushed with on_trade), orders are matched by an
+    in-process MatchingEngine and balances are kept for get_assets.
+    nothing waits for the wall clock, so a daemon can be run through
+    days of trades in seconds:
+
+        api = SimuApi(assets={"JPY": 1e6}).load(trades)
+        daemon = ShannonsDaemon(api, ...)
+        while api.advance(daemon.delay):
+            daemon.run()
+    """
+    exchange = Exchange.Simu.name
+    max_order_ids = 10
+
+    def __init__(self, api_key=None, secret_key=None, assets=None,
+                 spread=0.0005, fee_rate=0.0, history=1000,
+                 touch_size=None, retention=3600, transport=None,
+                 public_scheduler=None, private_scheduler=None, cache=None,
+                 metrics=None):
+        """
+        Args:
+            api_key, secret_key: not used
+            assets: dict of symbol: initial amount
+            spread: bid-ask spread of the ticker relative to the last price
+            fee_rate: fee in JPY per JPY traded
+            touch_size: size a taking order can fill at the ask or bid
+                        of the ticker, None for unlimited
+            history: number of trades kept per symbol for
+                     get_execution_history and download_execution_history
+            retention: seconds of simulated time finished orders are
+                       kept for get_orders
+            transport, public_scheduler, private_scheduler, cache,
+            metrics: shared resources of a Runner (see GmoApi), nothing
+                     is sent so they are only kept
+        """
+        self.spread = spread
+        self.fee_rate = fee_rate
+        self.history = history
+        self.touch_size = touch_size
+        self.retention = retention
+        self.transport = transport
+        self.public_scheduler = public_scheduler
+        self.private_scheduler = private_scheduler
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.assets = {s: [float(a), float(a)]
+                       for s, a in (assets or {}).items()}
+        self.engines = {}
+        self.orders = {}       # ID: SimuOrder
+        self.finished = deque()   # IDs of the finished orders, oldest first
+        self.tickers = {}      # symbol: [ask, bid, last, volume, timestamp]
+        self.trades = {}       # symbol: deque of recent trades
+        self.order_id = 0
+        self.now = 0           # simulated time in millisecond
+        self.source = iter(())
+        self.pending = None
+        self.available = True
+        self.fees = 0.0
+
+
+    # ---------- market data ----------
+
+    def load(self, trades):
+        """sets the trades that drive the market
+        Args:
+            trades: iterable of (timestamp, symbol, price, size) or
+                    (timestamp, symbol, price, size, side), timestamp in
+                    millisecond and in ascending order, side is the Side
+                    of the taker (see on_trade)
+        """
+        self.source = iter(trades)
+        self.pending = next(self.source, None)
+        if self.pending is not None and not self.now:
+            self.now = self.pending[0]
+        return self
+
+
+    def load_store(self, store, symbols, start, end):
+        """sets the trades of symbols in [start, end) of TradeStore store
+        """
+        timestamps, prices, sizes, sides, index = [], [], [], [], []
+        for i, symbol in enumerate(symbols):
+            columns = store.query(symbol, start, end)
+            timestamps.append(np.asarray(columns["timestamp"]))
+            prices.append(np.asarray(columns["price"]))
+            sizes.append(np.asarray(columns["size"]))
+            sides.append(np.asarray(columns["side"]))
+            index.append(np.full(len(timestamps[-1]), i))
+        timestamps = np.concatenate(timestamps)
+        order = np.argsort(timestamps, kind="stable")
+        return self.load(zip(timestamps[order].tolist(),
+                             [symbols[i] for i in
+                              np.concatenate(index)[order].tolist()],
+                             np.concatenate(prices)[order].tolist(),
+                             np.concatenate(sizes)[order].tolist(),
+                             [Side(v) for v in
+                              np.concatenate(sides)[order].tolist()]))
+
+
+    def advance(self, seconds):
+        """applies the trades of the next seconds of simulated time.
+        returns False when the trades are exhausted
+        """
+        if self.pending is None:
+            return False
+        end = self.now + int(seconds * 1000)
+        while self.pending is not None and self.pending[0] <= end:
+            timestamp, symbol, price, size = self.pending[:4]
+            side = self.pending[4] if len(self.pending) > 4 else None
+            self.on_trade(symbol, timestamp, price, size, side)
+            self.pending = next(self.source, None)
+        self.now = end
+        return True
+
+
+    def on_trade(self, symbol, timestamp, price, size, side=None):
+        """applies a trade of the market (same signature as
+        the on_trade callback of TradeStream).
+        side is the Side of the taker, guessed with the tick rule
+        if not given: a trade above the last price is a buy, below it
+        a sell, and at the same price the side of the last trade
+        """
+        self.now = max(self.now, timestamp)
+        half = price * self.spread / 2
+        ticker = self.tickers.get(symbol)
+        if ticker is None:
+            ticker = self.tickers[symbol] = [0.0, 0.0, 0.0, 0.0, 0]
+            self.trades[symbol] = deque(maxlen=self.history)
+        trades = self.trades[symbol]
+        if side is None:
+            if not trades or price > ticker[2]:
+                side = Side.BUY
+            elif price < ticker[2]:
+                side = Side.SELL
+            else:
+                side = trades[-1][3]
+        ticker[0] = price + half
+        ticker[1] = price - half
+        ticker[2] = price
+        ticker[3] += size
+        ticker[4] = timestamp
+        trades.append((timestamp, price, size, side))
+
+        engine = self.engines.get(symbol)
+        if engine is not None:
+            for order, filled, fill_price in engine.match(price, size):
+                stop = order.execution_type is ExecutionType.STOP
+                if stop:
+                    filled = self.trigger(order, filled, fill_price)
+                if filled > 0:
+                    self.fill(order, filled, fill_price)
+                if stop and order.status is OrderStatus.ACTIVE:
+                    # the part the balance can not pay for
+                    self.cancel(order)
+        self.evict()
+
+
+    # ---------- balances ----------
+
+    def asset(self, symbol):
+        asset = self.assets.get(symbol)
+        if asset is None:
+            asset = self.assets[symbol] = [0.0, 0.0]
+        return asset
+
+
+    def deposit(self, symbol, amount):
+        """adds amount to the balance of symbol
+        """
+        asset = self.asset(symbol)
+        asset[0] += amount
+        asset[1] += amount
+
+
+    def reserve(self, order):
+        """holds the JPY (buy) or coin (sell) the order may spend
+        """
+        if order.side is Side.BUY:
+            price = order.price
+            if price is None or order.execution_type is ExecutionType.STOP:
+                price = max(price or 0, self.tickers[order.symbol][0])
+            symbol, amount = "JPY", order.size * price * (1 + self.fee_rate)
+        else:
+            symbol, amount = order.symbol, order.size
+        asset = self.asset(symbol)
+        if asset[1] < amount - 1e-9:
+            raise RuntimeError([{"message_code": "ERR-201",
+                                 "message_string": "Trading margin is "
+                                                   "insufficient."}])
+        asset[1] -= amount
+        order.reserved = amount
+
+
+    def trigger(self, order, size, price):
+        """reserves more JPY for a buy stop filling above the price
+        it was reserved at, and returns the size that can be paid for
+        """
+        if order.side is Side.SELL:
+            return size
+        cost = price * (1 + self.fee_rate)
+        extra = size * cost - order.reserved
+        if extra > 0:
+            jpy = self.asset("JPY")
+            taken = min(extra, max(jpy[1], 0.0))
+            jpy[1] -= taken
+            order.reserved += taken
+        return min(size, order.reserved / cost)
+
+
+    def release(self, order):
+        symbol = "JPY" if order.side is Side.BUY else order.symbol
+        self.asset(symbol)[1] += order.reserved
+        order.reserved = 0.0
+
+
+    def fill(self, order, size, price):
+        value = size * price
+        fee = value * self.fee_rate
+        coin, jpy = self.asset(order.symbol), self.asset("JPY")
+        if order.side is Side.BUY:
+            coin[0] += size
+            coin[1] += size
+            jpy[0] -= value + fee
+            spent = min(order.reserved, value + fee)
+            order.reserved -= spent
+            jpy[1] -= value + fee - spent
+        else:
+            coin[0] -= size
+            spent = min(order.reserved, size)
+            order.reserved -= spent
+            coin[1] -= size - spent
+            jpy[0] += value - fee
+            jpy[1] += value - fee
+        self.fees += fee
+        order.executed_size += size
+        order.timestamp = self.now
+        if order.remaining <= 1e-12:
+            order.status = OrderStatus.COMPLETED
+            self.release(order)
+            self.finished.append(order.ID)
+
+
+    def evict(self):
+        """drops the orders finished more than retention seconds ago
+        """
+        limit = self.now - self.retention * 1000
+        while self.finished and \
+              self.orders[self.finished[0]].timestamp < limit:
+            del self.orders[self.finished.popleft()]
+
+
+    # ---------- Api ----------
+
+    def is_available(self):
+        return self.available
+
+
+    def get_ticker(self, symbols):
+        return {s: Ticker(ask=t[0], bid=t[1], last=t[2], volume=t[3],
+                          timestamp=to_iso(t[4]))
+                for s, t in ((s, self.tickers.get(s)) for s in symbols)
+                if t is not None}
+
+
+    def get_history_filename(self, symbol, date):
+        return date.strftime("%Y%m%d") + "_" + symbol + ".csv.gz"
+
+
+    def download_execution_history(self, symbol, date, path):
+        """writes the kept trades of the date (UTC) into path as
+        a trade archive and returns the number of bytes
+        """
+        day = date.strftime("%Y-%m-%d")
+        trades = [t for t in self.trades.get(symbol, ())
+                  if to_iso(t[0], True).startswith(day)]
+        if not trades:
+            raise FileNotFoundError(f"no trade of {symbol} on {day}")
+        fname = os.path.join(path, self.get_history_filename(symbol, date))
+        with gzip.open(fname, "wt", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["symbol", "side", "size", "price", "timestamp"])
+            for t, p, s, side in trades:
+                writer.writerow([symbol, side.name, s, p, to_iso(t, True)])
+        return os.path.getsize(fname)
+
+
+    def get_execution_history(self, symbol, page=1, count=100):
+        count = min(count, 100)
+        trades = islice(reversed(self.trades.get(symbol, ())),
+                        (page - 1) * count, page * count)
+        return [{"price": str(p), "side": side.name, "size": str(s),
+                 "timestamp": to_iso(t)}
+                for t, p, s, side in trades]
+
+
+    def get_orderbooks(self, symbol):
+        """returns the resting orders and the ticker as the best levels
+        """
+        engine = self.engines.get(symbol) or MatchingEngine(symbol)
+        ticker = self.tickers.get(symbol)
+        asks, bids = engine.depth(Side.SELL), engine.depth(Side.BUY)
+        if ticker is not None:
+            asks = [(ticker[0], 0.0)] + asks
+            bids = [(ticker[1], 0.0)] + bids
+        level = lambda p, s: {"price": str(p), "size": str(s)}
+        return {"asks": [level(p, s) for p, s in sorted(asks)],
+                "bids": [level(p, s) for p, s in sorted(bids, reverse=True)],
+                "symbol": symbol, "timestamp": to_iso(self.now)}
+
+
+    def get_assets(self, symbols):
+        return {s: Asset(amount=self.assets[s][0],
+                         available=self.assets[s][1])
+                for s in symbols if s in self.assets}
+
+
+    def get_orders(self, orders):
+        if type(orders) is Order:
+            orders = [orders]
+        elif type(orders) is not list:
+            raise TypeError(f"{type(orders)}: use Order or list of Order")
+        if len(orders) > self.max_order_ids:
+            raise ValueError(f"up to {self.max_order_ids} orders at once")
+
+        found = []
+        for order in orders:
+            simu = self.orders.get(str(order.ID))
+            if simu is None:
+                continue
+            order.status = simu.status
+            order.executed_size = simu.executed_size
+            order.timestamp = to_iso(simu.timestamp)
+            found.append(order)
+        return found
+
+
+    def post_order(self, order):
+        if type(order) is not Order:
+            raise TypeError(f"{type(order)}: use Order")
+        ticker = self.tickers.get(order.symbol)
+        if ticker is None:
+            raise RuntimeError([{"message_code": "ERR-5106",
+                                 "message_string": "Invalid request "
+                                                   f"({order.symbol})"}])
+        market = order.execution_type is ExecutionType.MARKET
+        self.order_id += 1
+        simu = SimuOrder(str(self.order_id), order.symbol, order.side,
+                         order.execution_type,
+                         None if market else float(order.price.value),
+                         float(order.size.value),
+                         order.time_in_force or ("FAK" if market else "FAS"),
+                         self.now)
+        self.reserve(simu)
+        self.orders[simu.ID] = simu
+
+        ask, bid = ticker[0], ticker[1]
+        if simu.execution_type is ExecutionType.STOP:
+            self.engine(simu.symbol).add(simu)
+            return simu.ID
+
+        # taking: a market order, or a limit order crossing the ticker
+        touch = ask if simu.side is Side.BUY else bid
+        crossing = market or (simu.price >= ask if simu.side is Side.BUY
+                              else simu.price <= bid)
+        if crossing:
+            size = simu.remaining
+            if self.touch_size is not None:
+                size = min(size, self.touch_size)
+            if simu.time_in_force == "SOK":
+                # post only: cancel instead of taking
+                self.cancel(simu)
+            elif simu.time_in_force == "FOK" and \
+                 size < simu.remaining - 1e-12:
+                # fill or kill: nothing fills unless all of it can
+                self.cancel(simu)
+            else:
+                if size > 0:
+                    self.fill(simu, size, touch)
+                if simu.status is OrderStatus.ACTIVE:
+                    if market or simu.time_in_force == "FAK":
+                        self.cancel(simu)
+                    else:
+                        # FAS: the rest of a limit order rests
+                        self.engine(simu.symbol).add(simu)
+        elif simu.time_in_force in ("FAK", "FOK"):
+            self.cancel(simu)
+        else:
+            self.engine(simu.symbol).add(simu)
+        return simu.ID
+
+
+    def engine(self, symbol):
+        engine = self.engines.get(symbol)
+        if engine is None:
+            engine = self.engines[symbol] = MatchingEngine(symbol)
+        return engine
+
+
+    def cancel(self, simu):
+        simu.status = OrderStatus.CANCELED
+        simu.timestamp = self.now
+        self.release(simu)
+        self.finished.append(simu.ID)
+
+
+    def post_cancel_orders(self, orders):
+        if type(orders) is Order:
+            orders = [orders]
+        success, failed = [], []
+        for order in orders:
+            simu = self.orders.get(str(order.ID))
+            if simu is None or simu.status is not OrderStatus.ACTIVE:
+                failed.append({"message_code": "ERR-5122",
+                               "orderId": order.ID})
+                continue
+            self.engine(simu.symbol).remove(simu)
+            self.cancel(simu)
+            success.append(simu.ID)
+        return {"success": success, "failed": failed}
@@ -0,0 +1,272 @@
+import os
+import csv
+import gzip
+import json
+import tempfile
+from datetime import datetime, date, timezone
+
+import numpy as np
+
+from .data import Side
+
+
+def to_millis(t):
+    """converts datetime (naive is UTC), date, str or int into
+    unix time in millisecond
+    """
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    if isinstance(t, str):
+        # the api returns UTC as 2021-01-01T00:00:00.000Z
+        return int(np.datetime64(t.rstrip("Z"), "ms").astype(np.int64))
+    if isinstance(t, datetime):
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        return int(t.timestamp() * 1000)
+    if isinstance(t, date):
+        return to_millis(datetime(t.year, t.month, t.day))
+    raise TypeError(f"{type(t)}: use datetime, date, str or int")
+
+
+class TradeStore(object):
+    """columnar on-disk store of trades.
+    each symbol and day is a partition PATH/SYMBOL/YYYYMMDD/ holding
+    one fixed-width .npy file per column, sorted by timestamp.
+    partitions are opened with memory-mapping, so a time range query is
+    a binary search on the timestamp column and a slice of the mapping.
+    a partition is rewritten as a new version of its columns
+    (NAME.VERSION.npy) committed by renaming manifest.json, so a crash
+    in the middle of a write leaves the previous version intact.
+    """
+    columns = {
+        "timestamp": np.int64,   # unix time in millisecond
+        "price": np.float64,
+        "size": np.float64,
+        "side": np.int8,         # Side.value
+    }
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, path):
+        self.path = path
+        self._cache = {}
+
+
+    def get_partition_path(self, symbol, day):
+        return os.path.join(self.path, symbol, day)
+
+
+    def days(self, symbol):
+        """returns sorted list of the stored days (YYYYMMDD)
+        """
+        directory = os.path.join(self.path, symbol)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(d for d in os.listdir(directory)
+                      if self.manifest(symbol, d) is not None)
+
+
+    def manifest(self, symbol, day):
+        """returns the committed {"version", "length"} of a partition,
+        None if it is not written. partitions written before manifests
+        were introduced are version 0 (NAME.npy)
+        """
+        directory = self.get_partition_path(symbol, day)
+        try:
+            with open(os.path.join(directory, self.manifest_name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        if os.path.exists(os.path.join(directory, "timestamp.npy")):
+            return {"version": 0, "length": None}
+        return None
+
+
+    def column_path(self, directory, name, version):
+        if version == 0:
+            return os.path.join(directory, name + ".npy")
+        return os.path.join(directory, f"{name}.{version}.npy")
+
+
+    def write(self, symbol, day, arrays):
+        """writes a new version of a partition. all the columns are
+        written first, then the manifest is renamed into place in one
+        atomic step and the previous version is removed
+        """
+        directory = self.get_partition_path(symbol, day)
+        os.makedirs(directory, exist_ok=True)
+        manifest = self.manifest(symbol, day)
+        previous = manifest["version"] if manifest is not None else None
+        version = previous + 1 if previous is not None else 1
+        order = np.argsort(arrays["timestamp"], kind="stable")
+        for name in self.columns:
+            column = np.ascontiguousarray(arrays[name][order],
+                                          dtype=self.columns[name])
+            self.replace(directory, self.column_path(directory, name,
+                                                     version),
+                         lambda f: np.save(f, column))
+        manifest = {"version": version, "length": len(order)}
+        self.replace(directory, os.path.join(directory, self.manifest_name),
+                     lambda f: f.write(json.dumps(manifest).encode()))
+        self._cache.pop((symbol, day), None)
+
+        if previous is not None:
+            # open mappings of the previous version stay readable
+            for name in self.columns:
+                try:
+                    os.remove(self.column_path(directory, name, previous))
+                except FileNotFoundError:
+                    pass
+        return len(order)
+
+
+    @staticmethod
+    def replace(directory, path, write):
+        """writes a file through a temporary file renamed to path
+        """
+        fd, tmp = tempfile.mkstemp(suffix=".part", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+    def append(self, symbol, arrays):
+        """merges trades (dict of columns) into the partitions of
+        their days, keeping them sorted by timestamp, and returns
+        the number of trades added
+        """
+        timestamp = np.asarray(arrays["timestamp"], dtype=np.int64)
+        days = (timestamp.astype("datetime64[ms]").astype("datetime64[D]")
+                .astype(str))
+        stored = set(self.days(symbol))
+        for day in np.unique(days):
+            mask = days == day
+            day = day.replace("-", "")
+            part = {name: np.asarray(arrays[name])[mask]
+                    for name in self.columns}
+            if day in stored:
+                columns = self.load(symbol, day)
+                part = {name: np.concatenate([columns[name], part[name]])
+                        for name in self.columns}
+            # stable: trades of the same millisecond keep their order,
+            # the stored ones first
+            order = np.argsort(part["timestamp"], kind="stable")
+            part = {name: column[order] for name, column in part.items()}
+            self.write(symbol, day, part)
+        return len(timestamp)
+
+
+    def last(self, symbol):
+        """returns dict of columns of the trades at the latest stored
+        timestamp, None if no trade of symbol is stored
+        """
+        for day in reversed(self.days(symbol)):
+            columns = self.load(symbol, day)
+            ts = columns["timestamp"]
+            if len(ts):
+                i = np.searchsorted(ts, ts[-1], side="left")
+                return {name: c[i:] for name, c in columns.items()}
+        return None
+
+
+    def ingest(self, symbol, archive):
+        """converts a trade archive (YYYYMMDD_SYMBOL.csv.gz, see
+        GmoApi.download_execution_history) into a partition and
+        returns the number of trades
+        """
+        day = os.path.basename(archive).split("_")[0]
+        with gzip.open(archive, "rt", newline="") as f:
+            reader = csv.DictReader(f)
+            rows = [(r["timestamp"], r["price"], r["size"], r["side"])
+                    for r in reader]
+
+        if rows:
+            timestamp, price, size, side = zip(*rows)
+        else:
+            timestamp, price, size, side = (), (), (), ()
+        arrays = {
+            "timestamp": np.array(timestamp, dtype="datetime64[ms]")
+                           .astype(np.int64),
+            "price": np.array(price, dtype=np.float64),
+            "size": np.array(size, dtype=np.float64),
+            "side": np.array([Side[s].value for s in side], dtype=np.int8),
+        }
+        return self.write(symbol, day, arrays)
+
+
+    def ingest_directory(self, symbol, directory):
+        """ingests the archives of directory that are not stored yet
+        and returns the number of ingested archives
+        """
+        stored = set(self.days(symbol))
+        n = 0
+        for fname in sorted(os.listdir(directory)):
+            if not fname.endswith(f"_{symbol}.csv.gz"):
+                continue
+            if fname.split("_")[0] in stored:
+                continue
+            self.ingest(symbol, os.path.join(directory, fname))
+            n += 1
+        return n
+
+
+    def load(self, symbol, day):
+        """returns dict of read-only memory-mapped columns of a partition
+        """
+        key = (symbol, day)
+        if key not in self._cache:
+            directory = self.get_partition_path(symbol, day)
+            manifest = self.manifest(symbol, day)
+            if manifest is None:
+                raise FileNotFoundError(f"{directory}: no partition")
+            columns = {
+                name: np.load(self.column_path(directory, name,
+                                               manifest["version"]),
+                              mmap_mode="r")
+                for name in self.columns
+            }
+            lengths = {len(c) for c in columns.values()}
+            if manifest["length"] is not None:
+                lengths.add(manifest["length"])
+            if len(lengths) != 1:
+                raise ValueError(f"{directory}: columns of different "
+                                 f"lengths {sorted(lengths)}")
+            self._cache[key] = columns
+        return self._cache[key]
+
+
+    def query(self, symbol, start, end):
+        """returns dict of columns of the trades in [start, end).
+        a range within one day is a zero-copy view of the mapping,
+        ranges over several days are concatenated.
+        """
+        start, end = to_millis(start), to_millis(end)
+        first = datetime.fromtimestamp(start / 1000, timezone.utc)
+        last = datetime.fromtimestamp(max(start, end - 1) / 1000,
+                                      timezone.utc)
+        first, last = first.strftime("%Y%m%d"), last.strftime("%Y%m%d")
+
+        parts = []
+        for day in self.days(symbol):
+            if day < first or day > last:
+                continue
+            columns = self.load(symbol, day)
+            ts = columns["timestamp"]
+            i = np.searchsorted(ts, start, side="left")
+            j = np.searchsorted(ts, end, side="left")
+            if i < j:
+                parts.append({name: c[i:j] for name, c in columns.items()})
+
+        if len(parts) == 1:
+            return parts[0]
+        return {
+            name: np.concatenate([p[name] for p in parts]) if parts
+                  else np.empty(0, dtype=dtype)
+            for name, dtype in self.columns.items()
+        }
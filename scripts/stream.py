@@ -0,0 +1,405 @@
+import json
+import threading
+from collections import OrderedDict
+from time import sleep, monotonic
+
+from websockets.sync.client import connect
+
+from .data import *
+from .store import to_millis
+from .orderbook import OrderBook
+
+
+class WebSocketStream(object):
+    """base class of websocket consumers.
+    the connection runs on a background thread and is re-established
+    (and re-subscribed) with exponential backoff whenever it drops.
+    """
+    def __init__(self, url, reconnect_delay=1, max_reconnect_delay=60,
+                 subscribe_interval=1.0):
+        """
+        Args:
+            url: websocket endpoint
+            reconnect_delay: first wait in second before reconnecting
+            max_reconnect_delay: upper bound of the reconnect wait
+            subscribe_interval: wait in second between subscriptions
+                                (GMO accepts one subscribe per second)
+        """
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.subscribe_interval = subscribe_interval
+        self.connections = 0
+        self._running = threading.Event()
+        self._thread = None
+
+
+    def subscriptions(self):
+        """returns list of messages sent right after connecting
+        """
+        return []
+
+
+    def on_message(self, message):
+        """handles a decoded message
+        """
+        raise NotImplementedError()
+
+
+    def get_url(self):
+        return self.url
+
+
+    def tick(self):
+        """called at least every 0.5 second while connected
+        """
+        pass
+
+
+    def on_connect(self):
+        """called after subscribing, connections counts this connection
+        """
+        pass
+
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self, timeout=None):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def run(self):
+        delay = self.reconnect_delay
+        while self._running.is_set():
+            try:
+                with connect(self.get_url()) as ws:
+                    self.connections += 1
+                    for i, msg in enumerate(self.subscriptions()):
+                        if i > 0:
+                            sleep(self.subscribe_interval)
+                        ws.send(json.dumps(msg))
+                    self.on_connect()
+                    delay = self.reconnect_delay
+                    self.consume(ws)
+            except Exception as e:
+                if not self._running.is_set():
+                    break
+                print(f"Error: {self.__class__.__name__}: {e}")
+                sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+
+    def consume(self, ws):
+        while self._running.is_set():
+            try:
+                message = ws.recv(timeout=0.5)
+            except TimeoutError:
+                message = None
+            if message is not None:
+                # a bad message is dropped, not the connection
+                try:
+                    self.on_message(json.loads(message))
+                except Exception as e:
+                    print(f"Error: {self.__class__.__name__}: {e}")
+            self.tick()
+
+
+class TickerStream(WebSocketStream):
+    """keeps the latest Ticker of each symbol from the ticker channel
+    """
+    def __init__(self, url, symbols, on_ticker=None, **kwargs):
+        """
+        Args:
+            url: public websocket endpoint
+            symbols: list of symbols to subscribe
+            on_ticker: callback(symbol, ticker) called on every update
+        """
+        super().__init__(url, **kwargs)
+        self.symbols = list(symbols)
+        self.on_ticker = on_ticker
+        self.ticker = {}
+        self.updated = threading.Event()
+
+
+    def subscriptions(self):
+        return [{"command": "subscribe", "channel": "ticker", "symbol": s}
+                for s in self.symbols]
+
+
+    def on_message(self, message):
+        if message.get("channel") != "ticker":
+            return
+
+        symbol = message["symbol"]
+        ticker = Ticker(
+            ask = message["ask"],
+            bid = message["bid"],
+            last = message["last"],
+            volume = message["volume"],
+            timestamp = message["timestamp"]
+        )
+        self.ticker[symbol] = ticker
+        self.updated.set()
+        if self.on_ticker is not None:
+            self.on_ticker(symbol, ticker)
+
+
+    def wait(self, timeout=None):
+        """blocks until a new ticker arrives and returns a copy
+        of the ticker table, or None on timeout
+        """
+        if not self.updated.wait(timeout):
+            return None
+        # cleared before the table is read: an update landing now is
+        # either in the copy or sets the event again for the next wait
+        self.updated.clear()
+        return dict(self.ticker)
+
+
+class TradeStream(WebSocketStream):
+    """passes trades of the trades channel to on_trade
+    """
+    def __init__(self, url, symbols, on_trade, **kwargs):
+        """
+        Args:
+            url: public websocket endpoint
+            symbols: list of symbols to subscribe
+            on_trade: callback(symbol, timestamp, price, size),
+                      timestamp in millisecond (e.g. BarAggregator.add_trade)
+        """
+        super().__init__(url, **kwargs)
+        self.symbols = list(symbols)
+        self.on_trade = on_trade
+
+
+    def subscriptions(self):
+        return [{"command": "subscribe", "channel": "trades", "symbol": s}
+                for s in self.symbols]
+
+
+    def on_message(self, message):
+        if message.get("channel") != "trades":
+            return
+        self.on_trade(message["symbol"],
+                      to_millis(message["timestamp"]),
+                      float(message["price"]),
+                      float(message["size"]))
+
+
+class OrderBookStream(WebSocketStream):
+    """keeps a local OrderBook of each symbol from the orderbooks channel
+    """
+    def __init__(self, url, symbols, on_update=None, **kwargs):
+        """
+        Args:
+            url: public websocket endpoint
+            symbols: list of symbols to subscribe
+            on_update: callback(symbol, orderbook) called on every update
+        """
+        super().__init__(url, **kwargs)
+        self.symbols = list(symbols)
+        self.on_update = on_update
+        self.books = {s: OrderBook(s) for s in self.symbols}
+
+
+    def subscriptions(self):
+        return [{"command": "subscribe", "channel": "orderbooks", "symbol": s}
+                for s in self.symbols]
+
+
+    def on_message(self, message):
+        if message.get("channel") != "orderbooks":
+            return
+        book = self.books[message["symbol"]]
+        book.on_message(message)
+        if self.on_update is not None:
+            self.on_update(book.symbol, book)
+
+
+class OrderEventStream(WebSocketStream):
+    """pushes orderEvents and executionEvents of the private websocket api
+    into the tracked Order objects as they happen.
+    the access token is issued on connect, extended every extend_interval
+    seconds and deleted on stop. the events sent while the connection
+    was down are lost, so the tracked orders are polled once with
+    get_orders after each reconnect.
+    """
+    token_lifetime = 3600
+    max_pending = 1000
+
+    def __init__(self, api, on_event=None, extend_interval=1800, **kwargs):
+        """
+        Args:
+            api: GmoApi used for the access token
+            on_event: callback(channel, order) called on every update
+            extend_interval: interval in second to extend the access token
+        """
+        super().__init__(api.ws_private_endpoint, **kwargs)
+        self.api = api
+        self.listeners = [] if on_event is None else [on_event]
+        self.extend_interval = extend_interval
+        # orders and pending are shared by the caller's thread (track)
+        # and the websocket thread (on_message)
+        self.lock = threading.Lock()
+        self.orders = {}
+        self.pending = OrderedDict()
+        self.token = None
+        self.token_time = 0
+
+
+    def add_listener(self, on_event):
+        """adds callback(channel, order) called on every update
+        """
+        self.listeners.append(on_event)
+
+
+    def track(self, order):
+        """starts updating order (its ID must be set)
+        """
+        order_id = str(order.ID)
+        with self.lock:
+            self.orders[order_id] = order
+            # events that arrived before the order was tracked
+            updates = [self.apply(message)
+                       for message in self.pending.pop(order_id, [])]
+        for update in updates:
+            self.notify(update)
+
+
+    def get_url(self):
+        if self.token is None or \
+           monotonic() - self.token_time > self.token_lifetime - 60:
+            self.token = self.api.get_ws_token()
+            self.token_time = monotonic()
+        return f"{self.url}/v1/{self.token}"
+
+
+    def subscriptions(self):
+        return [{"command": "subscribe", "channel": "executionEvents"},
+                {"command": "subscribe", "channel": "orderEvents"}]
+
+
+    def on_connect(self):
+        # the events sent while disconnected are lost
+        if self.connections > 1:
+            self.resync()
+
+
+    def resync(self):
+        """polls the tracked orders once with get_orders and notifies
+        the ones that changed
+        """
+        with self.lock:
+            orders = list(self.orders.values())
+        size = self.api.max_order_ids
+        for i in range(0, len(orders), size):
+            batch = orders[i:i + size]
+            before = [(o.status, o.executed_size) for o in batch]
+            self.api.get_orders(batch)
+            updates = []
+            with self.lock:
+                for order, state in zip(batch, before):
+                    if (order.status, order.executed_size) == state:
+                        continue
+                    if order.status.terminal:
+                        self.orders.pop(str(order.ID), None)
+                    updates.append(("orderEvents", order))
+            for update in updates:
+                self.notify(update)
+
+
+    def tick(self):
+        if monotonic() - self.token_time < self.extend_interval:
+            return
+        try:
+            self.api.extend_ws_token(self.token)
+        except Exception:
+            self.token = None
+            raise
+        self.token_time = monotonic()
+
+
+    def stop(self, timeout=None):
+        super().stop(timeout)
+        if self.token is not None:
+            try:
+                self.api.delete_ws_token(self.token)
+            except Exception as e:
+                print(f"Error: {e}")
+            self.token = None
+
+
+    def on_message(self, message):
+        channel = message.get("channel")
+        if channel not in ("orderEvents", "executionEvents"):
+            return
+
+        with self.lock:
+            order_id = str(message["orderId"])
+            if order_id not in self.orders:
+                self.pending.setdefault(order_id, []).append(message)
+                if len(self.pending) > self.max_pending:
+                    self.pending.popitem(last=False)
+                return
+            update = self.apply(message)
+        self.notify(update)
+
+
+    def apply(self, message):
+        """updates the tracked order of message (called with lock held)
+        and returns (channel, order), None if it is not tracked anymore
+        """
+        channel = message["channel"]
+        order_id = str(message["orderId"])
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        try:
+            if channel == "orderEvents":
+                status = self.api.to_order_status(message["orderStatus"])
+                order.status = status
+                order.timestamp = message.get("orderTimestamp",
+                                              order.timestamp)
+            else:
+                executed_size = float(message["orderExecutedSize"])
+                size = float(message["orderSize"])
+                order.executed_size = executed_size
+                if executed_size >= size:
+                    order.status = OrderStatus.COMPLETED
+                else:
+                    order.status = OrderStatus.ACTIVE
+                order.timestamp = message.get("executionTimestamp",
+                                              order.timestamp)
+        except Exception as e:
+            print(f"Error: {self.__class__.__name__}: {e}")
+            return None
+
+        if order.status.terminal:
+            self.orders.pop(order_id, None)
+        return channel, order
+
+
+    def notify(self, update):
+        if update is None:
+            return
+        for on_event in self.listeners:
+            try:
+                on_event(*update)
+            except Exception as e:
+                print(f"Error: {self.__class__.__name__}: {e}")
@@ -0,0 +1,127 @@
+import os
+import csv
+import random
+import shutil
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .backtest import Backtester
+
+
+def grid(params):
+    """returns list of every combination of params
+    Args:
+        params: dict of name: list of candidates
+    """
+    names = list(params)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[params[n] for n in names])]
+
+
+def sample(params, n, seed=None):
+    """returns n configurations drawn at random from params
+    """
+    rng = random.Random(seed)
+    return [{name: rng.choice(values) for name, values in params.items()}
+            for _ in range(n)]
+
+
+# price arrays of the worker process, memory-mapped from the sweep directory
+_prices = {}
+
+def _init_worker(paths):
+    _prices.clear()
+    for symbol, (ts_path, price_path) in paths.items():
+        _prices[symbol] = (np.load(ts_path, mmap_mode="r"),
+                           np.load(price_path, mmap_mode="r"))
+
+
+def _run_backtest(job):
+    index, config, assets, options = job
+    symbols = config["symbols"]
+    bt = Backtester(symbols,
+                    config["min-sizes"],
+                    config["max-sizes"],
+                    config["step-values"],
+                    interval=config["delay"],
+                    **options)
+    prices = {s: _prices[s] for s in bt.symbols}
+    result = bt.run(prices, assets)
+    return index, result.summary()
+
+
+class Sweep(object):
+    """runs a backtest for each configuration on a process pool.
+    the price arrays are written once to .npy files which every worker
+    memory-maps, so they are shared through the page cache
+    instead of being pickled to each process.
+    """
+    def __init__(self, prices, base_config, assets, workers=None, **options):
+        """
+        Args:
+            prices: dict of (timestamp, price) arrays of each symbol
+            base_config: config (see data/templates/config.yaml),
+                         the swept keys override it
+            assets: dict of initial amount of each symbol and JPY
+            workers: number of processes (default: number of cores)
+            options: keyword arguments of Backtester (fee_rate, spread)
+        """
+        self.base_config = base_config
+        self.assets = assets
+        self.workers = workers or os.cpu_count()
+        self.options = options
+        self.directory = tempfile.mkdtemp(prefix="sweep-")
+        self.paths = {}
+        for symbol, (ts, price) in prices.items():
+            ts_path = os.path.join(self.directory, f"{symbol}.timestamp.npy")
+            price_path = os.path.join(self.directory, f"{symbol}.price.npy")
+            np.save(ts_path, np.asarray(ts, dtype=np.int64))
+            np.save(price_path, np.asarray(price, dtype=np.float64))
+            self.paths[symbol] = (ts_path, price_path)
+
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def run(self, configs, sort_by="return", reverse=True):
+        """returns list of rows (swept values and backtest summary)
+        sorted by sort_by
+        """
+        jobs = [(i, dict(self.base_config, **config), self.assets,
+                 self.options)
+                for i, config in enumerate(configs)]
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        with ProcessPoolExecutor(self.workers,
+                                 initializer=_init_worker,
+                                 initargs=(self.paths,)) as executor:
+            summaries = dict(executor.map(_run_backtest, jobs,
+                                          chunksize=chunksize))
+
+        rows = [dict(config, **summaries[i])
+                for i, config in enumerate(configs)]
+        rows.sort(key=lambda row: row[sort_by], reverse=reverse)
+        return rows
+
+
+def write_table(rows, path):
+    """writes rows of Sweep.run into a csv file
+    """
+    names = list(rows[0]) if rows else []
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, names)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: v if np.isscalar(v) else repr(v)
+                             for k, v in row.items()})
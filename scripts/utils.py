@@ -1,15 +1,154 @@
+import os
 import shutil
+import tempfile
 import requests
 import json
 import yaml
+import threading
+import time
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
 
-def http_get(url, params={}, headers={}, jsonify=True, stream=False):
+
+class HttpTransport(object):
+    """keep-alive http client.
+    connections are pooled per host and reused across requests,
+    so only the first request to a host pays the TCP/TLS handshake.
+    """
+    def __init__(self, pool_connections=4, pool_size=10,
+                 connect_timeout=3.05, read_timeout=10):
+        """
+        Args:
+            pool_connections: number of hosts whose pools are kept
+            pool_size: maximum number of connections kept per host
+            connect_timeout: seconds to wait for establishing a connection
+            read_timeout: seconds to wait for the server to respond
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+
+    def get(self, url, params={}, headers={}, stream=False):
+        return self.session.get(url, params=params, headers=headers,
+                                stream=stream, timeout=self.timeout)
+
+
+    def post(self, url, data=None, headers={}):
+        return self.session.post(url, data=data, headers=headers,
+                                 timeout=self.timeout)
+
+
+    def put(self, url, data=None, headers={}):
+        return self.session.put(url, data=data, headers=headers,
+                                timeout=self.timeout)
+
+
+    def delete(self, url, data=None, headers={}):
+        return self.session.delete(url, data=data, headers=headers,
+                                   timeout=self.timeout)
+
+
+    def close(self):
+        """closes all pooled connections
+        """
+        self.session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MillisClock(object):
+    """wall clock in millisecond that never goes backwards.
+    it advances with the monotonic clock from a wall-clock anchor, so
+    NTP steps do not move it between resyncs, and it is re-anchored
+    to the wall clock every resync_interval seconds.
+    a forward step is taken at the resync; a backward step is slewed:
+    the clock runs at (1 - max_slew) of the real speed until it is
+    back on the wall clock, so it keeps advancing instead of holding
+    the same value until the wall clock catches up
+    """
+    def __init__(self, resync_interval=60, wall=time.time,
+                 clock=time.monotonic, max_slew=0.5):
+        """
+        Args:
+            resync_interval: seconds between re-anchors to the wall clock
+            max_slew: seconds taken back per second while slewing (< 1)
+        """
+        self.resync_interval = resync_interval
+        self.wall = wall
+        self.clock = clock
+        self.max_slew = max_slew
+        self.lock = threading.Lock()
+        self.last = 0
+        self.debt = 0.0   # seconds still to be taken back
+        self.anchored = self.clock()
+        self.offset = self.wall() - self.anchored
+
+
+    def current_offset(self, now):
+        slewed = min(self.debt, self.max_slew * (now - self.anchored))
+        return self.offset - slewed
+
+
+    def resync(self, now):
+        offset = self.current_offset(now)
+        target = self.wall() - now
+        self.debt = max(0.0, offset - target)
+        self.offset = max(offset, target)
+        self.anchored = now
+
+
+    def __call__(self):
+        """returns the current time in millisecond since the epoch
+        """
+        with self.lock:
+            now = self.clock()
+            if now - self.anchored >= self.resync_interval:
+                self.resync(now)
+            ms = int((self.current_offset(now) + now) * 1000)
+            if ms < self.last:
+                ms = self.last
+            self.last = ms
+            return ms
+
+
+def http_get(url, params={}, headers={}, jsonify=True, stream=False,
+             transport=None):
     """returns the jsonize responce that is fetched from the url
-    if failed, it returns None
+    if transport (HttpTransport) is given, the request is sent through it
+    """
+    client = requests if transport is None else transport
+    resp = client.get(url, params=params,
+                      headers=headers, stream=stream)
+    resp.raise_for_status()
+    if jsonify:
+        return resp.json()
+    else:
+        return resp
+
+
+def encode_payload(payload):
+    """returns the request body of payload as bytes,
+    payload that is already serialized is returned as it is
     """
-    resp = requests.get(url, params=params,
-                        headers=headers, stream=stream)
+    if type(payload) is bytes:
+        return payload
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def http_post(url, payload={}, headers={}, jsonify=True, transport=None):
+    client = requests if transport is None else transport
+    resp = client.post(url, data=encode_payload(payload),
+                       headers=headers)
     resp.raise_for_status()
     if jsonify:
         return resp.json()
@@ -17,20 +156,51 @@ def http_get(url, params={}, headers={}, jsonify=True, stream=False):
         return resp
 
 
-def http_post(url, payload={}, headers={}):
-    resp = requests.post(url, data=json.dumps(payload),
+def http_put(url, payload={}, headers={}, jsonify=True, transport=None):
+    client = requests if transport is None else transport
+    resp = client.put(url, data=encode_payload(payload),
+                      headers=headers)
+    resp.raise_for_status()
+    if jsonify:
+        return resp.json()
+    else:
+        return resp
+
+
+def http_delete(url, payload={}, headers={}, jsonify=True, transport=None):
+    client = requests if transport is None else transport
+    resp = client.delete(url, data=encode_payload(payload),
                          headers=headers)
     resp.raise_for_status()
-    return resp.json()
+    if jsonify:
+        return resp.json()
+    else:
+        return resp
 
 
-def download(url, path):
-    resp = http_get(url, jsonify=False, stream=True)
+def download(url, path, transport=None):
+    """downloads url into path and returns the number of bytes.
+    the body is written to a temporary file which is renamed to path
+    only when complete, so path never holds a partial download.
+    """
+    resp = http_get(url, jsonify=False, stream=True,
+                    transport=transport)
     resp.raise_for_status()
 
-    with open(path, "wb") as f:
-        resp.raw.decode_content = True
-        shutil.copyfileobj(resp.raw, f)
+    fd, tmp = tempfile.mkstemp(suffix=".part",
+                               dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            resp.raw.decode_content = True
+            shutil.copyfileobj(resp.raw, f)
+            size = f.tell()
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    finally:
+        resp.close()
+    return size
 
 
 def daterange(start, end=None, time_format="%Y-%m-%d"):
@@ -0,0 +1,507 @@
+import gzip
+import hmac
+import json
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from time import monotonic, sleep
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from scripts.data import (Order, Side, Size, Price, ExecutionType,
+                          SymbolSpec)
+
+
+def now_iso():
+    now = datetime.now(timezone.utc)
+    return now.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def error_body(code, message, status=5):
+    return {"status": status,
+            "messages": [{"message_code": code, "message_string": message}],
+            "responsetime": now_iso()}
+
+
+class Clock(object):
+    """clock returning now, set by the test
+    """
+    now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def make_order(symbol, side=Side.BUY, lot=1, price=100, tif="FAS",
+               execution_type=ExecutionType.LIMIT, **kwargs):
+    """returns an Order of lot minimum sizes at price,
+    kwargs are passed to Order
+    """
+    spec = SymbolSpec(symbol, "1", 0.01, 10)
+    return Order(symbol, side, Size(symbol, lot=lot, spec=spec),
+                 execution_type, Price(symbol, price, spec=spec),
+                 time_in_force=tif, **kwargs)
+
+
+def random_walk(seed, n, p0, sigma=1e-3, interval=None):
+    """returns timestamps and rounded prices of a geometric random walk.
+    Args:
+        interval: milliseconds between trades, random if None
+    """
+    rng = np.random.default_rng(seed)
+    if interval is None:
+        ts = np.cumsum(rng.integers(100, 2000, n)).astype(np.int64)
+    else:
+        ts = np.arange(n, dtype=np.int64) * interval
+    return ts, np.round(p0 * np.exp(np.cumsum(rng.normal(0, sigma, n))))
+
+
+class RateLimit(object):
+    """token bucket that rejects instead of waiting
+    """
+    def __init__(self, rate, burst=None, clock=monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+
+    def allow(self):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class MockGmoServer(object):
+    """local stand-in of the GMO Coin api for offline tests and benchmarks.
+    serves the public and private REST paths GmoApi uses, verifies the
+    HMAC headers of the private ones and serves the trade archives.
+    orders rest until execute() or cancelOrders, and executing one moves
+    the assets. latency, errors and rate limits can be injected.
+
+        with MockGmoServer() as server:
+            api = server.connect(GmoApi(server.api_key, server.secret_key))
+    """
+    def __init__(self, api_key="KEY", secret_key="SECRET",
+                 host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 rate_limit=None, seed=None):
+        """
+        Args:
+            latency: seconds every response is delayed,
+                     or dict of path (e.g. "/v1/order"): seconds
+            error_rate: probability that a request fails with HTTP 503
+            rate_limit: requests per second of each of the public and
+                        private budgets, exceeding requests get HTTP 429
+                        and GMO's ERR-5003 (unlimited if None)
+        """
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.limits = None
+        if rate_limit is not None:
+            self.limits = {"public": RateLimit(rate_limit),
+                           "private": RateLimit(rate_limit)}
+        self.lock = threading.Lock()
+
+        # exchange state
+        self.status = "OPEN"
+        self.tickers = {}      # symbol: dict of ask, bid, last, volume
+        self.orderbooks = {}   # symbol: (asks, bids)
+        self.trades = {}       # symbol: list of trades, newest first
+        self.assets = {}       # symbol: [amount, available]
+        self.orders = {}       # orderId: dict in the /v1/orders format
+        self.archives = {}     # "SYMBOL/YYYY/MM/FILE": bytes
+        self.tokens = set()
+        self.order_id = 0
+        self.failures = {}     # path: list of http status to reply
+
+        # statistics
+        self.requests = {}     # path: number of requests
+        self.connections = 0   # accepted tcp connections
+        self.in_flight = 0     # requests being served
+        self.max_in_flight = 0
+        self.rejected = {"signature": 0, "rate_limit": 0, "error": 0}
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with mock.lock:
+                    mock.connections += 1
+
+            def serve(self, method):
+                with mock.lock:
+                    mock.in_flight += 1
+                    mock.max_in_flight = max(mock.max_in_flight,
+                                             mock.in_flight)
+                try:
+                    mock.handle(self, method)
+                finally:
+                    with mock.lock:
+                        mock.in_flight -= 1
+
+            def do_GET(self):
+                self.serve("GET")
+
+            def do_POST(self):
+                self.serve("POST")
+
+            def do_PUT(self):
+                self.serve("PUT")
+
+            def do_DELETE(self):
+                self.serve("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+
+    def connect(self, api):
+        """points the endpoints of GmoApi api to this server
+        and returns it
+        """
+        api.public_endpoint = self.url + "/public"
+        api.private_endpoint = self.url + "/private"
+        api.download_endpoint = self.url + "/data/trades"
+        return api
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    # ---------- state ----------
+
+    def set_ticker(self, symbol, ask, bid, last=None, volume=0):
+        if last is None:
+            last = (ask + bid) / 2
+        with self.lock:
+            self.tickers[symbol] = {"ask": ask, "bid": bid,
+                                    "last": last, "volume": volume}
+
+
+    def set_orderbook(self, symbol, asks, bids):
+        """
+        Args:
+            asks, bids: list of (price, size)
+        """
+        with self.lock:
+            self.orderbooks[symbol] = (list(asks), list(bids))
+
+
+    def add_trades(self, symbol, trades):
+        """
+        Args:
+            trades: list of (price, side, size), oldest first
+        """
+        with self.lock:
+            listed = self.trades.setdefault(symbol, [])
+            for price, side, size in trades:
+                listed.insert(0, {"price": str(price), "side": side,
+                                  "size": str(size),
+                                  "timestamp": now_iso()})
+
+
+    def set_asset(self, symbol, amount, available=None):
+        with self.lock:
+            self.assets[symbol] = [float(amount),
+                                   float(amount if available is None
+                                         else available)]
+
+
+    def add_archive(self, symbol, date, rows):
+        """adds the trade archive of the date
+        Args:
+            rows: list of (side, size, price, timestamp)
+        """
+        lines = ["symbol,side,size,price,timestamp"]
+        lines += [",".join([symbol] + [str(x) for x in row]) for row in rows]
+        key = "/".join([symbol, str(date.year), str(date.month).zfill(2),
+                        date.strftime("%Y%m%d") + "_" + symbol + ".csv.gz"])
+        archive = gzip.compress(("\n".join(lines) + "\n").encode())
+        with self.lock:
+            self.archives[key] = archive
+
+
+    def fail(self, path, status=500, count=1):
+        """makes the next count requests of path fail with status
+        """
+        with self.lock:
+            self.failures.setdefault(path, []).extend([status] * count)
+
+
+    def execute(self, order_id):
+        """fills a resting order at its price and moves the assets
+        """
+        with self.lock:
+            order = self.orders[str(order_id)]
+            if order["status"] != "ORDERED":
+                return
+            size = float(order["size"]) - float(order["executedSize"])
+            price = order["price"] or self.tickers[order["symbol"]]["last"]
+            price = float(price)
+            sign = 1 if order["side"] == "BUY" else -1
+            for symbol, delta in [(order["symbol"], sign * size),
+                                  ("JPY", -sign * size * price)]:
+                asset = self.assets.setdefault(symbol, [0.0, 0.0])
+                asset[0] += delta
+                asset[1] += delta
+            order["executedSize"] = order["size"]
+            order["status"] = "EXECUTED"
+
+
+    # ---------- http ----------
+
+    def reply(self, handler, code, resp, content_type="application/json"):
+        body = resp if type(resp) is bytes else json.dumps(resp).encode()
+        handler.send_response(code)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path.startswith("/public/"):
+            budget, path = "public", url.path[len("/public"):]
+        elif url.path.startswith("/private/"):
+            budget, path = "private", url.path[len("/private"):]
+        elif url.path.startswith("/data/trades/"):
+            budget, path = None, url.path
+        else:
+            self.reply(handler, 404, error_body("ERR-404", "not found"))
+            return
+
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            injected = self.failures.get(path)
+            status = injected.pop(0) if injected else None
+            if status is None and self.error_rate \
+               and self.random.random() < self.error_rate:
+                status = 503
+            if status is not None:
+                self.rejected["error"] += 1
+
+        latency = self.latency
+        if type(latency) is dict:
+            latency = latency.get(path, 0)
+        if latency:
+            sleep(latency)
+
+        if status is not None:
+            self.reply(handler, status,
+                       error_body("ERR-5201", "injected error"))
+            return
+        if budget is None:
+            self.serve_archive(handler, path[len("/data/trades/"):])
+            return
+        if self.limits is not None and not self.limits[budget].allow():
+            with self.lock:
+                self.rejected["rate_limit"] += 1
+            self.reply(handler, 429,
+                       error_body("ERR-5003", "Requests are too many.", 4))
+            return
+        if budget == "private" and not self.verify(handler, method,
+                                                   path, body):
+            with self.lock:
+                self.rejected["signature"] += 1
+            self.reply(handler, 200,
+                       error_body("ERR-5010", "Invalid signature."))
+            return
+
+        payload = json.loads(body) if body else {}
+        route = self.routes.get((budget, method, path))
+        if route is None:
+            self.reply(handler, 404, error_body("ERR-404", "not found"))
+            return
+        try:
+            with self.lock:
+                data = route(self, params, payload)
+        except (KeyError, ValueError) as e:
+            self.reply(handler, 200, error_body("ERR-5106",
+                                                f"Invalid request: {e}"))
+            return
+        resp = {"status": 0, "responsetime": now_iso()}
+        if data is not None:
+            resp["data"] = data
+        self.reply(handler, 200, resp)
+
+
+    def verify(self, handler, method, path, body):
+        """checks API-KEY and API-SIGN of a private request
+        """
+        headers = handler.headers
+        timestamp = headers.get("API-TIMESTAMP", "")
+        text = timestamp.encode() + method.encode() + path.encode() + body
+        sign = hmac.new(self.secret_key.encode(), text,
+                        hashlib.sha256).hexdigest()
+        return headers.get("API-KEY") == self.api_key \
+               and hmac.compare_digest(sign, headers.get("API-SIGN", ""))
+
+
+    def serve_archive(self, handler, key):
+        data = self.archives.get(key)
+        if data is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        self.reply(handler, 200, data, "application/gzip")
+
+
+    # ---------- routes (called with self.lock held) ----------
+
+    def get_status(self, params, payload):
+        return {"status": self.status}
+
+
+    def get_ticker(self, params, payload):
+        symbol = params.get("symbol")
+        return [{"symbol": s,
+                 "ask": str(t["ask"]), "bid": str(t["bid"]),
+                 "last": str(t["last"]), "volume": str(t["volume"]),
+                 "high": str(t["last"]), "low": str(t["last"]),
+                 "timestamp": now_iso()}
+                for s, t in self.tickers.items()
+                if symbol is None or s == symbol]
+
+
+    def get_orderbooks(self, params, payload):
+        symbol = params["symbol"]
+        asks, bids = self.orderbooks.get(symbol, ([], []))
+        level = lambda p, s: {"price": str(p), "size": str(s)}
+        return {"asks": [level(p, s) for p, s in asks],
+                "bids": [level(p, s) for p, s in bids],
+                "symbol": symbol, "timestamp": now_iso()}
+
+
+    def get_trades(self, params, payload):
+        trades = self.trades.get(params["symbol"], [])
+        page = int(params.get("page", 1))
+        count = min(int(params.get("count", 100)), 100)
+        return {"pagination": {"currentPage": page, "count": count},
+                "list": trades[(page - 1) * count:page * count]}
+
+
+    def get_assets(self, params, payload):
+        return [{"symbol": s, "amount": repr(a[0]),
+                 "available": repr(a[1]), "conversionRate": "1"}
+                for s, a in self.assets.items()]
+
+
+    def post_order(self, params, payload):
+        if payload["side"] not in ("BUY", "SELL"):
+            raise ValueError(payload["side"])
+        float(payload["size"])
+        self.order_id += 1
+        order_id = str(self.order_id)
+        self.orders[order_id] = {
+            "orderId": self.order_id,
+            "symbol": payload["symbol"],
+            "side": payload["side"],
+            "executionType": payload["executionType"],
+            "size": payload["size"],
+            "executedSize": "0",
+            "price": payload.get("price", ""),
+            "status": "ORDERED",
+            "timeInForce": payload.get("timeInForce", "FAS"),
+            "timestamp": now_iso()
+        }
+        return order_id
+
+
+    def get_orders(self, params, payload):
+        ids = params["orderId"].split(",")
+        return {"list": [dict(self.orders[i]) for i in ids
+                         if i in self.orders]}
+
+
+    def post_cancel_orders(self, params, payload):
+        success, failed = [], []
+        for order_id in payload["orderIds"]:
+            order = self.orders.get(str(order_id))
+            if order is None or order["status"] != "ORDERED":
+                failed.append({"message_code": "ERR-5122",
+                               "message_string": "The request is invalid "
+                                                 "due to the status of "
+                                                 "the specified order.",
+                               "orderId": order_id})
+            else:
+                order["status"] = "CANCELED"
+                success.append(order_id)
+        return {"success": success, "failed": failed}
+
+
+    def post_ws_token(self, params, payload):
+        token = "TOKEN%d" % len(self.tokens)
+        self.tokens.add(token)
+        return token
+
+
+    def put_ws_token(self, params, payload):
+        if payload["token"] not in self.tokens:
+            raise KeyError(payload["token"])
+
+
+    def delete_ws_token(self, params, payload):
+        self.tokens.remove(payload["token"])
+
+
+    routes = {
+        ("public", "GET", "/v1/status"): get_status,
+        ("public", "GET", "/v1/ticker"): get_ticker,
+        ("public", "GET", "/v1/orderbooks"): get_orderbooks,
+        ("public", "GET", "/v1/trades"): get_trades,
+        ("private", "GET", "/v1/account/assets"): get_assets,
+        ("private", "POST", "/v1/order"): post_order,
+        ("private", "GET", "/v1/orders"): get_orders,
+        ("private", "POST", "/v1/cancelOrders"): post_cancel_orders,
+        ("private", "POST", "/v1/ws-auth"): post_ws_token,
+        ("private", "PUT", "/v1/ws-auth"): put_ws_token,
+        ("private", "DELETE", "/v1/ws-auth"): delete_ws_token,
+    }
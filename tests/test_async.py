@@ -0,0 +1,39 @@
+import sys
+sys.path.append(".")
+
+import asyncio
+from scripts import *
+from scripts.data import *
+from tests.mock import MockGmoServer
+
+
+def test_async_daemon():
+    # slow order acks to see the concurrent posts
+    with MockGmoServer(latency={"/v1/order": 0.1}) as server:
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0)
+        server.set_asset("ETH", 0)
+        server.set_ticker("BTC", 5000100, 4999900)
+        server.set_ticker("ETH", 300010, 299990)
+
+        async def main():
+            async with get_async_crypto_api_client("GMO", server.api_key,
+                                                   server.secret_key) as api:
+                server.connect(api.api)
+                daemon = AsyncShannonsDaemon(api, ["BTC", "ETH"],
+                                             {"BTC": 0.0001, "ETH": 0.01},
+                                             {"BTC": 5, "ETH": 10},
+                                             {"BTC": "1", "ETH": "1"},
+                                             max_concurrency=2)
+                return await daemon.run()
+
+        orders = asyncio.run(main())
+
+        assert [o.symbol for o in orders] == ["BTC", "ETH"]
+        assert all(o.side is Side.BUY for o in orders)
+        assert sorted(o.ID for o in orders) == ["1", "2"]
+        assert server.max_in_flight == 2
+
+
+if __name__ == '__main__':
+    test_async_daemon()
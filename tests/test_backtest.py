@@ -0,0 +1,77 @@
+import sys
+sys.path.append(".")
+
+import numpy as np
+from scripts import *
+from scripts.data import *
+from scripts.backtest import Backtester, resample
+from tests.mock import random_walk
+
+SYMBOLS = ["BTC", "ETH"]
+MIN_SIZES = {"BTC": 0.0001, "ETH": 0.01}
+MAX_SIZES = {"BTC": 5, "ETH": 100}
+STEP_VALUES = {"BTC": "1", "ETH": "0.05"}
+
+
+def test_decide_matches_rebalance():
+    daemon = ShannonsDaemon(None, list(SYMBOLS), MIN_SIZES, MAX_SIZES,
+                            STEP_VALUES)
+    bt = Backtester(SYMBOLS, MIN_SIZES, MAX_SIZES, STEP_VALUES,
+                    spread=0.0002)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        jpy = rng.uniform(1e4, 1e6)
+        amount = np.array([rng.uniform(0, 0.5), rng.uniform(0, 5)])
+        last = np.array([rng.uniform(3e6, 6e6), rng.uniform(1e5, 4e5)])
+        bid, ask = last * (1 - 0.0001), last * (1 + 0.0001)
+
+        assets = {"JPY": Asset(jpy, jpy)}
+        ticker = {}
+        for i, s in enumerate(SYMBOLS):
+            assets[s] = Asset(amount[i], amount[i])
+            ticker[s] = Ticker(ask[i], bid[i], last[i], 0, "")
+        orders = {o.symbol: o for o in daemon.rebalance(assets, ticker)}
+
+        side, nlot, size, price = bt.decide(jpy, amount, last[None],
+                                            bid[None], ask[None])
+        for i, s in enumerate(SYMBOLS):
+            if s not in orders:
+                assert nlot[0, i] == 0
+                continue
+            assert nlot[0, i] == orders[s].size.lot
+            assert side[0, i] == orders[s].side.value
+            assert size[0, i] == orders[s].size.actual_value
+            assert price[0, i] == float(orders[s].price)
+
+
+def test_resample():
+    ts = np.array([0, 500, 1000, 3500])
+    price = np.array([10., 12., 9., 11.])
+    last, low, high = resample(ts, price, np.array([1000, 2000, 3000]), 1000)
+    assert last.tolist() == [12, 9, 9]
+    assert low[0] == 9 and np.isnan(low[1]) and low[2] == 11
+    assert high[0] == 9 and np.isnan(high[1]) and high[2] == 11
+
+
+def test_backtest_run():
+    prices = {"BTC": random_walk(1, 100000, 5e6),
+              "ETH": random_walk(2, 100000, 3e5)}
+    bt = Backtester(SYMBOLS, MIN_SIZES, MAX_SIZES, STEP_VALUES,
+                    interval=15, fee_rate=0.0005)
+    result = bt.run(prices, {"JPY": 300000, "BTC": 0.02, "ETH": 0.3})
+
+    assert len(result.equity) == len(result.timestamp)
+    assert result.trades.sum() > 0
+    assert result.fees > 0
+    assert np.all(result.jpy >= 0)
+    assert np.all(result.holdings >= 0)
+    # equity is cash plus holdings at the last price
+    summary = result.summary()
+    assert summary["trades"] == int(result.trades.sum())
+    assert summary["turnover"] > 0
+
+
+if __name__ == '__main__':
+    test_decide_matches_rebalance()
+    test_resample()
+    test_backtest_run()
@@ -0,0 +1,81 @@
+import sys
+sys.path.append(".")
+
+import numpy as np
+from scripts.bars import BarAggregator, BarSeries
+
+
+def test_bar_series():
+    series = BarSeries(1000, capacity=3)
+    for ts, price, size in [(0, 10, 1), (400, 12, 1), (900, 9, 2),
+                            (1500, 11, 1), (3200, 13, 1), (3100, 14, 1),
+                            (1000, 1, 1)]:
+        series.update(ts, price, size)
+
+    bars = series.bars()
+    assert bars["start"].tolist() == [0, 1000]
+    assert bars["open"].tolist() == [10, 11]
+    assert bars["high"].tolist() == [12, 11]
+    assert bars["low"].tolist() == [9, 11]
+    assert bars["close"].tolist() == [9, 11]
+    assert bars["volume"].tolist() == [4, 1]
+    assert series.late == 1
+
+    bars = series.bars(partial=True)
+    assert bars["start"].tolist() == [0, 1000, 3000]
+    assert bars["high"][-1] == 14 and bars["close"][-1] == 14
+
+    # the ring buffer keeps the newest bars
+    for ts in range(4000, 10000, 1000):
+        series.update(ts, 1, 1)
+    assert len(series) == 3
+    assert series.bars()["start"].tolist() == [6000, 7000, 8000]
+    assert series.bars(2)["start"].tolist() == [7000, 8000]
+
+
+def test_bar_aggregator():
+    agg = BarAggregator(("1s", "1m"), capacity=10)
+    ts = np.arange(0, 120000, 500)
+    agg.add_arrays("BTC", ts, np.arange(len(ts)), np.ones(len(ts)))
+    assert len(agg.bars("BTC", "1s")["start"]) == 10
+    minute = agg.bars("BTC", "1m")
+    assert minute["open"].tolist() == [0]
+    assert minute["close"].tolist() == [119]
+    assert minute["volume"].tolist() == [120]
+
+    # REST page (newest first), already added trades are skipped
+    agg.add_trades("BTC", [
+        {"price": "300", "side": "BUY", "size": "2",
+         "timestamp": "1970-01-01T00:02:01.000Z"},
+        {"price": "239", "side": "SELL", "size": "1",
+         "timestamp": "1970-01-01T00:01:59.500Z"},
+    ])
+    minute = agg.bars("BTC", "1m", partial=True)
+    assert minute["close"].tolist() == [119, 239, 300]
+    assert minute["volume"].tolist() == [120, 120, 2]
+
+
+def test_same_millisecond():
+    agg = BarAggregator(("1m",))
+    trade = lambda price, size, side, ms=0: {
+        "price": str(price), "size": str(size), "side": side,
+        "timestamp": "1970-01-01T00:00:01.%03dZ" % ms}
+    # a page ends in the middle of the trades of a millisecond
+    agg.add_trades("BTC", [trade(101, 1, "BUY"), trade(100, 1, "BUY")])
+    # the next page repeats them, with two more of the same millisecond
+    # (one identical to an added one) and a later one
+    agg.add_trades("BTC", [trade(102, 3, "BUY", 1), trade(100, 1, "BUY"),
+                           trade(103, 2, "SELL"), trade(101, 1, "BUY"),
+                           trade(100, 1, "BUY")])
+    minute = agg.bars("BTC", "1m", partial=True)
+    assert minute["volume"].tolist() == [1 + 1 + 2 + 1 + 3]
+    assert minute["high"].tolist() == [103]
+    # the same page again adds nothing
+    agg.add_trades("BTC", [trade(102, 3, "BUY", 1), trade(100, 1, "BUY")])
+    assert agg.bars("BTC", "1m", partial=True)["volume"].tolist() == [8]
+
+
+if __name__ == '__main__':
+    test_bar_series()
+    test_bar_aggregator()
+    test_same_millisecond()
@@ -0,0 +1,106 @@
+import sys
+sys.path.append(".")
+
+import time
+import threading
+from scripts import *
+from scripts.cache import TtlCache
+from tests.mock import MockGmoServer, Clock
+
+
+def test_ttl():
+    clock = Clock()
+    cache = TtlCache(clock)
+    calls = []
+    fetch = lambda: calls.append(1) or len(calls)
+
+    assert cache.get(("ticker",), 1, fetch) == 1
+    clock.now = 0.5
+    assert cache.get(("ticker",), 1, fetch) == 1
+    clock.now = 1.0
+    assert cache.get(("ticker",), 1, fetch) == 2
+    assert cache.get(("orderbooks", "BTC"), 1, fetch) == 3
+    cache.invalidate("ticker")
+    assert cache.get(("ticker",), 1, fetch) == 4
+    assert cache.stats() == {
+        "ticker": {"hit": 1, "miss": 3, "coalesced": 0},
+        "orderbooks": {"hit": 0, "miss": 1, "coalesced": 0},
+    }
+
+
+def test_coalescing():
+    cache = TtlCache()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "data"
+
+    results = []
+    threads = [threading.Thread(
+                   target=lambda: results.append(
+                       cache.get(("status",), 10, fetch)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    while cache.stats().get("status", {}).get("coalesced", 0) < 7:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["data"] * 8
+    assert cache.stats()["status"] == {"hit": 0, "miss": 1, "coalesced": 7}
+
+
+def test_error_is_not_cached():
+    cache = TtlCache()
+    def fail():
+        raise RuntimeError("down")
+    try:
+        cache.get(("status",), 10, fail)
+        assert False
+    except RuntimeError:
+        pass
+    assert cache.get(("status",), 10, lambda: "OPEN") == "OPEN"
+
+
+def test_api_cache():
+    with MockGmoServer() as server, MockGmoServer() as other:
+        server.set_ticker("BTC", 101, 99)
+        server.set_orderbook("BTC", [(101, 1)], [(99, 1)])
+        other.set_ticker("BTC", 201, 199)
+        cache = TtlCache()
+        api = server.connect(get_crypto_api_client("GMO", "KEY", "SECRET",
+                                                   cache=cache))
+        api2 = other.connect(get_crypto_api_client("GMO", "KEY", "SECRET",
+                                                   cache=cache))
+
+        # callers get copies of the cached values
+        ticker = api.get_ticker(["BTC"])
+        ticker["BTC"].last = 0
+        book = api.get_orderbooks("BTC")
+        book["asks"].clear()
+        assert api.get_ticker(["BTC"])["BTC"].last == 100
+        assert len(api.get_orderbooks("BTC")["asks"]) == 1
+        assert server.requests["/v1/ticker"] == 1
+        assert server.requests["/v1/orderbooks"] == 1
+
+        # entries are keyed by the endpoint
+        assert api2.get_ticker(["BTC"])["BTC"].last == 200
+
+        # not cached without a cache
+        api3 = server.connect(get_crypto_api_client("GMO", "KEY", "SECRET"))
+        api3.get_ticker(["BTC"])
+        api3.get_ticker(["BTC"])
+        assert server.requests["/v1/ticker"] == 3
+
+
+if __name__ == '__main__':
+    test_ttl()
+    test_coalescing()
+    test_error_is_not_cached()
+    test_api_cache()
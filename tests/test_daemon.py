@@ -1,20 +1,125 @@
 import sys
 sys.path.append(".")
+import asyncio
 from scripts import *
+from scripts.data import *
+from tests.mock import MockGmoServer
 
 def test_daemon():
-    config = load_yaml("data/config/gmo.yaml")
-    api = get_crypto_api_client(config["exchange"],
-                                config["api-key"],
-                                config["secret-key"])
-    daemon = ShannonsDaemon(api,
-                            config["symbols"],
-                            config["min-sizes"],
-                            config["max-sizes"],
-                            config["step-values"],
-                            3)
-    daemon.run()
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0)
+        server.set_asset("ETH", 0)
+        server.set_ticker("BTC", 5000100, 4999900)
+        server.set_ticker("ETH", 300010, 299990)
+        api = server.connect(get_crypto_api_client("GMO",
+                                                   server.api_key,
+                                                   server.secret_key))
+        daemon = ShannonsDaemon(api,
+                                ["BTC", "ETH"],
+                                {"BTC": 0.0001, "ETH": 0.01},
+                                {"BTC": 5, "ETH": 10},
+                                {"BTC": "1", "ETH": "1"},
+                                3)
+        daemon.run()
+        assert server.requests["/v1/order"] == 2
+        assert len(daemon.posting_orders) == 2
+
+
+class FakeTickerStream(object):
+    """TickerStream replaying a list of ticker tables
+    """
+    def __init__(self, daemon, tickers):
+        self.daemon = daemon
+        self.tickers = list(tickers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def wait(self, timeout=None):
+        if not self.tickers:
+            self.daemon.stop()
+            return None
+        return self.tickers.pop(0)
+
+
+def test_run_streaming():
+    with MockGmoServer() as server:
+        # already balanced
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0.06)
+        api = server.connect(get_crypto_api_client("GMO",
+                                                   server.api_key,
+                                                   server.secret_key))
+        daemon = ShannonsDaemon(api, ["BTC"], {"BTC": 0.0001},
+                                {"BTC": 5}, {"BTC": "1"})
+        ticker = lambda p: {"BTC": Ticker(p + 100, p - 100, p, 0, "")}
+        stream = FakeTickerStream(daemon, [ticker(5000000)] * 5)
+        daemon.run_streaming(stream, min_interval=0)
+
+        # the streamed ticker and the first assets are reused
+        assert server.requests["/v1/status"] == 1
+        assert server.requests["/v1/account/assets"] == 1
+        assert "/v1/ticker" not in server.requests
+        assert "/v1/order" not in server.requests
+
+        # the price moves: an order is posted, then the assets are
+        # fetched again since it may have filled
+        daemon.stopped.clear()
+        stream = FakeTickerStream(daemon, [ticker(6000000)] * 2)
+        daemon.run_streaming(stream, min_interval=0)
+        assert server.requests["/v1/order"] == 2
+        assert server.requests["/v1/account/assets"] == 2
+        assert server.requests["/v1/status"] == 2
+
+
+def test_async_streaming():
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0.06)
+        server.set_ticker("BTC", 5000100, 4999900)
+        api = get_async_crypto_api_client("GMO", server.api_key,
+                                          server.secret_key)
+        server.connect(api.api)
+        daemon = AsyncShannonsDaemon(api, ["BTC"], {"BTC": 0.0001},
+                                     {"BTC": 5}, {"BTC": "1"},
+                                     threshold=0.01)
+        ticker = lambda p: {"BTC": Ticker(p + 100, p - 100, p, 0, "")}
+
+        async def main():
+            async with api:
+                stream = FakeTickerStream(daemon, [ticker(5000000)] * 5)
+                await daemon.run_streaming(stream, min_interval=0)
+                # polled cycles reuse the assets as well
+                await daemon.run()
+                await daemon.run()
+        asyncio.run(main())
+
+        # the same calls as the synchronous daemon
+        assert server.requests["/v1/status"] == 3
+        assert server.requests["/v1/account/assets"] == 1
+        assert server.requests["/v1/ticker"] == 2
+        assert "/v1/order" not in server.requests
+
+
+def test_missing_spec():
+    # the symbol is named instead of failing inside the kernel
+    for missing in range(3):
+        specs = [{"BTC": 0.0001, "ETH": 0.01}, {"BTC": 5, "ETH": 10},
+                 {"BTC": "1", "ETH": "1"}]
+        del specs[missing]["ETH"]
+        try:
+            ShannonsDaemon(None, ["BTC", "ETH"], *specs)
+            assert False
+        except KeyError as e:
+            assert "ETH" in str(e)
 
 
 if __name__ == '__main__':
     test_daemon()
+    test_run_streaming()
+    test_async_streaming()
+    test_missing_spec()
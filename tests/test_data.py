@@ -1,20 +1,64 @@
 import sys
 sys.path.append(".")
 
-from pprint import pprint
 from scripts import *
+from scripts.data import *
 
 def test_price():
-    Price.step_value = {
+    Price.step_values = {
         "A": "1",
         "B": "0.001",
         "C": "5"
     }
-    pprint(Price.step_value)
-    print(Price("A", 100.00000003).submit())
-    print(Price("B", 25.25252525).submit())
-    print(Price("C", 333.33).submit())
+    assert Price("A", 100.00000003).value == "100"
+    assert Price("B", 25.25252525).value == "25.252"
+    assert Price("C", 333.33).value == "330"
+    assert Price("A", 100.00000003).symbol == "A"
+
+
+
+def test_fixed_point():
+    Price.step_values = {"A": "1", "B": "0.001", "C": "5"}
+    Size.min_sizes = {"A": 0.0001, "B": 0.1, "C": 1}
+    Size.max_sizes = {"A": 5, "B": 100, "C": 1000}
+
+    assert Price("A", 100.00000003).value == "100"
+    assert Price("B", 25.25252525).value == "25.252"
+    assert Price("C", 333.33).value == "330"
+    # exact even where float floor division is not (0.3 // 0.1 == 2)
+    assert Price("B", 0.3).value == "0.300"
+    assert float(Price("B", 25.2525)) == 25.252
+
+    assert Size("B", val=0.3).lot == 3
+    assert Size("A", val=0.00034).value == "0.0003"
+    assert Size("A", lot=1).value == "0.0001"
+    assert Size("A", lot=100000).value == "5"
+    assert Size("A", lot=-1).actual_value == -0.0001
+    for lot in range(0, 1000, 7):
+        assert Size("B", lot=lot).actual_value == round(lot * 0.1, 8)
+
+    # exact: only division ulps are absorbed, not values below a step
+    assert Price("A", 99.9999999).value == "99"
+    assert Price("B", 0.2999999).value == "0.299"
+    assert Size("B", val=0.29999999).lot == 2
+    assert Size("B", val=0.7).lot == 7
+
+    # specs are recompiled when the class attributes change
+    Price.step_values = {"A": "0.5"}
+    assert Price("A", 100.7).value == "100.5"
+
+    # an equal value built as a new object keeps the compiled spec
+    spec = Price._specs["A"]
+    Price.step_values = {"A": "".join(["0", ".5"])}
+    Price("A", 1)
+    assert Price._specs["A"] is spec
+
+    # a spec can be given explicitly instead of the class attributes
+    spec = SymbolSpec("X", "0.01", 0.001, 1)
+    assert Price("X", 1.239, spec=spec).value == "1.23"
+    assert Size("X", val=0.0025, spec=spec).value == "0.002"
     
     
 if __name__ == '__main__':
     test_price()
+    test_fixed_point()
@@ -1,20 +1,30 @@
 import sys
 sys.path.append(".")
 from scripts import *
+from tests.mock import MockGmoServer
 from datetime import datetime
+import requests
+
+def test_download(tmp_path):
+    with MockGmoServer() as server:
+        server.add_archive("BTC", datetime(2020, 3, 14),
+                           [("BUY", "0.01", "5000000",
+                             "2020-03-14 00:00:00.000")])
+        api = server.connect(get_crypto_api_client("GMO", "NONE", "NONE"))
+        print(api.download_endpoint + "/BTC/2020/03/20200314_BTC.csv.gz")
+        api.download_execution_history("BTC",
+                                       datetime(2020, 3, 14),
+                                       str(tmp_path))
+        assert (tmp_path / "20200314_BTC.csv.gz").exists()
+        try:
+            api.download_execution_history("BTC",
+                                           datetime(2100, 3, 14),
+                                           str(tmp_path))
+            assert False
+        except requests.HTTPError:
+            pass
 
-def test_download():
-    api = get_crypto_api_client("GMO", "NONE", "NONE")
-    print("https://api.coin.z.com/data/trades/BTC/2020/03/20200314_BTC.csv.gz")
-    api.download_execution_history("BTC",
-                                   datetime(2020, 3, 14),
-                                   "data/history/BTC")
-    api.download_execution_history("BTC",
-                                   datetime(2100, 3, 14),
-                                   "data/history/BTC")    
-    
-    
-if __name__ == '__main__':
-    test_download()
 
-    
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_download(pathlib.Path(tempfile.mkdtemp()))
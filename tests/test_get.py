@@ -3,30 +3,41 @@ sys.path.append(".")
 
 from pprint import pprint
 from scripts import *
+from tests.mock import MockGmoServer
 
 def test_gmo_get_api():
-    config = load_yaml("data/config/gmo.yaml")
-    name = config["exchange"]
-    api_key = config["api-key"]
-    secret_key = config["secret-key"]    
-    api = get_crypto_api_client(name, api_key, secret_key)
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 100000)
+        server.set_asset("BTC", 0.5)
+        server.set_asset("LTC", 2)
+        server.set_ticker("BTC", 5000100, 4999900)
+        server.set_ticker("LTC", 10010, 9990)
+        server.set_orderbook("BTC",
+                             [(5000200, 0.1), (5000100, 0.2)],
+                             [(4999800, 0.1), (4999900, 0.3)])
+        api = server.connect(get_crypto_api_client("GMO",
+                                                   server.api_key,
+                                                   server.secret_key))
 
-    symbols = ["BTC", "JPY", "LTC"]
-    if api.is_available():
-        assets = api.get_assets(symbols)
-        print("----- assets -----")
-        pprint(assets)
+        symbols = ["BTC", "JPY", "LTC"]
+        if api.is_available():
+            assets = api.get_assets(symbols)
+            print("----- assets -----")
+            pprint(assets)
+            assert sorted(assets) == sorted(symbols)
 
-        ticker = api.get_ticker(symbols)
-        print("----- ticker -----")
-        pprint(ticker)
+            ticker = api.get_ticker(symbols)
+            print("----- ticker -----")
+            pprint(ticker)
+            assert ticker["BTC"].last == 5000000
+
+            orderbooks = api.get_orderbooks("BTC")
+            print("----- orderbooks -----")
+            pprint(orderbooks["asks"][:3])
+            pprint(orderbooks["bids"][:3])
+            assert orderbooks["asks"][0]["price"] == "5000100"
+            assert orderbooks["bids"][0]["price"] == "4999900"
 
-        orderbooks = api.get_orderbooks("BTC")
-        print("----- orderbooks -----")
-        pprint(orderbooks["asks"][:3])
-        pprint(orderbooks["bids"][:3])
-        
 
-        
 if __name__ == '__main__':
     test_gmo_get_api()
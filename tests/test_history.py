@@ -0,0 +1,166 @@
+import sys
+sys.path.append(".")
+
+import os
+import threading
+import requests
+from datetime import date
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from scripts import *
+from scripts.history import HistoryDownloader, HistorySync
+from tests.mock import MockGmoServer
+from scripts.store import TradeStore
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def test_bulk_download(tmp_path):
+    # local file server laid out like https://api.coin.z.com/data/trades
+    served = tmp_path / "served"
+    for symbol in ["BTC", "ETH"]:
+        month = served / symbol / "2021" / "01"
+        month.mkdir(parents=True)
+        for day in [1, 2, 3]:
+            fname = f"202101{day:02d}_{symbol}.csv.gz"
+            (month / fname).write_bytes(os.urandom(1000))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                 partial(QuietHandler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    api = get_crypto_api_client("GMO", "NONE", "NONE")
+    api.download_endpoint = "http://127.0.0.1:%d" % server.server_port
+    root = tmp_path / "history"
+    downloader = HistoryDownloader(api, str(root), workers=4)
+    try:
+        # 2021-01-04 is not published
+        stats = downloader.download(["BTC", "ETH"],
+                                    "2021-01-01", "2021-01-05")
+        assert stats["downloaded"] == 6
+        assert stats["bytes"] == 6000
+        assert stats["missing"] == [("BTC", date(2021, 1, 4)),
+                                    ("ETH", date(2021, 1, 4))]
+        assert stats["failed"] == []
+        assert sorted(os.listdir(root / "BTC")) == \
+            ["20210101_BTC.csv.gz", "20210102_BTC.csv.gz",
+             "20210103_BTC.csv.gz"]
+
+        # completed archives are skipped
+        stats = downloader.download(["BTC", "ETH"],
+                                    "2021-01-01", "2021-01-05")
+        assert stats["downloaded"] == 0
+        assert len(stats["missing"]) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FailingApi(object):
+    def get_history_filename(self, symbol, date):
+        return date.strftime("%Y%m%d") + "_" + symbol + ".csv.gz"
+
+    def download_execution_history(self, symbol, date, path):
+        if symbol == "BTC":
+            resp = requests.Response()
+            resp.status_code = 503
+            raise requests.HTTPError(response=resp)
+        raise OSError("disk full")
+
+
+def test_download_errors(tmp_path):
+    # left by an interrupted run
+    (tmp_path / "BTC").mkdir()
+    (tmp_path / "BTC" / "tmpabc.part").write_bytes(b"partial")
+    downloader = HistoryDownloader(FailingApi(), str(tmp_path))
+    stats = downloader.download(["BTC", "ETH"], "2021-01-01", "2021-01-02")
+    assert stats["failed"] == [("BTC", date(2021, 1, 1)),
+                               ("ETH", date(2021, 1, 1))]
+    assert stats["errors"] == {("BTC", date(2021, 1, 1)): "HTTP 503",
+                               ("ETH", date(2021, 1, 1)):
+                                   "OSError: disk full"}
+    assert os.listdir(tmp_path / "BTC") == []
+
+
+class ShiftingApi(object):
+    """adds trades to the server in the middle of a sync
+    """
+    def __init__(self, api, server, page, trades):
+        self.api = api
+        self.server = server
+        self.page = page
+        self.trades = trades
+
+
+    def get_execution_history(self, symbol, page=1, count=100):
+        if page == self.page and self.trades:
+            self.server.add_trades(symbol, self.trades)
+            self.trades = []
+        return self.api.get_execution_history(symbol, page, count)
+
+
+def stored_prices(store, symbol):
+    return [p for day in store.days(symbol)
+            for p in store.load(symbol, day)["price"].tolist()]
+
+
+def test_sync(tmp_path):
+    with MockGmoServer() as server:
+        api = server.connect(get_crypto_api_client("GMO", "NONE", "NONE"))
+        store = TradeStore(str(tmp_path))
+        trades = lambda a, b: [(p, "BUY", "0.01") for p in range(a, b)]
+        server.add_trades("BTC", trades(1, 36))
+
+        sync = HistorySync(api, store, workers=2, count=10)
+        stats = sync.sync("BTC")
+        assert stats["trades"] == 35
+        assert stats["complete"]
+        assert stored_prices(store, "BTC") == list(range(1, 36))
+
+        # stops at the first page holding stored trades
+        server.add_trades("BTC", trades(36, 41))
+        stats = sync.sync("BTC")
+        assert stats == {"trades": 5, "pages": 1, "refetched": 0,
+                         "restarts": 0, "complete": True, "gap": None}
+        assert sync.sync("BTC")["trades"] == 0
+
+        # new trades shift the pages in the middle of the sync
+        server.add_trades("BTC", trades(41, 66))
+        sync.api = ShiftingApi(api, server, 3, trades(66, 73))
+        stats = sync.sync("BTC")
+        assert stats["trades"] == 25
+        assert stats["refetched"] > 0
+        assert stored_prices(store, "BTC") == list(range(1, 66))
+        assert sync.sync("BTC")["trades"] == 7
+        assert stored_prices(store, "BTC") == list(range(1, 73))
+
+        # a page or more of new trades: the sync starts again
+        server.add_trades("BTC", trades(73, 98))
+        sync.api = ShiftingApi(api, server, 3, trades(98, 123))
+        stats = sync.sync("BTC")
+        assert stats["restarts"] == 1
+        assert stats["trades"] == 50
+        assert stored_prices(store, "BTC") == list(range(1, 123))
+
+        # not reaching the stored trades would leave a hole
+        sync.api = api
+        server.add_trades("BTC", trades(123, 153))
+        sync.max_pages = 2
+        stats = sync.sync("BTC")
+        assert not stats["complete"]
+        assert stats["trades"] == 0
+        assert stats["gap"][1] == 133
+        assert stored_prices(store, "BTC") == list(range(1, 123))
+        sync.max_pages = 100
+        assert sync.sync("BTC")["trades"] == 30
+        assert stored_prices(store, "BTC") == list(range(1, 153))
+
+
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_bulk_download(pathlib.Path(tempfile.mkdtemp()))
+    test_download_errors(pathlib.Path(tempfile.mkdtemp()))
+    test_sync(pathlib.Path(tempfile.mkdtemp()))
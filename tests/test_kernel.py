@@ -0,0 +1,114 @@
+import sys
+sys.path.append(".")
+
+from math import log2
+import numpy as np
+from scripts import *
+from scripts.data import *
+from scripts.kernel import RebalanceKernel
+
+
+def reference_rebalance(daemon, assets, ticker):
+    """the per-symbol loop that ShannonsDaemon.rebalance used to run
+    """
+    total = 0
+    for symbol in daemon.symbols:
+        if symbol == daemon.JPY:
+            total += assets[symbol].amount
+        else:
+            total += assets[symbol].amount * ticker[symbol].last
+    balanced_val = total / len(daemon.symbols)
+
+    orders = []
+    for symbol in daemon.symbols:
+        if symbol == daemon.JPY:
+            continue
+        amount = assets[symbol].amount
+        rate = ticker[symbol].last
+        if amount*rate / balanced_val < 1:
+            side = Side.BUY
+        else:
+            side = Side.SELL
+        nlot = Size(symbol, val=abs(amount - balanced_val/rate)).lot
+
+        ratio = lambda n: (amount + side.value*Size(symbol, lot=n).actual_value) / balanced_val
+        r0, r1 = ratio(nlot), ratio(nlot-1)
+        if -r0*log2(r0) < -r1*log2(r1):
+            nlot = nlot - 1
+
+        if nlot > 0:
+            p = ticker[symbol].bid if side is Side.BUY else ticker[symbol].ask
+            orders.append((symbol, side, Size(symbol, lot=nlot).value,
+                           Price(symbol, p).value))
+    return orders
+
+
+def test_kernel_matches_reference():
+    rng = np.random.default_rng(0)
+    for nsymbols in [2, 20]:
+        symbols = [f"C{i}" for i in range(nsymbols)]
+        min_sizes = {s: float(rng.choice([0.0001, 0.001, 0.01]))
+                     for s in symbols}
+        max_sizes = {s: 1000 * min_sizes[s] for s in symbols}
+        step_values = {s: str(rng.choice(["1", "5", "0.1", "0.001"]))
+                       for s in symbols}
+        daemon = ShannonsDaemon(None, list(symbols), min_sizes, max_sizes,
+                                step_values)
+        # the reference builds Price and Size from the class attributes
+        Size.min_sizes, Size.max_sizes = min_sizes, max_sizes
+        Price.step_values = step_values
+        compared = 0
+        for _ in range(200):
+            last = rng.uniform(10, 1e6, nsymbols)
+            value = rng.uniform(1e4, 1e5, nsymbols)
+            assets = {"JPY": Asset(rng.uniform(1e4, 1e6), 0)}
+            ticker = {}
+            for i, s in enumerate(symbols):
+                assets[s] = Asset(value[i] / last[i], 0)
+                ticker[s] = Ticker(last[i] * 1.001, last[i] * 0.999,
+                                   last[i], 0, "")
+            try:
+                expected = reference_rebalance(daemon, assets, ticker)
+            except ValueError:
+                # log2 of a non-positive ratio
+                continue
+            orders = daemon.rebalance(assets, ticker)
+            assert [(o.symbol, o.side, o.size.value, o.price.value)
+                    for o in orders] == expected
+            compared += 1
+        assert compared > 100
+
+
+def test_kernel_batch():
+    spec = SymbolSpec("BTC", "1", 0.0001, 5)
+    kernel = RebalanceKernel([spec])
+    amount = np.array([[0.0], [0.02], [0.04]])
+    last = np.full((3, 1), 5e6)
+    side, nlot, size, price = kernel(np.array([1e5, 1e5, 1e5]), amount,
+                                     last, last - 1000, last + 1000)
+    assert side[:, 0].tolist() == [Side.BUY.value, Side.SELL.value,
+                                   Side.SELL.value]
+    # balanced: no order
+    assert nlot[:, 0].tolist() == [100, 0, 99]
+    assert size[:, 0].tolist() == [0.01, 0, 0.0099]
+    assert price[:, 0].tolist() == [4999000, 5001000, 5001000]
+
+
+def test_price_rounding():
+    # the same exact rounding as Price, near and on the steps
+    specs = [SymbolSpec("A", "1", 0.1, 10), SymbolSpec("B", "0.1", 0.1, 10),
+             SymbolSpec("C", "5", 0.1, 10)]
+    kernel = RebalanceKernel(specs)
+    prices = np.array([[99.9999999, 0.3, 335.0],
+                       [100.0, 0.2999999, 334.9999999],
+                       [5012345.6, 0.30000000000000004, 5.000000000001]])
+    expected = [[float(Price(s.symbol, p, spec=s)) for s, p in zip(specs, row)]
+                for row in prices.tolist()]
+    assert kernel.price_value(prices).tolist() == expected
+    assert expected[0] == [99, 0.3, 335] and expected[1][1] == 0.2
+
+
+if __name__ == '__main__':
+    test_kernel_matches_reference()
+    test_kernel_batch()
+    test_price_rounding()
@@ -0,0 +1,81 @@
+import sys
+sys.path.append(".")
+
+import urllib.request
+from scripts import *
+from scripts.metrics import *
+from tests.mock import MockGmoServer, Clock
+
+
+def test_histogram():
+    h = Histogram((0.001, 0.01, 0.1))
+    for v in [0.0005, 0.002, 0.003, 0.05, 0.5]:
+        h.observe(v)
+    assert h.counts == [1, 2, 1, 1]
+    assert h.count == 5 and h.max == 0.5
+    assert abs(h.mean - 0.1111) < 1e-9
+    assert h.quantile(0.5) == 0.01
+    assert h.quantile(1.0) == 0.5
+
+
+def test_timer_and_prometheus():
+    clock = Clock()
+    metrics = Metrics(buckets=(0.01, 0.1), clock=clock)
+    with metrics.timer("request_seconds", path="/v1/ticker"):
+        clock.now += 0.05
+    metrics.inc("cycle_errors", error="HTTPError")
+
+    text = render_prometheus(metrics)
+    assert '# TYPE cryptobot_request_seconds histogram' in text
+    assert 'cryptobot_request_seconds_bucket{path="/v1/ticker",le="0.01"} 0' \
+           in text
+    assert 'cryptobot_request_seconds_bucket{path="/v1/ticker",le="0.1"} 1' \
+           in text
+    assert 'cryptobot_request_seconds_count{path="/v1/ticker"} 1' in text
+    assert 'cryptobot_cycle_errors_total{error="HTTPError"} 1' in text
+    assert "n=1" in format_summary(metrics)
+
+
+def test_null_metrics():
+    with NULL_METRICS.timer("request_seconds", path="/v1/status"):
+        pass
+    NULL_METRICS.observe("sign_seconds", 1.0)
+    NULL_METRICS.inc("cycle_errors")
+    assert NULL_METRICS.snapshot() == ({}, {})
+
+
+def test_http_sink():
+    metrics = Metrics()
+    metrics.observe("cycle_seconds", 0.2)
+    sink = PrometheusHttpSink(metrics, port=0)
+    try:
+        url = "http://127.0.0.1:%d/metrics" % sink.port
+        text = urllib.request.urlopen(url).read().decode()
+        assert "cryptobot_cycle_seconds_count 1" in text
+    finally:
+        sink.close()
+
+
+def test_api_metrics():
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 100)
+        metrics = Metrics()
+        api = get_crypto_api_client("GMO", server.api_key, server.secret_key,
+                                    metrics=metrics)
+        server.connect(api)
+        with api:
+            for _ in range(3):
+                assert api.get_assets(["JPY"])["JPY"].amount == 100
+        histograms, _ = metrics.snapshot()
+        assert histograms[("request_seconds",
+                           (("path", "/v1/account/assets"),))].count == 3
+        assert histograms[("sign_seconds", ())].count == 3
+        assert histograms[("decode_seconds", ())].count == 3
+
+
+if __name__ == '__main__':
+    test_histogram()
+    test_timer_and_prometheus()
+    test_null_metrics()
+    test_http_sink()
+    test_api_metrics()
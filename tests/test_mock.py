@@ -0,0 +1,79 @@
+import sys
+sys.path.append(".")
+
+import requests
+from scripts import *
+from scripts.data import *
+from tests.mock import MockGmoServer, make_order
+from scripts.ratelimit import RequestScheduler
+
+
+def test_order_lifecycle():
+    Size.min_sizes, Size.max_sizes = {"BTC": 0.01}, {"BTC": 1}
+    Price.step_values = {"BTC": "1"}
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 100000)
+        server.set_asset("BTC", 0)
+        api = server.connect(get_crypto_api_client("GMO", "KEY", "SECRET"))
+
+        orders = [make_order("BTC", Side.BUY, 2, 1000000, "SOK"),
+                  make_order("BTC", Side.BUY, 1, 999000, "SOK")]
+        for order in orders:
+            order.ID = api.post_order(order)
+        assert [o.ID for o in orders] == ["1", "2"]
+
+        server.execute(orders[0].ID)
+        api.get_orders(orders)
+        assert orders[0].status is OrderStatus.COMPLETED
+        assert orders[0].executed_size == 0.02
+        assert orders[1].status is OrderStatus.ACTIVE
+
+        data = api.post_cancel_orders(orders)
+        assert data["success"] == ["2"]
+        assert len(data["failed"]) == 1
+        api.get_orders(orders[1])
+        assert orders[1].status is OrderStatus.CANCELED
+
+        assets = api.get_assets(["JPY", "BTC"])
+        assert assets["JPY"].amount == 80000
+        assert assets["BTC"].amount == 0.02
+
+
+def test_signature():
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 1)
+        api = server.connect(get_crypto_api_client("GMO", "KEY", "WRONG"))
+        try:
+            api.get_assets(["JPY"])
+            assert False
+        except RuntimeError as e:
+            assert "ERR-5010" in str(e)
+        assert server.rejected["signature"] == 1
+
+
+def test_injected_errors():
+    with MockGmoServer(rate_limit=2, latency={"/v1/ticker": 0.05}) as server:
+        server.set_ticker("BTC", 101, 99)
+        api = server.connect(get_crypto_api_client("GMO", "KEY", "SECRET"))
+        api.public_scheduler = RequestScheduler(1000)
+        api.cache_ttls = dict(api.cache_ttls, ticker=0)
+
+        server.fail("/v1/ticker", 502)
+        codes = []
+        for _ in range(4):
+            try:
+                assert api.get_ticker(["BTC"])["BTC"].last == 100
+                codes.append(200)
+            except requests.HTTPError as e:
+                codes.append(e.response.status_code)
+        # the failure is consumed before the budget is checked
+        assert codes == [502, 200, 200, 429]
+        assert server.requests["/v1/ticker"] == 4
+        assert server.rejected == {"signature": 0, "rate_limit": 1,
+                                   "error": 1}
+
+
+if __name__ == '__main__':
+    test_order_lifecycle()
+    test_signature()
+    test_injected_errors()
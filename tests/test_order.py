@@ -4,46 +4,49 @@ sys.path.append(".")
 from pprint import pprint
 from scripts import *
 from scripts.data import *
+from tests.mock import MockGmoServer
 
 def test_gmo_order():
-    config = load_yaml("data/config/gmo.yaml")
-    api = get_crypto_api_client(config["exchange"],
-                                config["api-key"],
-                                config["secret-key"])
-
-    if api.is_available():
-        Price.step_values = config["step-values"]
-        Size.min_sizes = config["min-sizes"]
-        Size.max_sizes = config["max-sizes"]
-        orders = [
-            Order(symbol = "BTC",
-                  side = Side.BUY,
-                  size = Size("BTC", val=0.0001),
-                  execution_type = ExecutionType.LIMIT,
-                  price = Price("BTC", 2500000),
-                  time_in_force = "SOK"),
-            Order(symbol = "LTC",
-                  side = Side.BUY,
-                  size = Size("LTC", lot=1),
-                  execution_type = ExecutionType.LIMIT,
-                  price = Price("LTC", 10000),
-                  time_in_force = "SOK")
-        ]
-        
-        print("===== ORDERS =====")
-        pprint(orders)
-        for order in orders:
-            order.ID = api.post_order(order)
-
-
-        # check order
-        print("===== POSTING ORDER =====")
-        posting_orders = api.get_orders(orders)
-        pprint(posting_orders)
-
-        # cancel order
-        data = api.post_cancel_orders(posting_orders)
-        pprint(data)
+    with MockGmoServer() as server:
+        api = server.connect(get_crypto_api_client("GMO",
+                                                   server.api_key,
+                                                   server.secret_key))
+
+        if api.is_available():
+            Price.step_values = {"BTC": "1", "LTC": "1"}
+            Size.min_sizes = {"BTC": 0.0001, "LTC": 0.1}
+            Size.max_sizes = {"BTC": 5, "LTC": 500}
+            orders = [
+                Order(symbol = "BTC",
+                      side = Side.BUY,
+                      size = Size("BTC", val=0.0001),
+                      execution_type = ExecutionType.LIMIT,
+                      price = Price("BTC", 2500000),
+                      time_in_force = "SOK"),
+                Order(symbol = "LTC",
+                      side = Side.BUY,
+                      size = Size("LTC", lot=1),
+                      execution_type = ExecutionType.LIMIT,
+                      price = Price("LTC", 10000),
+                      time_in_force = "SOK")
+            ]
+
+            print("===== ORDERS =====")
+            pprint(orders)
+            for order in orders:
+                order.ID = api.post_order(order)
+
+
+            # check order
+            print("===== POSTING ORDER =====")
+            posting_orders = api.get_orders(orders)
+            pprint(posting_orders)
+            assert all(o.status is OrderStatus.ACTIVE for o in posting_orders)
+
+            # cancel order
+            data = api.post_cancel_orders(posting_orders)
+            pprint(data)
+            assert data["success"] == ["1", "2"]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,173 @@
+import sys
+sys.path.append(".")
+
+import io
+import json
+import threading
+from contextlib import redirect_stdout
+from websockets.sync.server import serve
+from scripts import *
+from scripts.data import *
+from scripts.api import GmoApi
+from scripts.stream import OrderEventStream
+from tests.mock import MockGmoServer
+
+
+def test_order_event_stream():
+    paths = []
+    release = threading.Event()
+
+    def handler(ws):
+        paths.append(ws.request.path)
+        ws.recv()
+        ws.recv()
+        # an execution of an order that is not tracked yet
+        ws.send(json.dumps({"channel": "executionEvents", "orderId": 1,
+                            "orderSize": "0.02",
+                            "orderExecutedSize": "0.01"}))
+        release.wait(5)
+        ws.send(json.dumps({"channel": "executionEvents", "orderId": 1,
+                            "orderSize": "0.02",
+                            "orderExecutedSize": "0.02"}))
+        ws.send(json.dumps({"channel": "orderEvents", "orderId": 2,
+                            "orderStatus": "CANCELED"}))
+        ws.recv()
+
+    server = MockGmoServer().start()
+    ws = serve(handler, "127.0.0.1", 0)
+    threading.Thread(target=ws.serve_forever, daemon=True).start()
+
+    api = server.connect(get_crypto_api_client("GMO", server.api_key,
+                                               server.secret_key))
+    api.ws_private_endpoint = "ws://127.0.0.1:%d" % ws.socket.getsockname()[1]
+
+    Size.min_sizes, Size.max_sizes = {"BTC": 0.01}, {"BTC": 1}
+    Price.step_values = {"BTC": "1"}
+    orders = [Order("BTC", Side.BUY, Size("BTC", lot=2),
+                    ExecutionType.LIMIT, Price("BTC", 100), ID=str(i))
+              for i in (1, 2)]
+
+    events = []
+    done = threading.Event()
+    def on_event(channel, order):
+        events.append((channel, order.ID, order.status))
+        if len(events) == 3:
+            done.set()
+
+    stream = api.get_order_stream(on_event=on_event, extend_interval=0,
+                                  subscribe_interval=0)
+    try:
+        with stream:
+            # issued and extended
+            while server.requests.get("/v1/ws-auth", 0) < 2:
+                done.wait(0.1)
+            for order in orders:
+                stream.track(order)
+            release.set()
+            assert done.wait(5)
+    finally:
+        ws.shutdown()
+        server.stop()
+
+    assert paths == ["/v1/TOKEN0"]
+    assert events == [
+        ("executionEvents", "1", OrderStatus.ACTIVE),
+        ("executionEvents", "1", OrderStatus.COMPLETED),
+        ("orderEvents", "2", OrderStatus.CANCELED)
+    ]
+    assert orders[0].executed_size == 0.02
+    assert stream.orders == {}
+    # the one token issued is deleted on close
+    assert server.tokens == set()
+
+
+def test_track_race():
+    # fills racing the REST ack: the websocket thread delivers the
+    # events while the caller tracks the orders
+    api = get_crypto_api_client("GMO", "KEY", "SECRET")
+    Size.min_sizes, Size.max_sizes = {"BTC": 0.01}, {"BTC": 1}
+    Price.step_values = {"BTC": "1"}
+    n = 500
+    orders = [Order("BTC", Side.BUY, Size("BTC", lot=1),
+                    ExecutionType.LIMIT, Price("BTC", 100), ID=str(i))
+              for i in range(n)]
+    completed = []
+    stream = OrderEventStream(api, on_event=lambda channel, order:
+                              completed.append(order.ID))
+
+    def send():
+        for i in range(n):
+            stream.on_message({"channel": "executionEvents", "orderId": i,
+                               "orderSize": "0.01",
+                               "orderExecutedSize": "0.01"})
+    thread = threading.Thread(target=send)
+    thread.start()
+    for order in orders:
+        stream.track(order)
+    thread.join()
+
+    assert sorted(completed, key=int) == [str(i) for i in range(n)]
+    assert all(o.status == OrderStatus.COMPLETED for o in orders)
+    assert stream.orders == {} and stream.pending == {}
+
+
+class FakeApi(object):
+    max_order_ids = 2
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    def get_orders(self, orders):
+        self.calls.append([o.ID for o in orders])
+        for order in orders:
+            order.status = self.statuses.get(order.ID, order.status)
+        return orders
+
+    to_order_status = staticmethod(GmoApi.to_order_status)
+
+
+def test_reconnect_and_bad_events():
+    api = FakeApi({"1": OrderStatus.COMPLETED, "3": OrderStatus.CANCELED})
+    api.ws_private_endpoint = "ws://127.0.0.1:1"
+    Size.min_sizes, Size.max_sizes = {"BTC": 0.01}, {"BTC": 1}
+    Price.step_values = {"BTC": "1"}
+    orders = [Order("BTC", Side.BUY, Size("BTC", lot=1),
+                    ExecutionType.LIMIT, Price("BTC", 100), ID=str(i),
+                    status=OrderStatus.ACTIVE)
+              for i in range(1, 4)]
+    events = []
+    def fail(channel, order):
+        raise ValueError("listener")
+    stream = OrderEventStream(api, on_event=fail)
+    stream.add_listener(lambda channel, order:
+                        events.append((order.ID, order.status)))
+    for order in orders:
+        stream.track(order)
+
+    # the first connection does not poll, a reconnect does
+    stream.connections = 1
+    stream.on_connect()
+    assert api.calls == []
+    stream.connections = 2
+    stream.on_connect()
+    assert api.calls == [["1", "2"], ["3"]]
+    assert events == [("1", OrderStatus.COMPLETED),
+                      ("3", OrderStatus.CANCELED)]
+    assert list(stream.orders) == ["2"]
+
+    # an unknown status is dropped without breaking the stream
+    with redirect_stdout(io.StringIO()) as out:
+        stream.on_message({"channel": "orderEvents", "orderId": 2,
+                           "orderStatus": "UNKNOWN"})
+    assert "Error" in out.getvalue()
+    assert orders[1].status is OrderStatus.ACTIVE and events[2:] == []
+    stream.on_message({"channel": "orderEvents", "orderId": 2,
+                       "orderStatus": "CANCELED"})
+    assert events[2:] == [("2", OrderStatus.CANCELED)]
+
+
+if __name__ == '__main__':
+    test_order_event_stream()
+    test_track_race()
+    test_reconnect_and_bad_events()
@@ -0,0 +1,95 @@
+import sys
+sys.path.append(".")
+
+import threading
+import numpy as np
+from scripts.data import Side
+from scripts.orderbook import OrderBook
+
+
+def level(price, size):
+    return {"price": str(price), "size": str(size)}
+
+
+def test_orderbook():
+    book = OrderBook("BTC")
+    assert book.best_ask() is None and book.mid() is None
+
+    # snapshots are not required to be sorted
+    book.on_message({
+        "channel": "orderbooks", "symbol": "BTC",
+        "asks": [level(102, 1), level(101, 2), level(105, 3)],
+        "bids": [level(99, 1), level(100, 2), level(98, 3)],
+        "timestamp": "2021-01-01T00:00:00.000Z",
+    })
+    assert book.best_ask() == (101.0, 2.0)
+    assert book.best_bid() == (100.0, 2.0)
+    assert book.mid() == 100.5
+    assert book.spread() == 1.0
+
+    # diffs: size 0 removes a level
+    book.apply_diff(Side.SELL, "101", "0")
+    book.apply_diff(Side.BUY, "100.5", "0.1")
+    book.on_message({"side": "SELL", "price": "103", "size": "4"})
+    assert book.best_ask() == (102.0, 1.0)
+    assert book.best_bid() == (100.5, 0.1)
+
+    prices, sizes = book.asks.levels()
+    assert prices.tolist() == [102, 103, 105]
+    assert sizes.tolist() == [1, 4, 3]
+    prices, sizes = book.bids.levels(2)
+    assert prices.tolist() == [100.5, 100]
+
+    # a new snapshot replaces the book
+    book.apply_snapshot([level(110, 1)], [])
+    assert book.best_ask() == (110.0, 1.0)
+    assert book.best_bid() is None
+    assert len(book.asks) == 1
+
+
+def test_concurrent_best():
+    book = OrderBook("BTC")
+    stop = threading.Event()
+
+    def churn():
+        while not stop.is_set():
+            for price in range(100, 110):
+                book.apply_diff(Side.SELL, price, 1)
+            for price in range(100, 110):
+                book.apply_diff(Side.SELL, price, 0)
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        for _ in range(20000):
+            best = book.best_ask()
+            assert best is None or best[1] == 1
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_random_updates():
+    rng = np.random.default_rng(0)
+    book = OrderBook("BTC")
+    reference = {}
+    for price, size in zip(rng.integers(100, 200, 20000).tolist(),
+                           rng.integers(0, 3, 20000).tolist()):
+        book.apply_diff(Side.BUY, price, size)
+        if size:
+            reference[float(price)] = float(size)
+        else:
+            reference.pop(float(price), None)
+        best = max(reference) if reference else None
+        assert book.best_bid() == (None if best is None
+                                   else (best, reference[best]))
+    # removed levels do not pile up in the heap
+    assert len(book.bids.heap) <= 2 * len(reference) + 64
+    prices, sizes = book.bids.levels(5)
+    assert prices.tolist() == sorted(reference, reverse=True)[:5]
+    assert sizes.tolist() == [reference[p] for p in prices.tolist()]
+
+
+if __name__ == '__main__':
+    test_orderbook()
+    test_concurrent_best()
+    test_random_updates()
@@ -0,0 +1,117 @@
+import sys
+sys.path.append(".")
+
+import json
+import threading
+from scripts.data import *
+from scripts.orders import OrderStore
+from tests.mock import Clock, make_order
+
+
+class FakeApi(object):
+    max_order_ids = 2
+
+    def __init__(self, statuses, missing=()):
+        self.statuses = statuses
+        self.missing = set(missing)
+        self.calls = []
+
+    def get_orders(self, orders):
+        self.calls.append([o.ID for o in orders])
+        for order in orders:
+            if order.ID in self.statuses:
+                order.status = self.statuses[order.ID]
+        return [o for o in orders if o.ID not in self.missing]
+
+
+def test_order_store(tmp_path):
+    clock = Clock()
+    archive = tmp_path / "orders.jsonl"
+    store = OrderStore(str(archive), retention=60, clock=clock)
+    for i, symbol in enumerate(["BTC", "ETH", "BTC", "ETH", "BTC"]):
+        store.add(make_order(symbol, ID=str(i),
+                             status=OrderStatus.ACTIVE))
+
+    assert len(store) == 5
+    assert [o.ID for o in store.by_symbol("BTC")] == ["0", "2", "4"]
+    assert len(store.by_status(OrderStatus.ACTIVE)) == 5
+
+    # only non-terminal orders, in chunks of the endpoint's ID limit
+    api = FakeApi({"0": OrderStatus.COMPLETED, "3": OrderStatus.CANCELED})
+    store.reconcile(api)
+    assert api.calls == [["0", "1"], ["2", "3"], ["4"]]
+    assert [o.ID for o in store.by_status(OrderStatus.ACTIVE)] == \
+        ["1", "2", "4"]
+    assert store.get("0").status is OrderStatus.COMPLETED
+
+    api.calls = []
+    store.reconcile(api)
+    assert api.calls == [["1", "2"], ["4"]]
+
+    # an update pushed into the order is re-indexed
+    order = store.get("4")
+    order.status = OrderStatus.EXPIRED
+    store.update(order)
+    assert [o.ID for o in store.active()] == ["1", "2"]
+
+    # terminal orders are evicted after the retention time
+    clock.now = 59
+    assert store.evict() == []
+    clock.now = 61
+    assert sorted(o.ID for o in store.evict()) == ["0", "3", "4"]
+    assert len(store) == 2
+    assert "0" not in store
+    assert [o.ID for o in store.by_symbol("ETH")] == ["1"]
+
+    lines = [json.loads(l) for l in archive.read_text().splitlines()]
+    assert sorted(l["ID"] for l in lines) == ["0", "3", "4"]
+    assert {l["status"] for l in lines} == \
+        {"COMPLETED", "CANCELED", "EXPIRED"}
+
+
+def test_concurrent_updates():
+    # listener updating from the websocket thread while the daemon reads
+    store = OrderStore()
+    orders = [make_order("BTC", ID=str(i), status=OrderStatus.ACTIVE)
+              for i in range(2000)]
+    for order in orders:
+        store.add(order)
+
+    def push():
+        for order in orders:
+            order.status = OrderStatus.COMPLETED
+            store.update(order)
+    thread = threading.Thread(target=push)
+    thread.start()
+    while thread.is_alive():
+        for batch in store.batches(10):
+            assert len(batch) <= 10
+    thread.join()
+    assert store.active() == []
+    assert len(store.by_status(OrderStatus.COMPLETED)) == 2000
+
+
+def test_missing_orders():
+    store = OrderStore(max_misses=2)
+    for i in range(3):
+        store.add(make_order("BTC", ID=str(i),
+                             status=OrderStatus.ACTIVE))
+    # "0" is never returned, "1" comes back after a miss
+    api = FakeApi({}, missing={"0", "1"})
+    store.reconcile(api)
+    assert [o.ID for o in store.active()] == ["0", "1", "2"]
+    api.missing = {"0"}
+    store.reconcile(api)
+    assert [o.ID for o in store.active()] == ["1", "2"]
+    assert store.get("0").status is OrderStatus.EXPIRED
+    assert store.misses == {}
+    store.reconcile(api)
+    assert api.calls[-1] == ["1", "2"]
+    assert store.misses == {}
+
+
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_order_store(pathlib.Path(tempfile.mkdtemp()))
+    test_concurrent_updates()
+    test_missing_orders()
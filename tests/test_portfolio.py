@@ -0,0 +1,76 @@
+import sys
+sys.path.append(".")
+
+import io
+from contextlib import redirect_stdout
+import numpy as np
+from scripts import *
+from scripts.data import *
+from scripts.portfolio import Portfolio
+
+
+def test_incremental_valuation():
+    rng = np.random.default_rng(0)
+    symbols = [f"C{i}" for i in range(20)]
+    portfolio = Portfolio(symbols, resync=10**9)
+    assert portfolio.deviation() == float("inf")
+    amounts = {s: 1.0 for s in symbols + ["JPY"]}
+    prices = {s: 1.0 for s in symbols}
+    for s in symbols + ["JPY"]:
+        portfolio.set_amount(s, 1.0)
+    for s in symbols:
+        portfolio.set_price(s, 1.0)
+    assert portfolio.deviation() == 0
+
+    for _ in range(10000):
+        s = symbols[rng.integers(20)]
+        if rng.random() < 0.5:
+            prices[s] = portfolio.prices[portfolio.index[s]] \
+                        * rng.uniform(0.99, 1.01)
+            portfolio.set_price(s, prices[s])
+        else:
+            amounts[s] = rng.uniform(0.5, 1.5)
+            portfolio.set_amount(s, amounts[s])
+    total = amounts["JPY"] + sum(amounts[s] * prices[s] for s in symbols)
+    assert abs(portfolio.total - total) < 1e-9
+    assert abs(sum(portfolio.weights().values()) - 1) < 1e-12
+    share = total / 21
+    deviation = max(abs(amounts[s] * prices[s] - share) / share
+                    for s in symbols)
+    deviation = max(deviation, abs(amounts["JPY"] - share) / share)
+    assert abs(portfolio.deviation() - deviation) < 1e-9
+
+
+def test_threshold():
+    api = get_crypto_api_client("Simu", None, None,
+                                assets={"JPY": 100000, "BTC": 0.02},
+                                spread=0.0002)
+    calls = []
+    get_assets = api.get_assets
+    api.get_assets = lambda symbols: calls.append(1) or get_assets(symbols)
+    api.on_trade("BTC", 0, 5000000.0, 1.0)
+    daemon = ShannonsDaemon(api, ["BTC"], {"BTC": 0.0001}, {"BTC": 5},
+                            {"BTC": "1"}, threshold=0.05, assets_refresh=2)
+    with redirect_stdout(io.StringIO()):
+        # 1% off balance: no order, and no get_assets once known
+        api.on_trade("BTC", 1000, 5100000.0, 1.0)
+        daemon.run()
+        assert len(api.orders) == 0 and not daemon.assets_stale
+        assert len(calls) == 1
+        daemon.run()
+        daemon.run()
+        assert len(calls) == 1
+        # refreshed after assets_refresh cycles (e.g. a deposit)
+        daemon.run()
+        assert len(calls) == 2
+
+        # 9% off balance
+        api.on_trade("BTC", 2000, 6000000.0, 1.0)
+        daemon.run()
+    assert len(calls) == 3
+    assert [o.side for o in api.orders.values()] == [Side.SELL]
+    assert daemon.assets_stale
+
+if __name__ == '__main__':
+    test_incremental_valuation()
+    test_threshold()
@@ -0,0 +1,71 @@
+import sys
+sys.path.append(".")
+
+import time
+import threading
+from scripts.ratelimit import Priority, RequestScheduler
+
+
+def test_priority_lanes():
+    scheduler = RequestScheduler(rate=5, burst=1)
+    scheduler.acquire()  # empty the bucket
+
+    served = []
+    def request(priority):
+        scheduler.acquire(priority)
+        served.append(priority)
+
+    threads = [threading.Thread(target=request, args=(p,))
+               for p in [Priority.HISTORY, Priority.QUERY,
+                         Priority.QUERY, Priority.ORDER, Priority.CANCEL]]
+    for t in threads:
+        t.start()
+    while sum(scheduler.stats()[p.name]["depth"] for p in Priority) < 5:
+        time.sleep(0.001)
+    for t in threads:
+        t.join()
+
+    assert served == [Priority.CANCEL, Priority.ORDER, Priority.QUERY,
+                      Priority.QUERY, Priority.HISTORY]
+    stats = scheduler.stats()
+    assert stats["QUERY"]["served"] == 3
+    assert stats["HISTORY"]["depth"] == 0
+    assert stats["HISTORY"]["wait_max"] > stats["CANCEL"]["wait_max"]
+
+
+def test_rate():
+    scheduler = RequestScheduler(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        scheduler.acquire()
+    # 5 from the burst, 10 at 50 per second
+    assert time.monotonic() - start >= 0.19
+
+
+def test_interrupted_wait():
+    scheduler = RequestScheduler(rate=10, burst=1)
+    scheduler.acquire()  # empty the bucket
+
+    # the head of the queue gives up, the request behind it is served
+    served = []
+    def request():
+        scheduler.acquire(Priority.HISTORY)
+        served.append(Priority.HISTORY)
+    thread = threading.Thread(target=request)
+    try:
+        with scheduler.cond:
+            thread.start()
+            scheduler.acquire(Priority.CANCEL, timeout=0.02)
+        assert False
+    except TimeoutError:
+        pass
+    thread.join(2)
+    assert served == [Priority.HISTORY]
+    assert scheduler.queue == []
+    assert scheduler.stats()["CANCEL"]["depth"] == 0
+
+
+if __name__ == '__main__':
+    test_priority_lanes()
+    test_rate()
+    test_interrupted_wait()
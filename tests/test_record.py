@@ -0,0 +1,126 @@
+import sys
+sys.path.append(".")
+
+import io
+import os
+from contextlib import redirect_stdout
+from scripts import *
+from scripts.data import *
+from scripts.api import GmoApi
+from tests.mock import MockGmoServer
+from scripts.record import *
+from time import monotonic, sleep
+
+
+def make_daemon(api):
+    return ShannonsDaemon(api, ["BTC", "ETH"],
+                          {"BTC": 0.0001, "ETH": 0.01},
+                          {"BTC": 5, "ETH": 10},
+                          {"BTC": "1", "ETH": "1"})
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "traffic")
+    with MockGmoServer() as server:
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0)
+        server.set_asset("ETH", 0)
+        server.set_ticker("BTC", 5000100, 4999900)
+        server.set_ticker("ETH", 300010, 299990)
+        transport = RecordingTransport(HttpTransport(), path,
+                                       segment_size=1000)
+        api = server.connect(GmoApi("KEY", "SECRET", transport))
+        with api, redirect_stdout(io.StringIO()):
+            daemon = make_daemon(api)
+            daemon.run()
+            daemon.run()
+        recorded = dict(server.requests)
+
+    records = list(read_log(path))
+    assert len(records) == sum(recorded.values())
+    assert len(os.listdir(path)) > 1
+    post = [r for r in records if r["method"] == "POST"][0]
+    assert post["body"].startswith('{"symbol":"BTC"')
+    assert post["latency"] > 0
+
+    # the same session without the server
+    with ReplayTransport(path, strict=True) as transport:
+        api = GmoApi("KEY", "SECRET", transport)
+        with redirect_stdout(io.StringIO()):
+            daemon = make_daemon(api)
+            daemon.run()
+            daemon.run()
+        assert transport.remaining() == 0
+        assert sorted(o.ID for o in daemon.orders) == ["1", "2", "3", "4"]
+        try:
+            api.get_assets(["JPY"])
+            assert False
+        except ReplayError:
+            pass
+
+
+class BinaryTransport(object):
+    def get(self, url, params={}, headers={}, stream=False):
+        return ReplayResponse(url, 200, b"\xff\xfe" + url.encode())
+
+    def close(self):
+        pass
+
+
+def test_binary_and_segments(tmp_path):
+    path = str(tmp_path / "traffic")
+    with RecordingTransport(BinaryTransport(), path) as transport:
+        transport.get("http://x/a", params={"n": object()})
+        transport.get("http://x/b")
+    with RecordingTransport(BinaryTransport(), path) as transport:
+        transport.get("http://x/c")
+    assert sorted(os.listdir(path)) == ["traffic-000001.jsonl.gz",
+                                        "traffic-000002.jsonl.gz"]
+    assert transport.failed == 0
+
+    # a deleted segment does not make the next session overwrite one
+    os.remove(os.path.join(path, "traffic-000001.jsonl.gz"))
+    with RecordingTransport(BinaryTransport(), path) as transport:
+        transport.get("http://x/d")
+    assert sorted(os.listdir(path)) == ["traffic-000002.jsonl.gz",
+                                        "traffic-000003.jsonl.gz"]
+
+    replay = ReplayTransport(path)
+    assert replay.get("http://x/c").content == b"\xff\xfehttp://x/c"
+    assert replay.get("http://x/d").content == b"\xff\xfehttp://x/d"
+
+
+def test_timing_and_flush(tmp_path):
+    path = str(tmp_path / "traffic")
+    with RecordingTransport(BinaryTransport(), path,
+                            flush_interval=0.05) as transport:
+        transport.get("http://x/a")
+        # flushed on the timer, not only when closed
+        deadline = monotonic() + 5
+        while not list(read_log(path)) and monotonic() < deadline:
+            sleep(0.01)
+        assert len(list(read_log(path))) == 1
+        sleep(0.3)
+        transport.get("http://x/b")
+        transport.get("http://x/c", stream=True)
+
+    # the gap between the requests is replayed, scaled by speed
+    for speed, minimum in [(1, 0.28), (3, 0.09)]:
+        replay = ReplayTransport(path, speed=speed)
+        start = monotonic()
+        replay.get("http://x/a")
+        replay.get("http://x/b")
+        assert monotonic() - start >= minimum
+    # a streamed body was not recorded
+    try:
+        replay.get("http://x/c", stream=True)
+        assert False
+    except ReplayError as e:
+        assert "streamed" in str(e)
+
+
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_record_and_replay(pathlib.Path(tempfile.mkdtemp()))
+    test_binary_and_segments(pathlib.Path(tempfile.mkdtemp()))
+    test_timing_and_flush(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,87 @@
+import sys
+sys.path.append(".")
+
+from scripts import *
+from scripts.data import *
+from tests.mock import MockGmoServer, Clock
+
+
+def test_runner():
+    clock = Clock()
+    with MockGmoServer() as server, Runner(clock=clock) as runner:
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0)
+        server.set_asset("ETH", 0)
+        server.set_ticker("BTC", 5000100, 4999900)
+        server.set_ticker("ETH", 300010, 299990)
+        api = runner.get_api("GMO", server.api_key, server.secret_key)
+        server.connect(api)
+        assert runner.get_api("GMO", server.api_key, "") is api
+
+        # the same symbol with different specs in one process
+        runner.add("fine", ShannonsDaemon(api, ["BTC", "ETH"],
+                                          {"BTC": 0.0001, "ETH": 0.01},
+                                          {"BTC": 5, "ETH": 10},
+                                          {"BTC": "1", "ETH": "1"}, 10))
+        runner.add("coarse", ShannonsDaemon(api, ["BTC"],
+                                            {"BTC": 0.01}, {"BTC": 1},
+                                            {"BTC": "1000"}, 15))
+        assert sorted(runner.run_due()) == ["coarse", "fine"]
+
+        # the ticker is fetched once for both daemons
+        assert server.requests["/v1/ticker"] == 1
+        sizes = {(o["symbol"], o["price"], o["size"])
+                 for o in server.orders.values()}
+        assert sizes == {("BTC", "4999900", "0.02"),
+                         ("ETH", "299990", "0.33"),
+                         ("BTC", "4999000", "0.03")}
+
+        clock.now = 10
+        assert runner.run_due() == ["fine"]
+        # missed runs are skipped and the phase is kept
+        clock.now = 47
+        assert sorted(runner.run_due()) == ["coarse", "fine"]
+        assert [t for t, _, _ in sorted(runner.queue)] == [50, 60]
+        assert runner.stats["fine"]["runs"] == 3
+        assert runner.stats["coarse"]["errors"] == 0
+
+
+def test_async_daemon():
+    with MockGmoServer() as server, Runner() as runner:
+        server.set_asset("JPY", 300000)
+        server.set_asset("BTC", 0)
+        server.set_ticker("BTC", 5000100, 4999900)
+        api = get_async_crypto_api_client("GMO", server.api_key,
+                                          server.secret_key)
+        server.connect(api.api)
+        runner.add("async", AsyncShannonsDaemon(api, ["BTC"],
+                                                {"BTC": 0.0001}, {"BTC": 5},
+                                                {"BTC": "1"}, 10))
+        assert runner.run_due() == ["async"]
+        assert runner.stats["async"]["errors"] == 0
+        assert [(o["symbol"], o["side"]) for o in server.orders.values()] \
+            == [("BTC", "BUY")]
+        api.close()
+
+
+def test_simu_daemon():
+    clock = Clock()
+    with Runner(clock=clock) as runner:
+        api = runner.get_api("Simu", "paper", None)
+        assert api.metrics is runner.metrics
+        api.deposit("JPY", 300000)
+        api.deposit("BTC", 0)
+        api.on_trade("BTC", 1600000000000, 5000000.0, 1.0)
+        runner.add("paper", ShannonsDaemon(api, ["BTC"],
+                                           {"BTC": 0.0001}, {"BTC": 5},
+                                           {"BTC": "1"}, 10))
+        assert runner.run_due() == ["paper"]
+        assert runner.stats["paper"]["errors"] == 0
+        assert [(o.symbol, o.side) for o in api.orders.values()] \
+            == [("BTC", Side.BUY)]
+
+
+if __name__ == '__main__':
+    test_runner()
+    test_async_daemon()
+    test_simu_daemon()
@@ -0,0 +1,113 @@
+import sys
+sys.path.append(".")
+
+import io
+import asyncio
+from contextlib import redirect_stdout
+import requests
+from scripts.schedule import CycleScheduler, classify
+from tests.mock import Clock
+
+
+def http_error(status):
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(response=resp)
+
+
+def test_classify():
+    assert classify(http_error(429)) == "rate_limit"
+    assert classify(http_error(503)) == "server"
+    assert classify(http_error(400)) == "client"
+    assert classify(requests.ConnectionError()) == "network"
+    assert classify(RuntimeError([{"message_code": "ERR-5003"}])) \
+           == "rate_limit"
+    assert classify(RuntimeError([{"message_code": "ERR-5201"}])) \
+           == "maintenance"
+    assert classify(RuntimeError("Exchange is not available now")) == "api"
+    assert classify(KeyError("BTC")) == "other"
+
+
+def test_fixed_rate():
+    clock = Clock()
+    scheduler = CycleScheduler(10, jitter=0, clock=clock)
+    scheduler.start()
+
+    scheduler.begin()
+    clock.now = 3
+    assert scheduler.done() == 10
+
+    # started 1s late and overran two ticks
+    clock.now = 11
+    scheduler.begin()
+    clock.now = 35
+    assert scheduler.done() == 40
+    assert scheduler.skipped == 2
+
+    # backoff doubles with the failures of a kind
+    delays = []
+    for error in [http_error(503), http_error(503), http_error(503)]:
+        clock.now = scheduler.deadline
+        scheduler.begin()
+        delays.append(scheduler.done(error) - clock.now)
+    assert delays == [10, 20, 40]
+    # a rate limit after them backs off from its own first delay
+    clock.now = scheduler.deadline + 1
+    scheduler.begin()
+    assert scheduler.done(http_error(429)) - clock.now == 1
+    # then the cycles return to the ticks of the clock
+    clock.now = scheduler.deadline + 0.5
+    scheduler.begin()
+    assert scheduler.done() == 120
+    assert scheduler.skipped == 9
+
+    stats = scheduler.stats()
+    assert stats["cycles"] == 7
+    assert stats["errors"]["server"] == 3
+    assert stats["errors"]["rate_limit"] == 1
+    assert stats["lateness_max"] == 1
+
+
+def test_jitter():
+    clock = Clock()
+    scheduler = CycleScheduler(10, clock=clock, seed=0)
+    scheduler.start()
+    for _ in range(20):
+        scheduler.begin()
+        delay = scheduler.done(http_error(503)) - clock.now
+        assert 5 <= delay <= 10
+        scheduler.failures["server"] = 0
+
+
+def test_stop_async_backoff():
+    scheduler = CycleScheduler(0.01)
+    async def cycle():
+        raise RuntimeError([{"message_code": "ERR-5201"}])
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, scheduler.stop)
+        # stopped during the 60s maintenance backoff
+        await asyncio.wait_for(scheduler.run_async(cycle), 5)
+    with redirect_stdout(io.StringIO()):
+        asyncio.run(main())
+    assert scheduler.stats()["errors"]["maintenance"] == 1
+
+
+def test_run():
+    scheduler = CycleScheduler(0.01)
+    calls = []
+    def cycle():
+        calls.append(1)
+        if len(calls) == 5:
+            scheduler.stop()
+    scheduler.run(cycle)
+    assert len(calls) == 5
+    assert scheduler.stats()["cycles"] == 5
+
+
+if __name__ == '__main__':
+    test_classify()
+    test_fixed_rate()
+    test_jitter()
+    test_stop_async_backoff()
+    test_run()
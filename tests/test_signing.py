@@ -0,0 +1,64 @@
+import sys
+sys.path.append(".")
+
+import hmac
+import hashlib
+from scripts import *
+from scripts.utils import MillisClock, encode_payload
+from tests.mock import Clock
+
+
+def test_millis_clock():
+    wall, mono = Clock(), Clock()
+    wall.now, mono.now = 1600000000.0, 100.0
+    clock = MillisClock(resync_interval=60, wall=wall, clock=mono)
+    assert clock() == 1600000000000
+
+    def tick(seconds):
+        wall.now += seconds
+        mono.now += seconds
+
+    # a step of the wall clock does not move it until the resync
+    wall.now -= 100
+    tick(0.25)
+    assert clock() == 1600000000250
+    # the resync does not take it back, it keeps running ...
+    tick(60)
+    assert clock() == 1600000060250
+    # ... at half speed until it is back on the wall clock
+    tick(50)
+    assert clock() == 1600000085250
+    last = clock()
+    for _ in range(300):
+        tick(1)
+        now = clock()
+        assert now > last
+        last = now
+    assert clock() == int(wall.now * 1000)
+
+    # a forward step is taken at the resync
+    wall.now += 10
+    tick(60)
+    assert clock() == int(wall.now * 1000)
+
+
+def test_api_header():
+    api = get_crypto_api_client("GMO", "KEY", "SECRET")
+    payload = {"symbol": "BTC", "side": "BUY", "size": "0.01"}
+    body = encode_payload(payload)
+    assert body == b'{"symbol":"BTC","side":"BUY","size":"0.01"}'
+    header = api.get_api_header("POST", "/v1/order", body)
+    text = header["API-TIMESTAMP"].encode() + b"POST/v1/order" + body
+    assert header["API-SIGN"] == hmac.new(b"SECRET", text,
+                                          hashlib.sha256).hexdigest()
+    assert len(header["API-TIMESTAMP"]) == 13
+    # a dict is signed as its encoded body
+    header = api.get_api_header("POST", "/v1/order", payload)
+    text = header["API-TIMESTAMP"].encode() + b"POST/v1/order" + body
+    assert header["API-SIGN"] == hmac.new(b"SECRET", text,
+                                          hashlib.sha256).hexdigest()
+
+
+if __name__ == '__main__':
+    test_millis_clock()
+    test_api_header()
@@ -0,0 +1,208 @@
+import sys
+sys.path.append(".")
+
+import io
+import time
+from datetime import date
+from contextlib import redirect_stdout
+import numpy as np
+from scripts import *
+from scripts.data import *
+from scripts.simu import SimuOrder, MatchingEngine
+from scripts.store import TradeStore
+from tests.mock import make_order
+
+
+def test_price_time_priority():
+    engine = MatchingEngine("BTC")
+    orders = [SimuOrder(str(i), "BTC", Side.BUY, ExecutionType.LIMIT,
+                        p, 1.0, "FAS", 0)
+              for i, p in enumerate([100, 100, 101, 99])]
+    for order in orders:
+        engine.add(order)
+    assert engine.best(Side.BUY) == 101
+
+    fills = [(o.ID, s, p) for o, s, p in engine.match(100, 1.5)]
+    # 101 is traded through, then 100 in arrival order
+    assert fills == [("2", 1.0, 101), ("0", 1.0, 100), ("1", 0.5, 100)]
+    assert engine.depth(Side.BUY) == [(100, 1.0), (99, 1.0)]
+
+
+def test_time_in_force():
+    api = get_crypto_api_client("Simu", None, None,
+                                assets={"JPY": 10000, "BTC": 0},
+                                spread=0.02)
+    api.on_trade("BTC", 1000, 1000.0, 1.0)
+    assert api.get_ticker(["BTC"])["BTC"].ask == 1010
+
+    # post only: crossing orders are canceled, the others rest
+    sok = [make_order("BTC", Side.BUY, 100, 1010, "SOK"),
+           make_order("BTC", Side.BUY, 100, 990, "SOK")]
+    for order in sok:
+        order.ID = api.post_order(order)
+    api.get_orders(sok)
+    assert [o.status for o in sok] == [OrderStatus.CANCELED,
+                                       OrderStatus.ACTIVE]
+    assert api.get_assets(["JPY"])["JPY"].available == 10000 - 990
+
+    # fill and kill: crossing fills at the ask, the others cancel
+    fak = [make_order("BTC", Side.BUY, 100, 1020, "FAK"),
+           make_order("BTC", Side.BUY, 100, 900, "FAK")]
+    for order in fak:
+        order.ID = api.post_order(order)
+    api.get_orders(fak)
+    assert [o.status for o in fak] == [OrderStatus.COMPLETED,
+                                       OrderStatus.CANCELED]
+    assets = api.get_assets(["JPY", "BTC"])
+    assert (assets["JPY"].amount, assets["BTC"].amount) == (8990, 1)
+
+    # the resting order fills when the market trades through it
+    api.on_trade("BTC", 2000, 980.0, 0.1)
+    api.get_orders(sok[1])
+    assert sok[1].status is OrderStatus.COMPLETED
+    assets = api.get_assets(["JPY", "BTC"])
+    assert (assets["JPY"].amount, assets["JPY"].available) == (8000, 8000)
+    assert assets["BTC"].amount == 2
+
+    try:
+        api.post_order(make_order("BTC", Side.SELL, 300, 2000))
+        assert False
+    except RuntimeError as e:
+        assert "ERR-201" in str(e)
+
+
+def test_limited_touch():
+    api = get_crypto_api_client("Simu", None, None,
+                                assets={"JPY": 100000, "BTC": 0},
+                                spread=0.02, touch_size=0.5)
+    api.on_trade("BTC", 1000, 1000.0, 1.0)
+
+    # 1 BTC crossing the ticker with 0.5 BTC at the ask
+    orders = [make_order("BTC", Side.BUY, 100, 1020, tif)
+              for tif in ("FOK", "FAK", "FAS")]
+    for order in orders:
+        order.ID = api.post_order(order)
+    api.get_orders(orders)
+    assert [(o.status, o.executed_size) for o in orders] == [
+        (OrderStatus.CANCELED, 0.0),
+        (OrderStatus.CANCELED, 0.5),
+        (OrderStatus.ACTIVE, 0.5)]
+    assets = api.get_assets(["JPY"])["JPY"]
+    # the FAS rest holds JPY at its own price
+    assert (assets.amount, assets.available) == (98990, 98475)
+
+
+def test_stop_above_reservation():
+    api = get_crypto_api_client("Simu", None, None,
+                                assets={"JPY": 1200, "BTC": 0},
+                                spread=0.02)
+    api.on_trade("BTC", 1000, 1000.0, 1.0)
+    # reserved at the ask (1010), triggered by a trade at 1500
+    stop = make_order("BTC", Side.BUY, 100, 1010, "FAS",
+                      ExecutionType.STOP)
+    stop.ID = api.post_order(stop)
+    assert api.get_assets(["JPY"])["JPY"].available == 190
+    api.on_trade("BTC", 2000, 1500.0, 1.0)
+
+    # filled with what the balance pays for, the rest canceled
+    api.get_orders(stop)
+    assert stop.status is OrderStatus.CANCELED
+    assert abs(stop.executed_size - 0.8) < 1e-9
+    assets = api.get_assets(["JPY"])["JPY"]
+    assert abs(assets.amount) < 1e-9 and assets.available >= -1e-9
+
+
+def test_execution_history(tmp_path):
+    api = get_crypto_api_client("Simu", None, None, retention=60)
+    api.deposit("JPY", 10000)
+    for i, (price, side) in enumerate([(100.0, None), (101.0, None),
+                                       (101.0, None), (99.0, None),
+                                       (99.0, Side.BUY)]):
+        api.on_trade("BTC", 1609459200000 + i * 1000, price, 1.0, side)
+    trades = api.get_execution_history("BTC", page=1, count=2) \
+             + api.get_execution_history("BTC", page=2, count=2) \
+             + api.get_execution_history("BTC", page=3, count=2)
+    # the tick rule unless the side is given, newest first
+    assert [(t["price"], t["side"]) for t in trades] == [
+        ("99.0", "BUY"), ("99.0", "SELL"), ("101.0", "BUY"),
+        ("101.0", "BUY"), ("100.0", "BUY")]
+
+    # the trades of the day as an archive the store can ingest
+    n = api.download_execution_history("BTC", date(2021, 1, 1),
+                                       str(tmp_path))
+    assert n > 0
+    store = TradeStore(str(tmp_path / "store"))
+    assert store.ingest("BTC", str(tmp_path / "20210101_BTC.csv.gz")) == 5
+    columns = store.load("BTC", "20210101")
+    assert columns["side"].tolist() == [1, 1, 1, -1, 1]
+    try:
+        api.download_execution_history("BTC", date(2021, 1, 2),
+                                       str(tmp_path))
+        assert False
+    except FileNotFoundError:
+        pass
+
+    # finished orders are dropped after retention seconds
+    order = make_order("BTC", Side.BUY, 100, 90, "FAK")
+    order.ID = api.post_order(order)
+    assert order.ID in api.orders
+    api.on_trade("BTC", 1609459200000 + 63000, 99.0, 1.0)
+    assert order.ID in api.orders
+    api.on_trade("BTC", 1609459200000 + 65000, 99.0, 1.0)
+    assert order.ID not in api.orders
+
+
+def test_paper_trading():
+    rng = np.random.default_rng(0)
+    n = 20000
+    t = np.arange(n) * 1000 + 1600000000000
+    btc = 5e6 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    eth = 3e5 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    trades = [(int(ti), s, float(p), 1.0)
+              for ti, b, e in zip(t, btc, eth)
+              for s, p in (("BTC", b), ("ETH", e))]
+
+    # the finished orders are kept to the end
+    api = get_crypto_api_client("Simu", None, None,
+                                assets={"JPY": 1e6, "BTC": 0, "ETH": 0},
+                                retention=n)
+    api.load(trades)
+    daemon = ShannonsDaemon(api, ["BTC", "ETH"],
+                            {"BTC": 0.0001, "ETH": 0.01},
+                            {"BTC": 5, "ETH": 10},
+                            {"BTC": "1", "ETH": "1"},
+                            delay=15, retention=0)
+    cycles = rejected = 0
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        while api.advance(daemon.delay):
+            try:
+                daemon.run()
+            except RuntimeError:
+                # resting orders hold the funds of a new one
+                rejected += 1
+            cycles += 1
+    elapsed = time.perf_counter() - start
+    print(f"{cycles} cycles ({rejected} rejected) in {elapsed:.2f}s")
+    assert cycles == n // 15 + 1
+
+    assets = api.get_assets(["JPY", "BTC", "ETH"])
+    assert all(a.amount >= 0 and a.available >= -1e-9
+               for a in assets.values())
+    filled = [o for o in api.orders.values()
+              if o.status is OrderStatus.COMPLETED]
+    assert len(filled) > 10
+    # without fees the value only moves with the prices
+    jpy = 1e6 - sum(o.side.value * o.size * o.price for o in filled)
+    assert abs(assets["JPY"].amount - jpy) < 1e-3
+
+
+if __name__ == '__main__':
+    test_price_time_priority()
+    test_time_in_force()
+    test_limited_touch()
+    test_stop_above_reservation()
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as tmp:
+        test_execution_history(pathlib.Path(tmp))
+    test_paper_trading()
@@ -0,0 +1,121 @@
+import sys
+sys.path.append(".")
+
+import gzip
+import numpy as np
+from scripts.store import TradeStore, to_millis
+
+
+def write_archive(path, day, rows):
+    with gzip.open(path / f"{day}_BTC.csv.gz", "wt") as f:
+        f.write("symbol,side,size,price,timestamp\n")
+        for side, size, price, ts in rows:
+            f.write(f"BTC,{side},{size},{price},{ts}\n")
+
+
+def test_trade_store(tmp_path):
+    write_archive(tmp_path, "20210101", [
+        ("BUY", "0.01", "3000000", "2021-01-01 00:00:02.000"),
+        ("SELL", "0.02", "3000100", "2021-01-01 00:00:01.500"),
+        ("BUY", "0.03", "3000200", "2021-01-01 12:00:00.000"),
+    ])
+    write_archive(tmp_path, "20210102", [
+        ("SELL", "0.04", "3000300", "2021-01-02 00:00:00.000"),
+    ])
+
+    store = TradeStore(str(tmp_path / "store"))
+    assert store.ingest_directory("BTC", str(tmp_path)) == 2
+    assert store.ingest_directory("BTC", str(tmp_path)) == 0
+    assert store.days("BTC") == ["20210101", "20210102"]
+
+    # sorted by timestamp and memory-mapped
+    day = store.load("BTC", "20210101")
+    assert isinstance(day["price"], np.memmap)
+    assert day["timestamp"].tolist() == [
+        to_millis("2021-01-01T00:00:01.500"),
+        to_millis("2021-01-01T00:00:02"),
+        to_millis("2021-01-01T12:00:00"),
+    ]
+    assert day["side"].tolist() == [-1, 1, 1]
+
+    # within a day: zero-copy slice
+    trades = store.query("BTC", "2021-01-01T00:00:02", "2021-01-01T12:00:00")
+    assert trades["size"].tolist() == [0.01]
+    assert np.shares_memory(trades["price"], day["price"])
+
+    # across days
+    trades = store.query("BTC", "2021-01-01T01:00", "2021-01-03")
+    assert trades["price"].tolist() == [3000200, 3000300]
+
+    assert len(store.query("BTC", "2021-02-01", "2021-02-02")["price"]) == 0
+
+    # appended trades are merged by timestamp
+    t = to_millis("2021-01-02T00:00:00")
+    store.append("BTC", {
+        "timestamp": np.array([t + 5, t - 10, t], dtype=np.int64),
+        "price": np.array([1.0, 2.0, 3.0]),
+        "size": np.array([0.1, 0.2, 0.3]),
+        "side": np.array([1, -1, 1], dtype=np.int8),
+    })
+    assert store.days("BTC") == ["20210101", "20210102"]
+    assert store.load("BTC", "20210101")["price"].tolist()[-1] == 2.0
+    assert store.load("BTC", "20210102")["price"].tolist() == \
+        [3000300, 3.0, 1.0]
+    assert store.last("BTC")["price"].tolist() == [1.0]
+
+
+def test_interrupted_write(tmp_path):
+    store = TradeStore(str(tmp_path))
+    t = to_millis("2021-01-01T00:00:00")
+    columns = {
+        "timestamp": np.array([t, t + 1], dtype=np.int64),
+        "price": np.array([1.0, 2.0]),
+        "size": np.array([0.1, 0.2]),
+        "side": np.array([1, -1], dtype=np.int8),
+    }
+    store.write("BTC", "20210101", columns)
+
+    # fails after some columns of the new version are written
+    broken = dict(columns, timestamp=np.array([t, t + 1, t + 2]),
+                  price=np.array([1.0, 2.0, 3.0]),
+                  size=np.array([0.1, 0.2, 0.3]),
+                  side=np.array(["BUY", "SELL", "BUY"]))
+    try:
+        store.append("BTC", broken)
+        assert False
+    except ValueError:
+        pass
+    day = store.load("BTC", "20210101")
+    assert day["price"].tolist() == [1.0, 2.0]
+    assert store.manifest("BTC", "20210101") == {"version": 1, "length": 2}
+
+    # the next write commits over the leftovers
+    store.append("BTC", dict(broken, side=np.array([1, 1, -1])))
+    assert store.load("BTC", "20210101")["side"].tolist() == \
+        [1, 1, -1, 1, -1]
+    assert sorted(p.name for p in (tmp_path / "BTC" / "20210101").iterdir()
+                  if p.name.endswith(".npy")) == \
+        ["price.2.npy", "side.2.npy", "size.2.npy", "timestamp.2.npy"]
+
+    # columns of different lengths are refused
+    directory = tmp_path / "BTC" / "20210101"
+    np.save(directory / "price.2.npy", np.array([1.0]))
+    try:
+        TradeStore(str(tmp_path)).load("BTC", "20210101")
+        assert False
+    except ValueError as e:
+        assert "different lengths" in str(e)
+
+    # partitions written without a manifest are read as they are
+    legacy = tmp_path / "ETH" / "20210101"
+    legacy.mkdir(parents=True)
+    for name, column in columns.items():
+        np.save(legacy / f"{name}.npy", column)
+    assert store.days("ETH") == ["20210101"]
+    assert store.load("ETH", "20210101")["price"].tolist() == [1.0, 2.0]
+
+
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_trade_store(pathlib.Path(tempfile.mkdtemp()))
+    test_interrupted_write(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,50 @@
+import sys
+sys.path.append(".")
+
+import json
+import threading
+from websockets.sync.server import serve
+from scripts import *
+from scripts.stream import TickerStream
+
+
+def test_ticker_stream_resubscribes():
+    subscribed = []
+
+    def handler(ws):
+        # one ticker per subscription, then drop the connection
+        for _ in range(2):
+            msg = json.loads(ws.recv())
+            subscribed.append(msg["symbol"])
+            ws.send(json.dumps({
+                "channel": "ticker", "symbol": msg["symbol"],
+                "ask": "101", "bid": "99", "last": "100",
+                "high": "110", "low": "90", "volume": "5",
+                "timestamp": "2021-01-01T00:00:00.000Z"
+            }))
+
+    server = serve(handler, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "ws://127.0.0.1:%d" % server.socket.getsockname()[1]
+
+    updates = []
+    stream = TickerStream(url, ["BTC", "ETH"],
+                          on_ticker=lambda s, t: updates.append(s),
+                          reconnect_delay=0.01, subscribe_interval=0)
+    try:
+        with stream:
+            ticker = stream.wait(5)
+            while len(updates) < 4:
+                assert stream.wait(5) is not None
+    finally:
+        server.shutdown()
+
+    assert ticker is not None
+    assert stream.connections >= 2
+    assert subscribed[:4] == ["BTC", "ETH", "BTC", "ETH"]
+    assert stream.ticker["ETH"].last == 100.0
+    assert stream.ticker["BTC"].ask == 101.0
+
+
+if __name__ == '__main__':
+    test_ticker_stream_resubscribes()
@@ -0,0 +1,53 @@
+import sys
+sys.path.append(".")
+
+from scripts.backtest import Backtester
+from scripts.sweep import Sweep, grid, sample, write_table
+from tests.mock import random_walk
+
+BASE_CONFIG = {
+    "symbols": ["BTC", "ETH"],
+    "min-sizes": {"BTC": 0.0001, "ETH": 0.01},
+    "max-sizes": {"BTC": 5, "ETH": 100},
+    "step-values": {"BTC": "1", "ETH": "1"},
+    "delay": 15,
+}
+ASSETS = {"JPY": 300000, "BTC": 0.02, "ETH": 0.3}
+
+
+def test_grid_and_sample():
+    params = {"delay": [5, 15], "symbols": [["BTC"], ["BTC", "ETH"]]}
+    assert len(grid(params)) == 4
+    assert {"delay": 5, "symbols": ["BTC"]} in grid(params)
+    assert sample(params, 3, seed=0) == sample(params, 3, seed=0)
+
+
+def test_sweep(tmp_path):
+    prices = {"BTC": random_walk(1, 20000, 5e6, 5e-4, 1000),
+              "ETH": random_walk(2, 20000, 3e5, 5e-4, 1000)}
+    configs = grid({"delay": [5, 15, 60],
+                    "symbols": [["BTC"], ["BTC", "ETH"]]})
+    with Sweep(prices, BASE_CONFIG, ASSETS, workers=2,
+               fee_rate=0.0005) as sweep:
+        rows = sweep.run(configs)
+
+    assert len(rows) == len(configs)
+    returns = [row["return"] for row in rows]
+    assert returns == sorted(returns, reverse=True)
+
+    # same as running the backtests one by one
+    for row in rows:
+        config = dict(BASE_CONFIG, **row)
+        bt = Backtester(config["symbols"], config["min-sizes"],
+                        config["max-sizes"], config["step-values"],
+                        interval=config["delay"], fee_rate=0.0005)
+        assert bt.run(prices, ASSETS).summary()["return"] == row["return"]
+
+    write_table(rows, tmp_path / "sweep.csv")
+    assert len((tmp_path / "sweep.csv").read_text().splitlines()) == 7
+
+
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_grid_and_sample()
+    test_sweep(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,21 @@
+import sys
+sys.path.append(".")
+
+from scripts import *
+from tests.mock import MockGmoServer
+
+
+def test_transport_keep_alive():
+    with MockGmoServer() as server:
+        api = get_crypto_api_client("GMO", server.api_key, server.secret_key,
+                                    transport=HttpTransport(pool_size=2))
+        server.connect(api)
+        with api:
+            for _ in range(10):
+                assert api.is_available()
+        # all requests are sent over a single pooled connection
+        assert server.connections == 1
+
+
+if __name__ == '__main__':
+    test_transport_keep_alive()